@@ -0,0 +1,228 @@
+"""
+ASGI entry point: hot anonymous pages on asyncio, everything else on Flask.
+
+    uvicorn asgi:application --workers 2
+
+GET /, GET /branch/<id>, GET /api/faqs and GET|POST /track are served here
+with asyncpg (asyncdb.py), so a few workers can hold thousands of concurrent
+public visitors while they wait on the database. Every other path (logins,
+staff and parent/student pages, uploads, static files) is handed to the
+Flask app unchanged through asgiref's WSGI adapter, i.e. the sync psycopg2
+stack in its thread pool. To keep staff traffic on plain WSGI workers
+instead, route only the four paths above to this server in the reverse proxy.
+
+The async pages render the same templates with the same Flask request
+context (session cookie, url_for, flashes), so their HTML matches the sync
+routes in routes/public.py and routes/student.py.
+
+Needs asyncpg, asgiref and an ASGI server such as uvicorn.
+"""
+import io
+import re
+import sys
+import logging
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify, render_template, request, session
+
+import asyncdb
+import timeouts
+from app import app as flask_app
+
+logger = logging.getLogger(__name__)
+
+# Bodies larger than this on the async paths (only POST /track has one) get 413.
+MAX_BODY = 64 * 1024
+
+
+# =========================
+# PAGES
+# =========================
+async def homepage(conn):
+    announcements = await asyncdb.query_all(conn, "public.active_announcements")
+    branches = await asyncdb.query_all(conn, "public.active_branches")
+    return render_template("homepage.html", announcements=announcements, branches=branches)
+
+
+async def branch_page(conn, branch_id):
+    branch = await asyncdb.query_one(conn, "public.branch", (int(branch_id),))
+    if not branch:
+        return "Branch not found", 404
+    return render_template("branch_page.html", branch=branch)
+
+
+async def api_faqs(conn):
+    role = session.get("role")
+    branch_id = session.get("branch_id")
+    try:
+        if role and branch_id:
+            rows = await asyncdb.query_all(conn, "public.branch_faqs", (branch_id,))
+        else:
+            rows = await asyncdb.query_all(conn, "public.general_faqs")
+        return jsonify([{"question": r["question"], "answer": r["answer"]} for r in rows])
+    except asyncdb.TIMEOUT_ERRORS:
+        raise
+    except Exception:
+        return jsonify([]), 200
+
+
+async def track_enrollment(conn):
+    enrollment = None
+    documents = []
+    books = []
+    uniforms = []
+
+    if request.method == "POST":
+        enrollment_id = request.form.get("enrollment_id", "").strip()
+        if enrollment_id.isdigit():
+            enrollment_id_int = int(enrollment_id)
+            enrollment = await asyncdb.query_one(conn, "student.track_enrollment", (enrollment_id_int,))
+            if enrollment:
+                documents = await asyncdb.query_all(conn, "student.track_documents", (enrollment_id_int,))
+                books = await asyncdb.query_all(conn, "student.track_books", (enrollment_id_int,))
+                uniforms = await asyncdb.query_all(conn, "student.track_uniforms", (enrollment_id_int,))
+
+    return render_template(
+        "track_enrollment.html",
+        enrollment=enrollment,
+        documents=documents,
+        books=books,
+        uniforms=uniforms
+    )
+
+
+# (path, methods, handler, Flask endpoint of the sync route it stands in for;
+# timeouts.py classifies and logs by that name)
+ROUTES = [
+    (re.compile(r"/\Z"), ("GET",), homepage, "public.homepage"),
+    (re.compile(r"/branch/(?P<branch_id>\d+)\Z"), ("GET",), branch_page, "public.branch_page"),
+    (re.compile(r"/api/faqs\Z"), ("GET",), api_faqs, "public.api_faqs"),
+    (re.compile(r"/track\Z"), ("GET", "POST"), track_enrollment, "student.track_enrollment"),
+]
+
+
+def _match(scope):
+    """(handler, path kwargs, endpoint) for an async route, else (None, None, None)."""
+    if scope["type"] != "http":
+        return None, None, None
+    for pattern, methods, handler, endpoint in ROUTES:
+        if scope["method"] in methods:
+            m = pattern.match(scope["path"])
+            if m:
+                return handler, m.groupdict(), endpoint
+    return None, None, None
+
+
+# =========================
+# ASGI <-> FLASK GLUE
+# =========================
+def _environ(scope, body):
+    """Minimal WSGI environ so Flask can build its request/session as usual."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    """Whole request body, or None if it is over MAX_BODY."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send_response(send, response):
+    body = response.get_data()
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _serve(handler, kwargs, endpoint, scope, receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"Request body too large"})
+        return
+
+    # The request context is a ContextVar, so each asyncio task has its own.
+    ctx = flask_app.request_context(_environ(scope, body))
+    ctx.push()
+    try:
+        try:
+            pool = await asyncdb.get_pool()
+            async with pool.acquire() as conn:
+                rv = await handler(conn, **kwargs)
+        except asyncdb.TIMEOUT_ERRORS as e:
+            rv = timeouts._timeout_response(e, endpoint)
+        except Exception as e:
+            rv = flask_app.handle_exception(e)
+        response = flask_app.process_response(flask_app.make_response(rv))
+    finally:
+        ctx.pop()
+    await _send_response(send, response)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await asyncdb.get_pool()
+            except Exception:
+                # the pool is retried on first request; start anyway
+                logger.exception("Async DB pool could not be created at startup")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncdb.close_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+_flask = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    handler, kwargs, endpoint = _match(scope)
+    if handler is None:
+        await _flask(scope, receive, send)
+        return
+    await _serve(handler, kwargs, endpoint, scope, receive, send)
@@ -0,0 +1,218 @@
+"""
+Static files: fingerprinted URLs, long-lived caching and precomputed variants.
+
+init_app() makes every url_for('static', filename=...) carry a fingerprint of
+the file's content,
+
+    /static/img/LiceodePakilLogo.png?v=3c1f09a2d4
+
+and replaces the static view so that a request whose ?v= matches the file
+is answered with Cache-Control: public, max-age=1 year, immutable. Editing a
+file changes its URL, so browsers never need to revalidate; a request with
+no or an old fingerprint gets the usual short-lived, revalidated response.
+
+The static view also serves precomputed variants when the client accepts
+them (Vary: Accept, Accept-Encoding):
+
+    img/Logo.png.webp    for image/webp clients, instead of img/Logo.png
+    style.css.gz         Content-Encoding: gzip, instead of style.css
+
+Variants are built ahead of time, never per request:
+
+    python assets.py build           # (re)build stale variants under static/
+    python assets.py build --force   # ... all of them
+
+A variant is only kept when it is smaller than its original. WebP needs
+Pillow (optional, as for previews.py); gzip needs nothing.
+"""
+import io
+import os
+import sys
+import gzip
+import shutil
+import hashlib
+import argparse
+import logging
+import threading
+import mimetypes
+from flask import current_app, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_from_directory
+
+try:
+    from PIL import Image
+except ImportError:          # optional: no WebP variants without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(ROOT, "static")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+WEBP_QUALITY = 82
+
+WEBP_SOURCES = {".png", ".jpg", ".jpeg"}
+GZIP_SOURCES = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+VARIANT_SUFFIXES = (".webp", ".gz")
+
+_fingerprints = {}      # path -> (mtime_ns, size, fingerprint)
+_fingerprints_lock = threading.Lock()
+
+
+def fingerprint(path):
+    """Short content hash of a file, recomputed only when it changes on disk."""
+    st = os.stat(path)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    value = h.hexdigest()[:10]
+    with _fingerprints_lock:
+        _fingerprints[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def _static_path(filename):
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _add_fingerprint(endpoint, values):
+    if endpoint != "static" or "v" in values or not values.get("filename"):
+        return
+    path = _static_path(values["filename"])
+    if path is not None:
+        values["v"] = fingerprint(path)
+
+
+def _fresh(variant, path):
+    """The variant exists and was built from the current original (build copies its mtime)."""
+    try:
+        return os.stat(variant).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _variant(filename, path):
+    """(file to send, Content-Encoding or None, Vary header or None)"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in WEBP_SOURCES:
+        if "image/webp" in request.headers.get("Accept", "") and _fresh(path + ".webp", path):
+            return filename + ".webp", None, "Accept"
+        return filename, None, "Accept"
+    if ext in GZIP_SOURCES:
+        if "gzip" in request.accept_encodings and _fresh(path + ".gz", path):
+            return filename + ".gz", "gzip", "Accept-Encoding"
+        return filename, None, "Accept-Encoding"
+    return filename, None, None
+
+
+def send_static(filename):
+    """Static view: fingerprint-aware caching plus precomputed variants."""
+    path = _static_path(filename)
+    if path is None:
+        raise NotFound()
+    immutable = request.args.get("v") == fingerprint(path)
+    send_name, encoding, vary = _variant(filename, path)
+
+    rv = send_from_directory(
+        current_app.static_folder, send_name, request.environ,
+        mimetype=mimetypes.guess_type(send_name if encoding is None else filename)[0],
+        max_age=IMMUTABLE_MAX_AGE if immutable else current_app.get_send_file_max_age(filename),
+        response_class=current_app.response_class,
+    )
+    if encoding:
+        rv.headers["Content-Encoding"] = encoding
+    if vary:
+        rv.vary.add(vary)
+    if immutable:
+        rv.cache_control.immutable = True
+    return rv
+
+
+def init_app(app):
+    app.url_defaults(_add_fingerprint)
+    if "static" in app.view_functions:
+        app.view_functions["static"] = send_static
+
+
+def _write_if_smaller(source, target, data):
+    if len(data) >= os.path.getsize(source):
+        if os.path.exists(target):
+            os.unlink(target)
+        return False
+    tmp = target + ".part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    shutil.copystat(source, tmp)
+    os.replace(tmp, target)
+    return True
+
+
+def _webp(source):
+    with Image.open(source) as img:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+        return out.getvalue()
+
+
+def _gzip(source):
+    with open(source, "rb") as f:
+        return gzip.compress(f.read(), compresslevel=9, mtime=0)
+
+
+def build(folder=STATIC_FOLDER, force=False):
+    """Build stale variants under folder; returns {"built", "skipped", "bytes_saved"}."""
+    counts = {"built": 0, "skipped": 0, "bytes_saved": 0}
+    if Image is None:
+        logger.warning("Pillow is not installed: WebP variants are skipped")
+    for dirpath, _dirs, files in os.walk(folder):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            ext = ext.lower()
+            if ext in VARIANT_SUFFIXES and os.path.splitext(stem)[1].lower() in WEBP_SOURCES | GZIP_SOURCES:
+                continue            # a variant itself
+            source = os.path.join(dirpath, name)
+            if ext in WEBP_SOURCES and Image is not None:
+                target, make = source + ".webp", _webp
+            elif ext in GZIP_SOURCES:
+                target, make = source + ".gz", _gzip
+            else:
+                continue
+            if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+            if _write_if_smaller(source, target, make(source)):
+                counts["built"] += 1
+                counts["bytes_saved"] += os.path.getsize(source) - os.path.getsize(target)
+            else:
+                counts["skipped"] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python assets.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--folder", default=STATIC_FOLDER, help="static folder (default: ./static)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="build WebP and gzip variants of static files")
+    p.add_argument("--force", action="store_true", help="rebuild variants that look up to date")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    counts = build(args.folder, args.force)
+    logger.info("assets: %(built)d variants built (%(bytes_saved)d bytes saved), "
+                "%(skipped)d not smaller than their original", counts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+asyncpg pool for the async public pages (asgi.py).
+
+Same connection settings as db.py (DB_HOST, DB_PORT, ...), its own pool per
+event loop: ASYNC_DB_POOL_MIN (default 2), ASYNC_DB_POOL_MAX (default 20).
+Statements come from the queries.py registry, so the sync and async pages
+run the same SQL; asyncpg prepares and caches them per connection.
+
+Connections get the "public" class limits from timeouts.py once, at connect
+time, instead of per checkout. TIMEOUT_ERRORS are asyncpg's counterparts of
+timeouts.ERRORS: handlers that catch broadly re-raise them so asgi.py can
+answer 503.
+"""
+import time
+import asyncio
+import asyncpg
+
+import db
+import queries
+import timeouts
+
+TIMEOUT_ERRORS = (asyncpg.exceptions.QueryCanceledError, asyncpg.exceptions.LockNotAvailableError)
+
+_pools = {}             # event loop -> asyncpg pool
+_locks = {}             # event loop -> asyncio.Lock guarding its pool's creation
+
+
+async def _create_pool():
+    params = db._connect_params()
+    statement_ms, lock_ms = timeouts.LIMITS["public"]
+    return await asyncpg.create_pool(
+        host=params["host"],
+        port=params["port"],
+        database=params["dbname"],
+        user=params["user"],
+        password=params["password"],
+        min_size=db._env_int("ASYNC_DB_POOL_MIN", 2),
+        max_size=db._env_int("ASYNC_DB_POOL_MAX", 20),
+        server_settings={
+            "statement_timeout": str(statement_ms),
+            "lock_timeout": str(lock_ms),
+            "application_name": "liceo:async",
+        },
+    )
+
+
+async def get_pool():
+    """This event loop's pool, created on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None:
+        return pool
+    lock = _locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        # concurrent first requests wait here for the one pool being created
+        pool = _pools.get(loop)
+        if pool is None:
+            pool = _pools[loop] = await _create_pool()
+    return pool
+
+
+async def close_pool():
+    loop = asyncio.get_running_loop()
+    _locks.pop(loop, None)
+    pool = _pools.pop(loop, None)
+    if pool is not None:
+        await pool.close()
+
+
+def _statement(name, params):
+    try:
+        _sql, prepared_sql, names = queries.QUERIES[name]
+    except KeyError:
+        raise KeyError(f"unknown query {name!r}; register() it first") from None
+    if names is not None:
+        params = [(params or {})[key] for key in names]
+    return prepared_sql, tuple(params or ())
+
+
+async def query_all(conn, name, params=None):
+    """All rows of a named query as dicts."""
+    sql, args = _statement(name, params)
+    started = time.perf_counter()
+    try:
+        return [dict(r) for r in await conn.fetch(sql, *args)]
+    finally:
+        queries._record(name, (time.perf_counter() - started) * 1000)
+
+
+async def query_one(conn, name, params=None):
+    """First row of a named query as a dict, or None."""
+    sql, args = _statement(name, params)
+    started = time.perf_counter()
+    try:
+        row = await conn.fetchrow(sql, *args)
+        return dict(row) if row is not None else None
+    finally:
+        queries._record(name, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,122 @@
+"""
+Endpoint benchmark over a seeded local Postgres.
+
+    python -m bench setup [--scale 1.0]     # (re)create + seed the bench DB
+                                            # (bulk loads via bench/datagen.py)
+    python -m bench run                     # p50/p95 + queries per endpoint
+    python -m bench run --save-baseline     # store results as the new baseline
+
+`run` exits non-zero when an endpoint regresses against bench/baseline.json
+(more queries per request, or p95 beyond the tolerance) or answers 5xx.
+
+Connection settings are the usual DB_HOST/DB_PORT/DB_USER/DB_PASSWORD; the
+benchmark database is BENCH_DB_NAME (default liceo_bench) and is created
+through BENCH_ADMIN_DB (default postgres), so DB_USER needs CREATEDB.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import psycopg2
+
+from bench import schema, datagen, seed as seeder, run as runner
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def _params(dbname):
+    from db import _connect_params
+    return {**_connect_params(), "dbname": dbname}
+
+
+def cmd_setup(args):
+    admin = _params(os.getenv("BENCH_ADMIN_DB", "postgres"))
+    started = time.perf_counter()
+    schema.recreate_database(admin, args.db)
+
+    conn = psycopg2.connect(**_params(args.db))
+    try:
+        schema.create_schema(conn)
+    finally:
+        conn.close()
+    datagen.populate(_params(args.db), scale=args.scale, seed=args.seed, workers=args.workers)
+    logging.info("Seeded %s (scale %s) in %.1fs", args.db, args.scale, time.perf_counter() - started)
+    return 0
+
+
+def cmd_run(args):
+    # the app's pool reads DB_NAME when it is first used
+    os.environ["DB_NAME"] = args.db
+    from app import app
+
+    missing = runner.uncovered(app)
+    if missing:
+        logging.warning("No benchmark scenario for: %s", ", ".join(missing))
+
+    conn = psycopg2.connect(**_params(args.db))
+    try:
+        fx = runner.fixtures(conn, args.branch)
+    finally:
+        conn.close()
+
+    logging.info("%-60s %8s %8s %6s  %s", "endpoint", "p50 ms", "p95 ms", "qry", "status")
+    results = runner.run(app, fx, seeder.PASSWORD, iterations=args.iterations,
+                         warmup=args.warmup, only=args.only, budget=args.budget)
+
+    errors = [k for k, r in results.items() if any(s >= 500 for s in r["status"])]
+    for key in errors:
+        logging.error("%s answered %s", key, results[key]["status"])
+
+    if args.save_baseline:
+        runner.save_baseline(args.baseline, results, {
+            "iterations": args.iterations,
+            "branch_id": fx["branch_id"],
+        })
+        logging.info("Baseline written to %s", args.baseline)
+        return 1 if errors else 0
+
+    baseline = runner.load_baseline(args.baseline)
+    if baseline is None:
+        logging.warning("No baseline at %s; run with --save-baseline to create one", args.baseline)
+        return 1 if errors else 0
+
+    problems = runner.compare(results, baseline, tolerance=args.tolerance, min_ms=args.min_ms)
+    for problem in problems:
+        logging.error("REGRESSION %s", problem)
+    if not problems:
+        logging.info("No regressions against %s", args.baseline)
+    return 1 if problems or errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("setup", help="recreate and seed the benchmark database")
+    p.add_argument("--scale", type=float, default=1.0, help="rows per branch multiplier")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--workers", type=int, default=None, help="loader processes (default: CPU count)")
+    p.set_defaults(func=cmd_setup)
+
+    p = sub.add_parser("run", help="benchmark every endpoint")
+    p.add_argument("--iterations", type=int, default=20)
+    p.add_argument("--warmup", type=int, default=2)
+    p.add_argument("--budget", type=float, default=30.0,
+                   help="seconds per endpoint before it stops early (min 3 samples)")
+    p.add_argument("--branch", type=int, default=None, help="branch_id to benchmark (default: first)")
+    p.add_argument("--only", default=None, help="only scenarios whose 'METHOD path' contains this")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth (fraction)")
+    p.add_argument("--min-ms", type=float, default=5.0, help="ignore p95 growth below this many ms")
+    p.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
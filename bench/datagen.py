@@ -0,0 +1,199 @@
+"""
+Bulk synthetic data for the LICEO schema, loaded with COPY FROM STDIN.
+
+    python -m bench.datagen --scale 10 --workers 8
+    python -m bench.datagen --recreate --volume enrollments=20000 --volume reservations=50000
+
+Rows come from bench/seed.py. Global rows (super admin, general FAQs,
+branches) are copied first; then each branch is generated and copied by a
+worker process in its own transaction, tables in foreign-key order. Branch
+ids come from disjoint blocks, so workers never collide and the dataset is
+the same whatever --workers is. Sequences are moved past the loaded ids,
+daily_collections is rebuilt from the loaded payments and the database is
+ANALYZEd at the end.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import multiprocessing
+from datetime import datetime, date
+from decimal import Decimal
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+from bench import schema, seed as seeder
+import enrollments
+import rollups
+import reservations
+
+logger = logging.getLogger(__name__)
+
+# Spill each table's COPY buffer to disk past this size.
+BUFFER_BYTES = 32 * 1024 * 1024
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_value(value):
+    """One value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(" ") if isinstance(value, datetime) else value.isoformat()
+    return str(value).translate(_ESCAPES)
+
+
+def copy_rows(conn, rows):
+    """COPY (table, row) pairs into their tables, in seeder.TABLES order."""
+    buffers = {}
+    counts = {}
+    try:
+        for table, row in rows:
+            buf = buffers.get(table)
+            if buf is None:
+                buf = buffers[table] = tempfile.SpooledTemporaryFile(
+                    max_size=BUFFER_BYTES, mode="w+", encoding="utf-8")
+            buf.write("\t".join(map(copy_value, row)))
+            buf.write("\n")
+            counts[table] = counts.get(table, 0) + 1
+
+        cur = conn.cursor()
+        try:
+            for table in seeder.TABLES:
+                buf = buffers.get(table)
+                if buf is None:
+                    continue
+                buf.seek(0)
+                cols = ", ".join(seeder.COLUMNS[table])
+                cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN", buf)
+        finally:
+            cur.close()
+    finally:
+        for buf in buffers.values():
+            buf.close()
+    return counts
+
+
+def _load_branch(task):
+    """Worker: generate and COPY one branch in one transaction."""
+    params, branch_id, code, count, password, now, seed = task
+    started = time.perf_counter()
+    conn = psycopg2.connect(**params)
+    try:
+        cur = conn.cursor()
+        cur.execute("SET synchronous_commit = off")
+        cur.close()
+        counts = copy_rows(conn, seeder.generate_branch(branch_id, code, count, password, now, seed))
+        conn.commit()
+    finally:
+        conn.close()
+    return branch_id, code, counts, time.perf_counter() - started
+
+
+def reset_sequences(conn):
+    cur = conn.cursor()
+    try:
+        for table, (seq, column) in seeder.SEQUENCES.items():
+            cur.execute(f"SELECT setval('{seq}', COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)")
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def populate(params, scale=1.0, seed=42, workers=None, overrides=None):
+    """Load the whole dataset into the (empty) database described by params."""
+    count = seeder.volumes(scale, overrides)
+    workers = workers or os.cpu_count() or 1
+    password = generate_password_hash(seeder.PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+    totals = {}
+
+    conn = psycopg2.connect(**params)
+    try:
+        totals.update(copy_rows(conn, seeder.generate_globals(password, now)))
+        conn.commit()
+        cur = conn.cursor()
+        cur.execute("SELECT branch_id, branch_code FROM branches ORDER BY branch_id")
+        branches = cur.fetchall()
+        cur.close()
+    finally:
+        # close before spawning workers: never share a libpq socket across processes
+        conn.close()
+
+    tasks = [(params, branch_id, code, count, password, now, seed) for branch_id, code in branches]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=min(workers, len(tasks)) or 1) as pool:
+        for branch_id, code, counts, elapsed in pool.imap_unordered(_load_branch, tasks):
+            logger.info("branch %s (%s): %d rows in %.1fs", branch_id, code, sum(counts.values()), elapsed)
+            for table, n in counts.items():
+                totals[table] = totals.get(table, 0) + n
+
+    conn = psycopg2.connect(**params)
+    try:
+        reset_sequences(conn)
+        # COPY bypasses student.enroll, process_payment and student_reservation,
+        # so set the enrollment counters and build the daily rollups and the
+        # reservation header projection in one go
+        enrollments.backfill(conn)
+        rollups.backfill(conn)
+        reservations.backfill(conn)
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("ANALYZE")
+        cur.close()
+    finally:
+        conn.close()
+
+    for table in seeder.TABLES:
+        logger.info("%-22s %10d rows", table, totals.get(table, 0))
+    return totals
+
+
+def _parse_volume(text):
+    key, sep, value = text.partition("=")
+    if not sep or not value.isdigit():
+        raise argparse.ArgumentTypeError(f"expected NAME=ROWS, got {text!r}")
+    return key, int(value)
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python -m bench.datagen", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for rows per branch")
+    parser.add_argument("--volume", type=_parse_volume, action="append", default=[],
+                        help=f"rows per branch for one of: {', '.join(seeder.VOLUMES)} (e.g. enrollments=20000)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--recreate", action="store_true",
+                        help="drop and recreate the database and schema first")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = {**_connect_params(), "dbname": args.db}
+    started = time.perf_counter()
+    if args.recreate:
+        schema.recreate_database({**params, "dbname": os.getenv("BENCH_ADMIN_DB", "postgres")}, args.db)
+        conn = psycopg2.connect(**params)
+        try:
+            schema.create_schema(conn)
+        finally:
+            conn.close()
+
+    populate(params, scale=args.scale, seed=args.seed, workers=args.workers, overrides=dict(args.volume))
+    logger.info("Loaded %s in %.1fs", args.db, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+-- Columns and tables the application uses that the `sql` dump and
+-- migrations/ do not create (they were added by hand on the live DB).
+-- Safe to re-run.
+
+ALTER TABLE public.branches
+    ADD COLUMN IF NOT EXISTS branch_code VARCHAR(10);
+
+ALTER TABLE public.announcements
+    ADD COLUMN IF NOT EXISTS image_url TEXT,
+    ADD COLUMN IF NOT EXISTS branch_id INTEGER REFERENCES public.branches(branch_id) ON DELETE CASCADE;
+
+ALTER TABLE public.enrollment_documents
+    ADD COLUMN IF NOT EXISTS doc_type VARCHAR(50);
+
+ALTER TABLE public.users
+    ADD COLUMN IF NOT EXISTS grade_level VARCHAR(20),
+    ADD COLUMN IF NOT EXISTS enrollment_id INTEGER REFERENCES public.enrollments(enrollment_id);
+
+CREATE TABLE IF NOT EXISTS public.book_releases (
+    release_id          SERIAL PRIMARY KEY,
+    branch_id           INTEGER NOT NULL REFERENCES public.branches(branch_id) ON DELETE CASCADE,
+    enrollment_id       INTEGER REFERENCES public.enrollments(enrollment_id),
+    student_name        VARCHAR(100),
+    released_by_user_id INTEGER REFERENCES public.users(user_id),
+    created_at          TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS public.book_release_items (
+    release_item_id SERIAL PRIMARY KEY,
+    release_id      INTEGER NOT NULL REFERENCES public.book_releases(release_id) ON DELETE CASCADE,
+    item_id         INTEGER NOT NULL REFERENCES public.inventory_items(item_id),
+    qty             INTEGER NOT NULL CHECK (qty > 0),
+    unit_price      NUMERIC(12,2) NOT NULL DEFAULT 0
+);
@@ -0,0 +1,167 @@
+"""
+Concurrent enrollment submission stress test for routes/student.py enroll.
+
+    python -m bench.enrollments                  # 32 threads, 400 submissions
+    python -m bench.enrollments --threads 64 --forms 1000 --keep
+    python -m bench.enrollments --documents      # ... each with two uploads
+
+Many "parents" (threads, each with its own test client and pooled
+connection) POST the enrollment form to one branch at the same time, all
+released together by a barrier. Afterwards it checks:
+  1. every submission ended on the success page (no server errors)
+  2. one new enrollment per submission
+  3. the new branch_enrollment_no values are unique and gap-free, right
+     after the branch's previous highest number
+  4. enrollment_counters ends on the highest number handed out
+With --documents every submission uploads the same PSA (so all of them
+attach one shared blob at once) and a Form 138 of its own, and it also checks
+  5. every document row points at a blob whose refcount matches its rows
+The new enrollments are deleted and the counter restored afterwards unless
+--keep; their blobs are left for python blobs.py gc. Runs against the seeded bench database (python -m bench setup).
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import threading
+import psycopg2
+import psycopg2.extras
+
+
+def _pick(cur):
+    cur.execute("""
+        SELECT br.branch_id, c.last_no
+        FROM branches br
+        JOIN enrollment_counters c ON c.branch_id = br.branch_id
+        WHERE COALESCE(br.is_active, TRUE)
+        ORDER BY br.branch_id
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("no active branch with a counter: seed and migrate the database (python -m bench setup)")
+    cur.execute("SELECT COALESCE(MAX(branch_enrollment_no), 0) AS m FROM enrollments WHERE branch_id = %s",
+                (row["branch_id"],))
+    return row["branch_id"], row["last_no"], cur.fetchone()["m"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.enrollments", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--forms", type=int, default=400, help="enrollment submissions")
+    parser.add_argument("--documents", action="store_true", help="upload two documents with each submission")
+    parser.add_argument("--keep", action="store_true", help="leave the new enrollments in place")
+    args = parser.parse_args(argv)
+
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("DB_POOL_MAX", str(args.threads + 2))
+    import db
+    import blobs
+    from app import app
+
+    admin = psycopg2.connect(**{**db._connect_params(), "dbname": args.db})
+    admin.autocommit = True
+    cur = admin.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    branch_id, counter_before, max_before = _pick(cur)
+    cur.execute("SELECT COALESCE(MAX(enrollment_id), 0) AS m FROM enrollments")
+    first_new = cur.fetchone()["m"] + 1
+
+    lock = threading.Lock()
+    jobs = list(range(args.forms))
+    outcome = {"success": 0, "error": 0}
+    barrier = threading.Barrier(args.threads)
+
+    def worker():
+        c = app.test_client()
+        barrier.wait()
+        while True:
+            with lock:
+                if not jobs:
+                    return
+                n = jobs.pop()
+            data = {
+                "student_name": f"Bench Enrollee {n}", "grade_level": "Grade 7", "gender": "Female",
+                "dob": "2012-01-01", "address": "bench", "contact_number": "09170000000",
+                "guardian_name": "Bench Guardian", "guardian_contact": "09170000000",
+                "previous_school": "bench",
+            }
+            if args.documents:
+                data["psa_birth_cert"] = (io.BytesIO(b"%PDF-1.4 bench PSA\n" * 2000), "psa.pdf")
+                data["form_138"] = (io.BytesIO(f"%PDF-1.4 bench Form 138 {n}\n".encode() * 2000), "form138.pdf")
+            r = c.post(f"/branch/{branch_id}/enroll", data=data)
+            ok = r.status_code == 302 and "/enroll/success/" in r.headers.get("Location", "")
+            with lock:
+                outcome["success" if ok else "error"] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    failures = []
+
+    def check(label, passed, detail=""):
+        print(f"{'ok  ' if passed else 'FAIL'} {label}{f' ({detail})' if detail and not passed else ''}")
+        if not passed:
+            failures.append(label)
+
+    try:
+        check("no server errors", outcome["error"] == 0, f"{outcome['error']} errors")
+        cur.execute("""
+            SELECT branch_enrollment_no FROM enrollments
+            WHERE enrollment_id >= %s AND branch_id = %s
+        """, (first_new, branch_id))
+        numbers = sorted(r["branch_enrollment_no"] for r in cur.fetchall())
+        check("one enrollment per submission", len(numbers) == outcome["success"],
+              f"{len(numbers)} rows for {outcome['success']} submissions")
+        check("enrollment numbers unique", len(set(numbers)) == len(numbers),
+              f"{len(numbers) - len(set(numbers))} duplicates")
+        start = max(counter_before, max_before) + 1
+        check("enrollment numbers gap-free", numbers == list(range(start, start + len(numbers))),
+              f"expected {start}..{start + len(numbers) - 1}")
+        cur.execute("SELECT last_no FROM enrollment_counters WHERE branch_id = %s", (branch_id,))
+        last_no = cur.fetchone()["last_no"]
+        check("counter on the highest number", last_no == (numbers[-1] if numbers else counter_before),
+              f"counter {last_no}")
+        if args.documents:
+            cur.execute("""
+                SELECT b.blob_id, b.refcount, COUNT(d.doc_id) AS n
+                FROM document_blobs b
+                JOIN enrollment_documents d ON d.blob_id = b.blob_id
+                WHERE b.blob_id IN (SELECT blob_id FROM enrollment_documents WHERE enrollment_id >= %s)
+                GROUP BY b.blob_id
+            """, (first_new,))
+            counted = cur.fetchall()
+            cur.execute("SELECT COUNT(*) AS n FROM enrollment_documents WHERE enrollment_id >= %s AND blob_id IS NULL",
+                        (first_new,))
+            check("blob refcounts match their documents",
+                  cur.fetchone()["n"] == 0 and all(r["refcount"] == r["n"] for r in counted)
+                  and len(counted) == len(numbers) + 1, f"{len(counted)} blobs")
+        print(f"     {args.forms} submissions to branch {branch_id}, {args.threads} threads, {elapsed:.1f}s "
+              f"({args.forms / elapsed:.0f}/s)")
+    finally:
+        if not args.keep:
+            cur.execute("SELECT doc_id FROM enrollment_documents WHERE enrollment_id >= %s", (first_new,))
+            doc_ids = [r["doc_id"] for r in cur.fetchall()]
+            if doc_ids:
+                admin.autocommit = False
+                blobs.delete_documents(cur, doc_ids)
+                admin.commit()
+                admin.autocommit = True
+            cur.execute("DELETE FROM enrollments WHERE enrollment_id >= %s AND branch_id = %s",
+                        (first_new, branch_id))
+            cur.execute("UPDATE enrollment_counters SET last_no = %s WHERE branch_id = %s",
+                        (counter_before, branch_id))
+        admin.close()
+        db.close_pool()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
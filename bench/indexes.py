@@ -0,0 +1,192 @@
+"""
+EXPLAIN check for the index pack (migrations/0004_performance_indexes.sql).
+
+    python -m bench.indexes              # against the seeded bench DB
+    python -m bench.indexes --db liceo_db
+
+Each check EXPLAINs the route query an index was built for, with real ids
+from the database, and fails unless the plan reads that index (Index Scan,
+Index Only Scan or Bitmap Index Scan). Run it on a database with realistic
+volumes (python -m bench setup); on a near-empty table the planner is right
+to prefer a sequential scan.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+import psycopg2
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+# (index, what the query is, SQL as the route runs it). Parameters come from
+# _params(): branch_id, enrollment_id, username, student_username, a keyset
+# position (after_at, after_id) half way through the branch, and the branch's
+# latest month of payments (payment_from, payment_to).
+CHECKS = [
+    ("idx_enrollments_branch_status_created", "cashier work queue page (routes/cashier.py)", """
+        SELECT e.*, b.bill_id, b.balance, b.status AS bill_status
+        FROM enrollments e
+        LEFT JOIN billing b
+          ON b.enrollment_id = e.enrollment_id
+         AND b.branch_id = e.branch_id
+        WHERE e.branch_id = %(branch_id)s AND e.status = 'approved'
+          AND b.status = 'partial'
+          AND e.created_at <= %(after_at)s
+          AND (e.created_at < %(after_at)s OR e.enrollment_id < %(after_id)s)
+        ORDER BY e.created_at DESC, e.enrollment_id DESC
+        LIMIT 51
+    """),
+    ("idx_reservations_branch_status_created", "reservations in one status, newest first", """
+        SELECT reservation_id FROM reservations
+        WHERE branch_id = %(branch_id)s AND status = 'RESERVED'
+        ORDER BY created_at DESC
+        LIMIT 50
+    """),
+    ("idx_reservations_branch_created", "cashier reservation list page (routes/cashier.py)", """
+        SELECT r.reservation_id, r.student_name, r.status, r.created_at, r.total_amount
+        FROM reservations r
+        WHERE r.branch_id = %(branch_id)s
+          AND r.created_at >= '-infinity'::timestamp AND r.created_at < 'infinity'::timestamp
+          AND r.created_at <= %(after_at)s
+          AND (r.created_at < %(after_at)s OR r.reservation_id < %(after_id)s)
+        ORDER BY r.created_at DESC, r.reservation_id DESC
+        LIMIT 51
+    """),
+    ("idx_book_releases_branch_created", "librarian releases (routes/librarian.py)", """
+        SELECT br.release_id, br.student_name, br.created_at
+        FROM book_releases br
+        WHERE br.branch_id = %(branch_id)s
+        ORDER BY br.created_at DESC
+        LIMIT 50
+    """),
+    ("idx_teacher_ann_branch_created", "student portal announcements (routes/student_portal.py)", """
+        SELECT a.announcement_id, a.title, a.created_at
+        FROM teacher_announcements a
+        WHERE a.branch_id = %(branch_id)s
+          AND (a.grade_level ILIKE 'Grade 7' OR a.grade_level ILIKE '7')
+        ORDER BY a.created_at DESC
+        LIMIT 20
+    """),
+    ("idx_enrollment_documents_enrollment", "registrar dashboard documents (routes/registrar.py)", """
+        SELECT doc_id, doc_type, file_name, file_path
+        FROM enrollment_documents
+        WHERE enrollment_id = %(enrollment_id)s
+    """),
+    ("idx_enrollment_books_enrollment", "/track books (routes/student.py)",
+     "SELECT * FROM enrollment_books WHERE enrollment_id = %(enrollment_id)s"),
+    ("idx_enrollment_uniforms_enrollment", "/track uniforms (routes/student.py)",
+     "SELECT * FROM enrollment_uniforms WHERE enrollment_id = %(enrollment_id)s"),
+    ("idx_student_accounts_enrollment", "registrar account check (routes/registrar.py)",
+     "SELECT 1 FROM student_accounts WHERE enrollment_id = %(enrollment_id)s"),
+    ("idx_payments_branch_date", "cashier report / export rows (reports.py)", """
+        SELECT p.payment_id, p.amount, p.payment_date
+        FROM payments p
+        WHERE p.branch_id = %(branch_id)s
+          AND p.payment_date >= %(payment_from)s AND p.payment_date < %(payment_to)s
+        ORDER BY p.payment_date, p.payment_id
+    """),
+    ("idx_enrollments_search", "cashier student search / autocomplete (routes/cashier.py)", """
+        SELECT e.enrollment_id, e.student_name
+        FROM enrollments e
+        WHERE e.branch_id = %(branch_id)s
+          AND (to_tsvector('simple'::regconfig, COALESCE(e.student_name, '') || ' ' || COALESCE(e.guardian_name, ''))
+                 @@ to_tsquery('simple', 'juan:* & dela:*')
+               OR e.branch_enrollment_no = 0 OR e.enrollment_id = 0)
+        LIMIT 10
+    """),
+    ("users_username_key", "login (routes/auth.py)",
+     "SELECT * FROM users WHERE username = %(username)s"),
+    ("student_accounts_username_key", "student login (routes/auth.py)", """
+        SELECT sa.account_id FROM student_accounts sa
+        WHERE sa.username = %(student_username)s
+        LIMIT 1
+    """),
+]
+
+
+def _params(cur):
+    cur.execute("""
+        SELECT e.branch_id, e.enrollment_id, sa.username AS student_username
+        FROM enrollments e
+        LEFT JOIN student_accounts sa ON sa.enrollment_id = e.enrollment_id
+        ORDER BY (sa.username IS NULL), e.enrollment_id
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("no enrollments: seed the database first (python -m bench setup)")
+    cur.execute("SELECT username FROM users ORDER BY user_id LIMIT 1")
+    username = cur.fetchone()["username"]
+    cur.execute("""
+        SELECT created_at AS after_at, enrollment_id AS after_id
+        FROM enrollments WHERE branch_id = %s
+        ORDER BY created_at DESC, enrollment_id DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM enrollments WHERE branch_id = %s) LIMIT 1
+    """, (row["branch_id"], row["branch_id"]))
+    keyset = cur.fetchone()
+    cur.execute("""
+        SELECT date_trunc('month', MAX(payment_date)) AS payment_from,
+               date_trunc('month', MAX(payment_date)) + INTERVAL '1 month' AS payment_to
+        FROM payments WHERE branch_id = %s
+    """, (row["branch_id"],))
+    return {**row, "username": username, **keyset, **cur.fetchone()}
+
+
+def _index_names(plan):
+    names = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        stack.extend(node.get("Plans", ()))
+    return names
+
+
+def check(conn):
+    """[(index, description, used, indexes in the plan)]"""
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        params = _params(cur)
+        results = []
+        for index, description, sql in CHECKS:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = _index_names(plan[0]["Plan"])
+            results.append((index, description, index in used, sorted(used)))
+        return results
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python -m bench.indexes", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    conn = psycopg2.connect(**{**_connect_params(), "dbname": args.db})
+    try:
+        results = check(conn)
+    finally:
+        conn.close()
+
+    failed = 0
+    for index, description, used, seen in results:
+        if used:
+            logger.info("ok    %-40s %s", index, description)
+        else:
+            failed += 1
+            logger.error("FAIL  %-40s %s (plan uses: %s)", index, description, ", ".join(seen) or "no index")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
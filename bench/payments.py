@@ -0,0 +1,233 @@
+"""
+Concurrent payment posting stress test for routes/cashier.py process_payment.
+
+    python -m bench.payments                     # 8 threads, 400 forms, 5 bills
+    python -m bench.payments --threads 16 --forms 1000 --bills 3 --keep
+
+Several "cashiers" (threads, each with its own test client and pooled
+connection) post payment forms against a handful of bills of one branch at
+the same time. Every form is submitted twice concurrently with the same
+idempotency key (a double click), and amounts are drawn so the bills run out
+of balance mid-run. Afterwards it checks:
+  1. every bill's amount_paid moved by exactly the sum of its new payments
+  2. no bill is overpaid; balance and status agree with amount_paid
+  3. no idempotency key was posted twice
+  4. daily_collections moved by the same count and amount as payments
+  5. the new official receipt numbers are unique and gap-free per day
+The bills, payments and rollups are restored afterwards unless --keep.
+Runs against the seeded bench database (python -m bench setup).
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+from decimal import Decimal
+from datetime import timedelta
+import psycopg2
+import psycopg2.extras
+
+_KEY = re.compile(rb'name="idempotency_key" value="([^"]+)"')
+
+
+def _pick(cur, bills):
+    cur.execute("""
+        SELECT b.branch_id, u.user_id
+        FROM billing b
+        JOIN users u ON u.branch_id = b.branch_id AND u.role = 'cashier'
+        WHERE b.status <> 'paid' AND b.balance > 1000
+        GROUP BY b.branch_id, u.user_id
+        HAVING COUNT(*) >= %s
+        ORDER BY b.branch_id
+        LIMIT 1
+    """, (bills,))
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("no branch with enough unpaid bills: seed the database first (python -m bench setup)")
+    cur.execute("""
+        SELECT bill_id, total_amount, COALESCE(amount_paid, 0) AS amount_paid, balance, status, updated_at
+        FROM billing
+        WHERE branch_id = %s AND status <> 'paid' AND balance > 1000
+        ORDER BY bill_id
+        LIMIT %s
+    """, (row["branch_id"], bills))
+    return row["branch_id"], row["user_id"], {b["bill_id"]: b for b in cur.fetchall()}
+
+
+def _rollup_totals(cur, branch_id, user_id):
+    cur.execute("""
+        SELECT COALESCE(SUM(payment_count), 0) AS n, COALESCE(SUM(total_amount), 0) AS total
+        FROM daily_collections
+        WHERE branch_id = %s AND received_by = %s
+    """, (branch_id, user_id))
+    return cur.fetchone()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.payments", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--forms", type=int, default=400, help="payment forms (each submitted twice)")
+    parser.add_argument("--bills", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="leave the posted payments in place")
+    args = parser.parse_args(argv)
+
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("DB_POOL_MAX", str(args.threads + 2))
+    import db
+    import rollups
+    from app import app
+
+    admin = psycopg2.connect(**{**db._connect_params(), "dbname": args.db})
+    admin.autocommit = True
+    cur = admin.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    branch_id, user_id, bills = _pick(cur, args.bills)
+    cur.execute("SELECT COALESCE(MAX(payment_id), 0) AS m FROM payments")
+    first_new = cur.fetchone()["m"] + 1
+    rollup_before = _rollup_totals(cur, branch_id, user_id)
+
+    # amounts sized so that roughly half the forms find the bill already drained
+    rng = random.Random(args.seed)
+    capacity = sum(b["balance"] for b in bills.values())
+    mean = capacity * 2 / args.forms
+    forms = [(rng.choice(list(bills)), Decimal(rng.uniform(0.2, 1.8) * float(mean)).quantize(Decimal("0.01")))
+             for _ in range(args.forms)]
+
+    def client():
+        c = app.test_client()
+        with c.session_transaction() as s:
+            s.update(role="cashier", branch_id=branch_id, user_id=user_id, username="bench")
+        return c
+
+    # one GET per form for its key, then both submissions go into the queue back to back
+    jobs = []
+    getter = client()
+    for bill_id, amount in forms:
+        page = getter.get(f"/cashier/process-payment/{bill_id}").data
+        m = _KEY.search(page)
+        key = m.group(1).decode() if m else None     # bill already paid: no form
+        jobs.extend([(bill_id, amount, key)] * 2)
+
+    lock = threading.Lock()
+    outcome = {"receipt": 0, "rejected": 0, "error": 0}
+
+    def worker():
+        c = client()
+        while True:
+            with lock:
+                if not jobs:
+                    return
+                bill_id, amount, key = jobs.pop()
+            r = c.post(f"/cashier/process-payment/{bill_id}", data={
+                "amount": str(amount), "payment_method": "cash", "notes": "bench", "idempotency_key": key or "",
+            })
+            location = r.headers.get("Location", "")
+            name = "receipt" if "/cashier/receipt/" in location else \
+                   "rejected" if r.status_code in (200, 302) else "error"
+            with lock:
+                outcome[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    failures = []
+    numbers = {}            # YYYYMMDD -> new receipt sequence numbers
+
+    def check(label, passed, detail=""):
+        print(f"{'ok  ' if passed else 'FAIL'} {label}{f' ({detail})' if detail and not passed else ''}")
+        if not passed:
+            failures.append(label)
+
+    try:
+        cur.execute("""
+            SELECT bill_id, COUNT(*) AS n, SUM(amount) AS total
+            FROM payments WHERE payment_id >= %s AND bill_id = ANY(%s)
+            GROUP BY bill_id
+        """, (first_new, list(bills)))
+        posted = {r["bill_id"]: r for r in cur.fetchall()}
+        cur.execute("""
+            SELECT bill_id, total_amount, COALESCE(amount_paid, 0) AS amount_paid, balance, status
+            FROM billing WHERE bill_id = ANY(%s)
+        """, (list(bills),))
+        after = {r["bill_id"]: r for r in cur.fetchall()}
+
+        drift = [b for b in bills if after[b]["amount_paid"] - bills[b]["amount_paid"]
+                 != (posted[b]["total"] if b in posted else 0)]
+        check("amount_paid moved by exactly the posted payments", not drift, f"bills {drift}")
+        overpaid = [b for b, r in after.items() if r["amount_paid"] > r["total_amount"] or r["balance"] < 0]
+        check("no bill overpaid", not overpaid, f"bills {overpaid}")
+        inconsistent = [b for b, r in after.items()
+                        if r["balance"] != max(r["total_amount"] - r["amount_paid"], 0)
+                        or r["status"] != ("paid" if r["balance"] == 0 else "partial")]
+        check("balance and status agree with amount_paid", not inconsistent, f"bills {inconsistent}")
+
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT idempotency_key FROM payments
+                WHERE payment_id >= %s AND idempotency_key IS NOT NULL
+                GROUP BY idempotency_key HAVING COUNT(*) > 1
+            ) d
+        """, (first_new,))
+        check("each form posted at most once", cur.fetchone()["n"] == 0)
+        count = sum(r["n"] for r in posted.values())
+        check("every receipt is a real payment", outcome["receipt"] >= count,
+              f"{outcome['receipt']} receipts for {count} payments")
+        check("no server errors", outcome["error"] == 0, f"{outcome['error']} errors")
+
+        rollup_after = _rollup_totals(cur, branch_id, user_id)
+        amount = sum((r["total"] for r in posted.values()), Decimal("0"))
+        check("daily_collections moved with payments",
+              rollup_after["n"] - rollup_before["n"] == count
+              and rollup_after["total"] - rollup_before["total"] == amount)
+
+        cur.execute("""
+            SELECT receipt_number FROM payments
+            WHERE payment_id >= %s AND branch_id = %s
+        """, (first_new, branch_id))
+        for r in cur.fetchall():
+            _series, day, _branch, seq = r["receipt_number"].split("-")
+            numbers.setdefault(day, []).append(int(seq))
+        gaps = [day for day, seqs in numbers.items()
+                if sorted(seqs) != list(range(min(seqs), min(seqs) + len(seqs)))]
+        check("receipt numbers gap-free", not gaps and sum(map(len, numbers.values())) == count,
+              f"days {gaps}")
+
+        print(f"     {len(forms)} forms x2 on {len(bills)} bills, {args.threads} threads, {elapsed:.1f}s: "
+              f"{count} payments (PHP {amount:,.2f}), {outcome['receipt']} receipts, "
+              f"{outcome['rejected']} rejected")
+    finally:
+        if not args.keep:
+            cur.execute("SELECT MIN(payment_date)::date AS d FROM payments WHERE payment_id >= %s", (first_new,))
+            day = cur.fetchone()["d"]
+            cur.execute("DELETE FROM payments WHERE payment_id >= %s AND bill_id = ANY(%s)",
+                        (first_new, list(bills)))
+            # the new numbers are the tail of each day's series: hand them back
+            for receipt_day, seqs in numbers.items():
+                cur.execute("""
+                    UPDATE receipt_counters SET last_number = last_number - %s
+                    WHERE branch_id = %s AND series = 'OR' AND receipt_date = %s::date
+                """, (len(seqs), branch_id, receipt_day))
+            for b in bills.values():
+                cur.execute("""
+                    UPDATE billing SET amount_paid = %s, balance = %s, status = %s, updated_at = %s
+                    WHERE bill_id = %s
+                """, (b["amount_paid"], b["balance"], b["status"], b["updated_at"], b["bill_id"]))
+            if day is not None:
+                admin.autocommit = False
+                rollups.backfill(admin, day - timedelta(days=1), day + timedelta(days=2))
+        admin.close()
+        db.close_pool()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Check read-replica routing (db.get_read_connection) against a real
+primary/standby pair.
+
+    DB_READ_HOST=localhost DB_READ_PORT=5433 python -m bench.replica
+
+A throwaway local standby of the bench database's cluster:
+
+    pg_basebackup -h localhost -p 5432 -U postgres -D /tmp/replica -R
+    pg_ctl -D /tmp/replica -o "-p 5433" start
+
+Checks, each printed as ok/FAIL (exit status 1 on any failure):
+  1. reads go to the replica (pg_is_in_recovery() there)
+  2. right after a write, the same session reads from the primary until the
+     replica has replayed it, then goes back to the replica
+  3. a replica lagging past DB_READ_MAX_LAG is skipped
+  4. an unreachable replica falls back to the primary
+Checks 2 and 3 pause WAL replay on the standby, which needs a superuser
+(--superuser, default postgres).
+"""
+import os
+import sys
+import time
+import argparse
+import psycopg2
+
+
+def _in_recovery(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_is_in_recovery()")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def _reads_replica():
+    import db
+    conn = db.get_read_connection()
+    try:
+        return _in_recovery(conn)
+    finally:
+        conn.close()
+
+
+def _write():
+    """A harmless committed write on the primary (gets an xid and WAL)."""
+    import db
+    conn = db.get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE branches SET branch_name = branch_name "
+                    "WHERE branch_id = (SELECT MIN(branch_id) FROM branches)")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _set_replay(admin, paused):
+    cur = admin.cursor()
+    try:
+        cur.execute("SELECT pg_wal_replay_pause()" if paused else "SELECT pg_wal_replay_resume()")
+    finally:
+        cur.close()
+
+
+def _wait_replayed(admin, timeout=10.0):
+    primary = psycopg2.connect(**_primary_params())
+    try:
+        cur = primary.cursor()
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        target = cur.fetchone()[0]
+    finally:
+        primary.close()
+    cur = admin.cursor()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        cur.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", (target,))
+        if cur.fetchone()[0]:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _primary_params():
+    from db import _connect_params
+    return _connect_params()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.replica", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("BENCH_DB_NAME", "liceo_bench"))
+    parser.add_argument("--superuser", default="postgres",
+                        help="role allowed to pause WAL replay on the standby")
+    args = parser.parse_args(argv)
+
+    if not os.getenv("DB_READ_HOST"):
+        print("DB_READ_HOST is not set; point it (and DB_READ_PORT) at the standby")
+        return 2
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("DB_READ_NAME", args.db)
+
+    import db
+    from app import app
+
+    failures = []
+
+    def check(label, passed):
+        print(f"{'ok  ' if passed else 'FAIL'} {label}")
+        if not passed:
+            failures.append(label)
+
+    def fresh():
+        # forget cached lag / down state between checks
+        db._replica.update(down_until=0.0, checked_at=float("-inf"), lag=0.0)
+
+    read_params = db._read_connect_params()
+    admin = psycopg2.connect(**{**read_params, "user": args.superuser, "password": ""})
+    admin.autocommit = True
+    try:
+        with app.test_request_context("/"):
+            fresh()
+            check("reads go to the replica", _reads_replica())
+
+            _set_replay(admin, True)
+            try:
+                db.READ_MAX_LAG = float("inf")
+                fresh()
+                _write()
+                check("write records the session's WAL position", bool(db.session.get(db.WRITE_LSN_KEY)))
+                check("read-your-writes: primary while the replica is behind", not _reads_replica())
+            finally:
+                _set_replay(admin, False)
+            check("replica replays the write", _wait_replayed(admin))
+            check("read-your-writes: replica again once caught up", _reads_replica())
+            check("caught-up position is cleared from the session", db.WRITE_LSN_KEY not in db.session)
+
+        with app.test_request_context("/"):
+            _set_replay(admin, True)
+            try:
+                db.READ_MAX_LAG = 0.5
+                _write()
+                db.session.pop(db.WRITE_LSN_KEY, None)
+                time.sleep(1.0)
+                fresh()
+                check("lagging replica is skipped", not _reads_replica())
+            finally:
+                _set_replay(admin, False)
+                _wait_replayed(admin)
+            fresh()
+            check("replica used again once caught up", _reads_replica())
+
+        with app.test_request_context("/"):
+            db.close_pool()
+            os.environ["DB_READ_PORT"] = "1"
+            fresh()
+            started = time.monotonic()
+            check("unreachable replica falls back to the primary", not _reads_replica())
+            check("replica is marked down", db._replica["down_until"] > time.monotonic())
+            retry_started = time.monotonic()
+            _reads_replica()
+            check("no reconnect attempt while marked down", time.monotonic() - retry_started < 0.5)
+            print(f"     (fallback took {time.monotonic() - started:.2f}s)")
+    finally:
+        admin.close()
+        db.close_pool()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Drive every blueprint endpoint through the Flask test client, one logged-in
+client per role, and report p50/p95 latency and queries per request (from
+the X-DB-Query-Count header added by querylog.py).
+
+Endpoints that change data (approve, pay, claim, delete, ...) are listed in
+SKIPPED so they do not mutate the seeded dataset between runs; everything
+else in the URL map must have a scenario, otherwise the run says which
+endpoints are not covered.
+"""
+import json
+import math
+import time
+import logging
+import psycopg2
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+# (role, method, path, form data). Placeholders are filled from fixtures().
+SCENARIOS = [
+    (None, "GET", "/", None),
+    (None, "GET", "/login", None),
+    (None, "GET", "/branch/{branch_id}", None),
+    (None, "GET", "/api/faqs?branch_id={branch_id}", None),
+    (None, "GET", "/track", None),
+    (None, "POST", "/track", {"enrollment_id": "{enrollment_id}"}),
+    (None, "GET", "/branch/{branch_id}/enroll", None),
+    (None, "GET", "/branch/{branch_id}/enroll/success/{enrollment_id}", None),
+    (None, "GET", "/branch/{branch_id}/enroll/books/{enrollment_id}", None),
+    (None, "GET", "/branch/{branch_id}/enroll/uniform/{enrollment_id}", None),
+    (None, "GET", "/branch/{branch_id}/enroll/summary/{enrollment_id}", None),
+    (None, "GET", "/parent/register", None),
+    (None, "GET", "/student/register", None),
+
+    ("super_admin", "GET", "/super-admin", None),
+    ("super_admin", "GET", "/super-admin/faqs", None),
+
+    ("branch_admin", "GET", "/branch-admin", None),
+    ("branch_admin", "GET", "/branch-admin/faqs", None),
+    ("branch_admin", "GET", "/branch-admin/inventory?category=BOOK", None),
+    ("branch_admin", "GET", "/branch-admin/inventory?category=UNIFORM", None),
+    ("branch_admin", "GET", "/branch-admin/inventory/add", None),
+    ("branch_admin", "GET", "/branch-admin/inventory/{uniform_id}/restock", None),
+    ("branch_admin", "GET", "/branch-admin/inventory/{uniform_id}/price", None),
+
+    ("registrar", "GET", "/registrar", None),
+
+    ("cashier", "GET", "/cashier", None),
+    ("cashier", "GET", "/cashier?bucket=paid", None),
+    ("cashier", "GET", "/cashier/create-bill/{enrollment_id}", None),
+    ("cashier", "GET", "/cashier/bill/{bill_id}", None),
+    ("cashier", "GET", "/cashier/process-payment/{bill_id}", None),
+    ("cashier", "GET", "/cashier/receipt/{payment_id}", None),
+    ("cashier", "GET", "/cashier/reports", None),
+    ("cashier", "POST", "/cashier/reports", {"report_date": "{payment_date}"}),
+    ("cashier", "GET", "/cashier/reports?period=month&report_date={payment_date}", None),
+    ("cashier", "GET", "/cashier/reports/export.csv?period=month&report_date={payment_date}", None),
+    ("cashier", "GET", "/cashier/search", None),
+    ("cashier", "POST", "/cashier/search", {"search_query": "Santos"}),
+    ("cashier", "GET", "/cashier/api/search?q=jua%20de", None),
+    ("cashier", "GET", "/cashier/reservations", None),
+    ("cashier", "GET", "/cashier/reservations?status=RESERVED", None),
+    ("cashier", "GET", "/cashier/reservations/{reservation_id}", None),
+    ("cashier", "GET", "/cashier/reservations/{claimed_reservation_id}/receipt", None),
+    ("cashier", "GET", "/cashier/billing-runs", None),
+    ("cashier", "GET", "/cashier/api/billing-runs/{billing_run_id}", None),
+    ("cashier", "GET", "/change-password", None),
+
+    ("librarian", "GET", "/librarian", None),
+    ("librarian", "GET", "/librarian/books", None),
+    ("librarian", "GET", "/librarian/books/add", None),
+    ("librarian", "GET", "/librarian/books/{book_id}/edit", None),
+    ("librarian", "GET", "/librarian/books/{book_id}/restock", None),
+    ("librarian", "GET", "/librarian/books/{book_id}/price", None),
+    ("librarian", "GET", "/librarian/api/student-grade?enrollment_id={enrollment_id}", None),
+    ("librarian", "GET", "/librarian/releases", None),
+
+    ("teacher", "GET", "/teacher", None),
+    ("teacher", "GET", "/teacher/debug", None),
+
+    ("parent", "GET", "/parent/dashboard", None),
+    ("parent", "GET", "/parent/link-child", None),
+    ("parent", "GET", "/parent/child/{child_id}", None),
+    ("parent", "GET", "/parent/child/{child_id}/bills", None),
+    ("parent", "GET", "/parent/reserve", None),
+    ("parent", "GET", "/parent/child/{child_id}/reserve", None),
+
+    ("student", "GET", "/student/dashboard", None),
+    ("student", "GET", "/student/enrollment-status", None),
+    ("student", "GET", "/student/billing", None),
+    ("student", "GET", "/reservation", None),
+    ("student", "GET", "/student/reservations", None),
+    ("student", "GET", "/reservation/success/{student_reservation_id}", None),
+]
+
+# Endpoints that only write; benchmarking them would change the dataset.
+SKIPPED = {
+    "auth.logout",
+    "super_admin.branch_toggle",
+    "super_admin.superadmin_faq_delete",
+    "super_admin.superadmin_faq_edit",
+    "branch_admin.announcement_hide",
+    "branch_admin.branch_admin_faq_add",
+    "branch_admin.branch_admin_faq_edit",
+    "branch_admin.branch_admin_faq_delete",
+    "branch_admin.branch_admin_inventory_toggle",
+    "registrar.create_student_account",
+    "registrar.create_parent_account",
+    "cashier.cashier_mark_paid",
+    "cashier.cashier_mark_claimed",
+    "cashier.cashier_cancel_reservation",
+    # claim/cancel many reservations at once (the form and its JSON API)
+    "cashier.cashier_bulk_reservations",
+    "cashier.api_bulk_reservations",
+    "teacher.teacher_set_grade",
+    "teacher.teacher_announce",
+    "teacher.teacher_announce_delete",
+    "teacher.teacher_announce_edit",
+    "debug.debug_queries",
+    "static",
+    "uploaded_file",
+}
+
+
+def fixtures(conn, branch_id=None):
+    """Pick real ids/usernames in one branch so every scenario hits data."""
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    def one(sql, params=()):
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        if row is None:
+            raise RuntimeError(f"bench fixture query returned nothing: {sql.strip().splitlines()[0]}")
+        return row
+
+    try:
+        if branch_id is None:
+            branch_id = one("SELECT MIN(branch_id) AS id FROM branches")["id"]
+        branch = one("SELECT branch_id, branch_code FROM branches WHERE branch_id=%s", (branch_id,))
+        code = branch["branch_code"].lower()
+
+        bill = one("""
+            SELECT b.bill_id, b.enrollment_id, p.payment_id, p.payment_date::date AS payment_date
+            FROM billing b JOIN payments p ON p.bill_id = b.bill_id
+            WHERE b.branch_id=%s ORDER BY b.bill_id LIMIT 1
+        """, (branch_id,))
+        parent = one("""
+            SELECT u.username, ps.student_id
+            FROM parent_student ps JOIN users u ON u.user_id = ps.parent_id
+            WHERE u.branch_id=%s ORDER BY ps.id LIMIT 1
+        """, (branch_id,))
+        student = one("""
+            SELECT u.username, r.reservation_id
+            FROM reservations r JOIN users u ON u.user_id = r.student_user_id
+            WHERE r.branch_id=%s ORDER BY r.reservation_id LIMIT 1
+        """, (branch_id,))
+        reservation = one("SELECT MIN(reservation_id) AS id FROM reservations WHERE branch_id=%s", (branch_id,))
+        claimed = one("SELECT MIN(reservation_id) AS id FROM reservations WHERE branch_id=%s AND status='CLAIMED'",
+                      (branch_id,))
+        book = one("SELECT MIN(item_id) AS id FROM inventory_items WHERE branch_id=%s AND category='BOOK'",
+                   (branch_id,))
+        uniform = one("SELECT MIN(item_id) AS id FROM inventory_items WHERE branch_id=%s AND category='UNIFORM'",
+                      (branch_id,))
+        billing_run = one("SELECT run_id AS id FROM billing_runs WHERE branch_id=%s ORDER BY run_id LIMIT 1",
+                          (branch_id,))
+    finally:
+        cur.close()
+
+    return {
+        "branch_id": branch_id,
+        "enrollment_id": bill["enrollment_id"],
+        "bill_id": bill["bill_id"],
+        "payment_id": bill["payment_id"],
+        "payment_date": bill["payment_date"].isoformat(),
+        "reservation_id": reservation["id"],
+        "claimed_reservation_id": claimed["id"],
+        "book_id": book["id"],
+        "uniform_id": uniform["id"],
+        "billing_run_id": billing_run["id"],
+        "child_id": parent["student_id"],
+        "student_reservation_id": student["reservation_id"],
+        "users": {
+            "super_admin": "superadmin",
+            "branch_admin": f"{code}_branch_admin",
+            "registrar": f"{code}_registrar",
+            "cashier": f"{code}_cashier",
+            "librarian": f"{code}_librarian",
+            "teacher": f"{code}_teacher_grade7",
+            "parent": parent["username"],
+            "student": student["username"],
+        },
+    }
+
+
+def login(app, username, password):
+    client = app.test_client()
+    resp = client.post("/login", data={"username": username, "password": password})
+    with client.session_transaction() as sess:
+        if not sess.get("role"):
+            raise RuntimeError(f"bench login failed for {username!r} (HTTP {resp.status_code})")
+    return client
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _fill(value, fx):
+    return value.format(**fx) if isinstance(value, str) else value
+
+
+def run(app, fx, password, iterations=20, warmup=2, only=None, budget=30.0, min_samples=3):
+    """
+    Return {"METHOD path-template": {...stats}} for every scenario.
+    An endpoint stops early once it has spent `budget` seconds and has at
+    least `min_samples` timed requests, so one pathological page (seconds
+    per request) cannot stall the whole run.
+    """
+    clients = {None: app.test_client()}
+    results = {}
+
+    for role, method, path, data in SCENARIOS:
+        key = f"{method} {path}"
+        if only and only not in key:
+            continue
+        if role not in clients:
+            clients[role] = login(app, fx["users"][role], password)
+        client = clients[role]
+
+        url = _fill(path, fx)
+        form = {k: _fill(v, fx) for k, v in data.items()} if data else None
+
+        timings, queries, statuses = [], [], set()
+        deadline = time.monotonic() + budget
+        for i in range(warmup + iterations):
+            if len(timings) >= min_samples and time.monotonic() > deadline:
+                break
+            started = time.perf_counter()
+            resp = client.open(url, method=method, data=form)
+            elapsed = (time.perf_counter() - started) * 1000
+            resp.close()
+            if i < warmup and time.monotonic() < deadline:
+                continue
+            timings.append(elapsed)
+            queries.append(int(resp.headers.get("X-DB-Query-Count", 0)))
+            statuses.add(resp.status_code)
+
+        results[key] = {
+            "role": role or "anonymous",
+            "status": sorted(statuses),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "queries": max(queries),
+            "samples": len(timings),
+        }
+        logger.info("%-60s %8.1f %8.1f %6d  %s", key, results[key]["p50_ms"], results[key]["p95_ms"],
+                    results[key]["queries"], results[key]["status"])
+    return results
+
+
+def uncovered(app):
+    """Endpoints in the URL map with neither a scenario nor a SKIPPED entry."""
+    adapter = app.url_map.bind("localhost")
+    covered = set()
+    for _role, method, path, _data in SCENARIOS:
+        url = path.split("?")[0].format_map(_AnyId())
+        try:
+            endpoint, _args = adapter.match(url, method=method)
+            covered.add(endpoint)
+        except Exception:
+            pass
+    return sorted(set(app.view_functions) - covered - SKIPPED)
+
+
+class _AnyId(dict):
+    def __missing__(self, key):
+        return "1"
+
+
+def compare(results, baseline, tolerance=0.25, min_ms=5.0):
+    """
+    List regressions against a stored baseline:
+    - any increase in queries per request (deterministic for a given seed/scale)
+    - p95 more than `tolerance` (fraction) and `min_ms` above the baseline
+    - an endpoint that used to answer < 500 now answering 5xx
+    """
+    problems = []
+    for key, base in baseline.get("endpoints", {}).items():
+        cur = results.get(key)
+        if cur is None:
+            continue
+        if cur["queries"] > base["queries"]:
+            problems.append(f"{key}: queries {base['queries']} -> {cur['queries']}")
+        limit = max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + min_ms)
+        if cur["p95_ms"] > limit:
+            problems.append(f"{key}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if any(s >= 500 for s in cur["status"]) and not any(s >= 500 for s in base["status"]):
+            problems.append(f"{key}: status {base['status']} -> {cur['status']}")
+    return problems
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, meta):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "endpoints": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,115 @@
+"""
+Build the LICEO schema in an empty database.
+
+The `sql` file is a pgAdmin dump: tables in alphabetical order (so foreign
+keys point forward), sequences referenced by nextval() but never created,
+and OWNER/GRANT statements for roles a dev box may not have. We create the
+sequences, create the tables in dependency order, skip the privilege
+statements, apply bench/drift.sql, which adds the columns and tables the
+code uses but the dump predates, and finally run migrations/ through the
+migration runner (migrate.py), so the bench database records its versions
+and gets the index pack like production does.
+"""
+import os
+import re
+import logging
+import psycopg2
+
+import migrate
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP_PATH = os.path.join(ROOT, "sql")
+DRIFT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drift.sql")
+
+_PRIVILEGES = re.compile(
+    r"^\s*(?:GRANT|REVOKE)\b[^;]*;|^\s*ALTER\s+TABLE\s+IF\s+EXISTS\s+\S+\s+OWNER\s+to\s+\w+\s*;",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SEQUENCE = re.compile(r"nextval\('(\w+)'::regclass\)")
+_CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS public\.(\w+)", re.IGNORECASE)
+_REFERENCES = re.compile(r"REFERENCES public\.(\w+)", re.IGNORECASE)
+_COMMENT = re.compile(r"^\s*--.*$", re.MULTILINE)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def strip_privileges(sql):
+    """Drop GRANT/REVOKE/OWNER TO statements (roles differ per machine)."""
+    return _PRIVILEGES.sub("", sql)
+
+
+def dump_statements(sql):
+    """
+    Split the dump into (sequences, tables in FK order, other statements).
+    The dump has no functions or dollar quoting, so ';' ends a statement.
+    """
+    sql = _COMMENT.sub("", strip_privileges(sql))
+    statements = [s.strip() for s in sql.split(";") if s.strip()]
+
+    sequences = sorted(set(_SEQUENCE.findall(sql)))
+    tables = {}
+    others = []
+    for stmt in statements:
+        m = _CREATE_TABLE.match(stmt)
+        if m:
+            tables[m.group(1)] = stmt
+        else:
+            others.append(stmt)
+
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered or name not in tables:
+            return
+        if name in visiting:
+            raise ValueError(f"foreign key cycle through {name}")
+        visiting.add(name)
+        for ref in _REFERENCES.findall(tables[name]):
+            if ref != name:
+                visit(ref)
+        visiting.discard(name)
+        ordered.append(name)
+
+    for name in sorted(tables):
+        visit(name)
+
+    return sequences, [tables[name] for name in ordered], others
+
+
+def create_schema(conn):
+    """Create every table, index and migration in an empty database."""
+    sequences, tables, others = dump_statements(_read(DUMP_PATH))
+
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        for seq in sequences:
+            cur.execute(f"CREATE SEQUENCE IF NOT EXISTS public.{seq}")
+        for stmt in tables + others:
+            cur.execute(stmt)
+        cur.execute(_read(DRIFT_PATH))
+    finally:
+        cur.close()
+
+    migrate.migrate(conn, transform=strip_privileges, existing_schema=True)
+
+
+def recreate_database(admin_params, dbname):
+    """DROP and CREATE `dbname` (UTF8) using a connection to the maintenance DB."""
+    if not re.fullmatch(r"\w+", dbname):
+        raise ValueError(f"unsafe database name {dbname!r}")
+    conn = psycopg2.connect(**admin_params)
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute(f"DROP DATABASE IF EXISTS {dbname}")
+        cur.execute(f"CREATE DATABASE {dbname} TEMPLATE template0 ENCODING 'UTF8'")
+        cur.close()
+    finally:
+        conn.close()
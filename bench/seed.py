@@ -0,0 +1,379 @@
+"""
+Deterministic benchmark data: one branch per logo in static/img, each with
+staff accounts, thousands of enrollments and their bills, payments,
+student/parent accounts, reservations, book releases and inventory.
+
+Rows carry explicit primary keys so tables can be bulk loaded without
+RETURNING round-trips. Every branch draws its ids from its own block
+(see id_stride) and its own random stream, so branches can be generated in
+any order, in separate processes, and still produce the same dataset.
+Loading is done by bench/datagen.py.
+"""
+import os
+import re
+import math
+import random
+import logging
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+from werkzeug.security import generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGO_DIR = os.path.join(ROOT, "static", "img")
+
+# Every seeded staff/parent/student login uses this password.
+PASSWORD = "bench123"
+
+# Rows per branch at scale 1.0
+VOLUMES = {
+    "enrollments": 3000,
+    "reservations": 2000,
+    "books": 1000,
+    "faqs": 5,
+    "announcements": 3,
+}
+
+GRADES = ["Nursery", "Kinder"] + [f"Grade {i}" for i in range(1, 13)]
+SUBJECTS = ["English", "Filipino", "Mathematics", "Science", "Araling Panlipunan",
+            "MAPEH", "Values Education", "TLE", "Reading", "Computer"]
+PUBLISHERS = ["Rex", "Vibal", "Phoenix", "Diwa", "Sibs", "JO-ES", "C&E", "Abiva"]
+UNIFORMS = {
+    "Pre-Elementary Boys Set": ["Kinder", "Grade 1", "Grade 2", "Grade 3"],
+    "Pre-Elementary Girls Set": ["Kinder", "Grade 1", "Grade 2", "Grade 3", "Grade 4", "Grade 5", "Grade 6"],
+    "Elementary G4-6 Boys Set": ["Grade 4", "Grade 5", "Grade 6"],
+    "JHS Boys Uniform Set": ["Grade 7", "Grade 8", "Grade 9", "Grade 10"],
+    "JHS Girls Uniform Set": ["Grade 7", "Grade 8", "Grade 9", "Grade 10"],
+    "SHS Boys Uniform Set": ["Grade 11", "Grade 12"],
+    "SHS Girls Uniform Set": ["Grade 11", "Grade 12"],
+    "PE Uniform": ["Kinder"] + [f"Grade {i}" for i in range(1, 13)],
+}
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+DOC_TYPES = ["PSA Birth Certificate", "Baptismal Certificate", "Form 138",
+             "Good Moral Certificate", "Form 137"]
+STAFF_ROLES = ["branch_admin", "registrar", "cashier", "librarian"]
+
+FIRST_NAMES = ["Juan", "Maria", "Jose", "Ana", "Mark", "Angel", "John", "Princess",
+               "Paolo", "Kristine", "Miguel", "Andrea", "Carlo", "Nicole", "Rafael",
+               "Bea", "Gabriel", "Sofia", "Joshua", "Camille", "Daniel", "Patricia"]
+LAST_NAMES = ["Dela Cruz", "Santos", "Reyes", "Garcia", "Mendoza", "Bautista",
+              "Villanueva", "Ramos", "Aquino", "Castillo", "Flores", "Gonzales",
+              "Navarro", "Torres", "Lopez", "Rivera", "Soriano", "Manalo"]
+
+# Column lists, in the order the generators emit values.
+COLUMNS = {
+    "branches": ["branch_id", "branch_name", "location", "branch_code", "status", "is_active", "created_at"],
+    "enrollments": ["enrollment_id", "student_name", "grade_level", "branch_id", "status", "created_at",
+                    "gender", "dob", "address", "contact_number", "guardian_name", "guardian_contact",
+                    "previous_school", "branch_enrollment_no"],
+    "users": ["user_id", "branch_id", "username", "password", "role", "status",
+              "require_password_change", "full_name", "gender", "grade_level", "enrollment_id"],
+    "enrollment_documents": ["doc_id", "enrollment_id", "file_name", "file_path", "doc_type", "uploaded_at"],
+    "enrollment_books": ["book_id", "enrollment_id", "book_name", "quantity"],
+    "enrollment_uniforms": ["uniform_id", "enrollment_id", "uniform_type", "size", "quantity"],
+    "student_accounts": ["account_id", "enrollment_id", "branch_id", "username", "password",
+                         "is_active", "require_password_change"],
+    "parent_student": ["id", "parent_id", "student_id", "relationship"],
+    "billing": ["bill_id", "enrollment_id", "branch_id", "tuition_fee", "books_fee", "uniform_fee",
+                "other_fees", "total_amount", "amount_paid", "balance", "status", "created_by",
+                "created_at", "updated_at"],
+    "payments": ["payment_id", "bill_id", "enrollment_id", "branch_id", "amount", "payment_method",
+                 "payment_date", "receipt_number", "notes", "received_by"],
+    "inventory_items": ["item_id", "branch_id", "category", "item_name", "grade_level", "is_common",
+                        "size_label", "price", "stock_total", "reserved_qty", "is_active", "publisher"],
+    "inventory_item_sizes": ["size_id", "item_id", "size_label", "stock_total", "reserved_qty"],
+    "reservations": ["reservation_id", "student_user_id", "branch_id", "student_grade_level", "status",
+                     "created_at", "paid_at", "claimed_at", "cancelled_at", "reserved_by_user_id",
+                     "enrollment_id"],
+    "reservation_items": ["reservation_item_id", "reservation_id", "item_id", "qty", "size_label",
+                          "unit_price", "line_total"],
+    "chatbot_faqs": ["id", "branch_id", "question", "answer"],
+    "announcements": ["announcement_id", "title", "message", "is_active", "created_at", "branch_id"],
+    "teacher_announcements": ["announcement_id", "teacher_user_id", "branch_id", "grade_level",
+                              "title", "body", "created_at"],
+    "book_releases": ["release_id", "branch_id", "enrollment_id", "student_name", "released_by_user_id",
+                      "created_at"],
+    "book_release_items": ["release_item_id", "release_id", "item_id", "qty", "unit_price"],
+    "billing_runs": ["run_id", "branch_id", "grade_level", "tuition_fee", "books_fee", "uniform_fee",
+                     "other_fees", "status", "total", "skipped", "created_count", "created_by",
+                     "created_at", "started_at", "finished_at"],
+}
+
+# Load order (foreign keys) and the sequence behind each table's id column.
+TABLES = list(COLUMNS)
+SEQUENCES = {
+    "branches": ("branches_branch_id_seq", "branch_id"),
+    "enrollments": ("enrollments_enrollment_id_seq", "enrollment_id"),
+    "users": ("users_user_id_seq", "user_id"),
+    "enrollment_documents": ("enrollment_documents_doc_id_seq", "doc_id"),
+    "enrollment_books": ("enrollment_books_book_id_seq", "book_id"),
+    "enrollment_uniforms": ("enrollment_uniforms_uniform_id_seq", "uniform_id"),
+    "student_accounts": ("student_accounts_account_id_seq", "account_id"),
+    "parent_student": ("parent_student_id_seq", "id"),
+    "billing": ("billing_bill_id_seq", "bill_id"),
+    "payments": ("payments_payment_id_seq", "payment_id"),
+    "inventory_items": ("inventory_items_item_id_seq", "item_id"),
+    "inventory_item_sizes": ("inventory_item_sizes_size_id_seq", "size_id"),
+    "reservations": ("reservations_reservation_id_seq", "reservation_id"),
+    "reservation_items": ("reservation_items_reservation_item_id_seq", "reservation_item_id"),
+    "chatbot_faqs": ("chatbot_faqs_id_seq", "id"),
+    "announcements": ("announcements_announcement_id_seq", "announcement_id"),
+    "teacher_announcements": ("teacher_announcements_announcement_id_seq", "announcement_id"),
+    "book_releases": ("book_releases_release_id_seq", "release_id"),
+    "book_release_items": ("book_release_items_release_item_id_seq", "release_item_id"),
+    "billing_runs": ("billing_runs_run_id_seq", "run_id"),
+}
+
+
+def branch_names():
+    """[(branch_name, location, branch_code)] from the Liceo*Logo files, sorted."""
+    branches = []
+    for fname in sorted(os.listdir(LOGO_DIR)):
+        m = re.match(r"Liceode(.+)Logo\.\w+$", fname)
+        if not m:
+            continue
+        town = re.sub(r"(?<=[a-zñ])(?=[A-Z])", " ", m.group(1))
+        code = "".join(w[0] for w in town.split()).upper() if " " in town else town[:3].upper()
+        branches.append((f"Liceo de {town}", f"{town}, Laguna", code))
+
+    # keep codes unique (e.g. San Pablo / San Pedro -> SP, SP2)
+    seen = {}
+    result = []
+    for name, location, code in branches:
+        n = seen.get(code, 0) + 1
+        seen[code] = n
+        result.append((name, location, code if n == 1 else f"{code}{n}"))
+    return result
+
+
+class Ids:
+    """Explicit primary keys per table, handed out in order from one id block."""
+
+    def __init__(self, block=0, stride=0):
+        self._base = block * stride
+        self._next = {}
+
+    def __call__(self, table):
+        value = self._next.get(table, self._base + 1)
+        self._next[table] = value + 1
+        return value
+
+
+def volumes(scale=1.0, overrides=None):
+    """Rows per branch: VOLUMES * scale, with per-key overrides (absolute)."""
+    count = {k: max(1, int(v * scale)) for k, v in VOLUMES.items()}
+    for key, value in (overrides or {}).items():
+        if key not in count:
+            raise ValueError(f"unknown volume {key!r}; expected one of {', '.join(VOLUMES)}")
+        count[key] = int(value)
+    return count
+
+
+def id_stride(count):
+    """
+    Size of each branch's id block: a power of ten above the most rows any
+    one table can get in a branch (payments <= 3/enrollment, reservation
+    items <= 4/reservation, ...).
+    """
+    bound = max(3 * count["enrollments"], 4 * count["reservations"], count["books"]) + 1000
+    return 10 ** math.ceil(math.log10(bound))
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal("0.01"))
+
+
+def generate_globals(password, now):
+    """Yield (table, row) for rows outside any branch, branches included."""
+    ids = Ids()
+    yield "users", (ids("users"), None, "superadmin", password, "super_admin", "active",
+                    False, "Super Admin", None, None, None)
+
+    for q in range(10):
+        yield "chatbot_faqs", (ids("chatbot_faqs"), None, f"General question {q + 1}?",
+                               f"General answer {q + 1}.")
+    for a in range(3):
+        yield "announcements", (ids("announcements"), f"School-wide announcement {a + 1}",
+                                "Classes resume on Monday.", True, now - timedelta(days=a), None)
+
+    for name, location, code in branch_names():
+        yield "branches", (ids("branches"), name, location, code, "active", True, now - timedelta(days=400))
+
+
+def generate_branch(branch_id, code, count, password, now, seed=42):
+    """Yield (table, row) for one branch; ids come from block `branch_id`."""
+    rng = random.Random(f"{seed}-{branch_id}")
+    ids = Ids(block=branch_id, stride=id_stride(count))
+    yield from _branch(rng, ids, now, password, count, branch_id, code)
+
+
+def _branch(rng, ids, now, password, count, branch_id, code):
+    staff = {}
+    for role in STAFF_ROLES:
+        staff[role] = ids("users")
+        yield "users", (staff[role], branch_id, f"{code.lower()}_{role}", password, role, "active",
+                        False, None, None, None, None)
+
+    teachers = {}
+    for grade in GRADES:
+        teachers[grade] = ids("users")
+        slug = grade.lower().replace(" ", "")
+        yield "users", (teachers[grade], branch_id, f"{code.lower()}_teacher_{slug}", password, "teacher",
+                        "active", False, _name(rng), rng.choice(["male", "female"]), grade, None)
+        for a in range(2):
+            yield "teacher_announcements", (ids("teacher_announcements"), teachers[grade], branch_id, grade,
+                                            f"{grade} reminder {a + 1}", "Please bring your books.",
+                                            now - timedelta(days=a * 3))
+
+    for q in range(count["faqs"]):
+        yield "chatbot_faqs", (ids("chatbot_faqs"), branch_id, f"{code} question {q + 1}?",
+                               f"{code} answer {q + 1}.")
+    for a in range(count["announcements"]):
+        yield "announcements", (ids("announcements"), f"{code} announcement {a + 1}",
+                                "Enrollment is ongoing.", True, now - timedelta(days=a), branch_id)
+
+    # ---- inventory ----
+    books = []          # (item_id, grade, price)
+    for n in range(count["books"]):
+        grade = GRADES[n % len(GRADES)]
+        subject = SUBJECTS[(n // len(GRADES)) % len(SUBJECTS)]
+        publisher = PUBLISHERS[(n // (len(GRADES) * len(SUBJECTS))) % len(PUBLISHERS)]
+        edition = n // (len(GRADES) * len(SUBJECTS) * len(PUBLISHERS)) + 1
+        item_id = ids("inventory_items")
+        price = _money(rng.randint(180, 650))
+        stock = rng.randint(20, 300)
+        books.append((item_id, grade, price))
+        yield "inventory_items", (item_id, branch_id, "BOOK", f"{subject} {grade} (ed. {edition})", grade,
+                                  False, None, price, stock, rng.randint(0, min(stock, 20)), True, publisher)
+
+    uniforms = []       # (item_id, grades, price)
+    for item_name, grades in UNIFORMS.items():
+        item_id = ids("inventory_items")
+        price = _money(rng.randint(350, 900))
+        totals = [0, 0]
+        sizes = []
+        for size in SIZES:
+            stock = rng.randint(10, 120)
+            reserved = rng.randint(0, min(stock, 15))
+            totals[0] += stock
+            totals[1] += reserved
+            sizes.append((ids("inventory_item_sizes"), item_id, size, stock, reserved))
+        uniforms.append((item_id, grades, price))
+        yield "inventory_items", (item_id, branch_id, "UNIFORM", item_name, grades[0], item_name == "PE Uniform",
+                                  None, price, totals[0], totals[1], True, None)
+        for row in sizes:
+            yield "inventory_item_sizes", row
+
+    # ---- enrollments and everything hanging off them ----
+    students = []       # (enrollment_id, grade, student_user_id, parent_user_id, student_name)
+    parent_no = 0
+    for no in range(1, count["enrollments"] + 1):
+        enrollment_id = ids("enrollments")
+        grade = rng.choice(GRADES)
+        created = now - timedelta(days=rng.randint(0, 180), minutes=rng.randint(0, 1440))
+        status = rng.choices(["approved", "pending", "rejected"], weights=[80, 15, 5])[0]
+        guardian = _name(rng)
+        student_name = _name(rng)
+        yield "enrollments", (enrollment_id, student_name, grade, branch_id, status, created,
+                              rng.choice(["Male", "Female"]), date(2008, 1, 1) + timedelta(days=rng.randint(0, 5000)),
+                              f"Brgy. {rng.randint(1, 30)}, {code}", f"09{rng.randint(100000000, 999999999)}",
+                              guardian, f"09{rng.randint(100000000, 999999999)}", "Previous Elementary School", no)
+
+        for doc_type in rng.sample(DOC_TYPES, 2):
+            fname = f"{enrollment_id}_{doc_type.split()[0].lower()}.pdf"
+            yield "enrollment_documents", (ids("enrollment_documents"), enrollment_id, fname,
+                                           f"/uploads/{fname}", doc_type, created)
+        if rng.random() < 0.5:
+            yield "enrollment_books", (ids("enrollment_books"), enrollment_id, f"{grade} book set", 1)
+            yield "enrollment_uniforms", (ids("enrollment_uniforms"), enrollment_id, "School uniform",
+                                          rng.choice(SIZES), 1)
+
+        if status != "approved":
+            continue
+
+        student_user = parent_user = None
+        if rng.random() < 0.6:
+            username = f"{code}-{no:04d}"
+            yield "student_accounts", (ids("student_accounts"), enrollment_id, branch_id, username,
+                                       password, True, False)
+            student_user = ids("users")
+            yield "users", (student_user, branch_id, username, password, "student", "active", False,
+                            None, None, None, enrollment_id)
+        if rng.random() < 0.4:
+            parent_no += 1
+            parent_user = ids("users")
+            yield "users", (parent_user, branch_id, f"{code}-P{parent_no:04d}", password, "parent", "active",
+                            False, guardian, None, None, None)
+            yield "parent_student", (ids("parent_student"), parent_user, enrollment_id,
+                                     rng.choice(["mother", "father", "guardian"]))
+        students.append((enrollment_id, grade, student_user, parent_user, student_name))
+
+        # bill + payments
+        bill_id = ids("billing")
+        tuition = _money(rng.randint(15000, 45000))
+        books_fee = _money(rng.randint(0, 5000))
+        uniform_fee = _money(rng.randint(0, 2500))
+        other = _money(rng.randint(500, 3000))
+        total = tuition + books_fee + uniform_fee + other
+        state = rng.choices(["pending", "partial", "paid"], weights=[30, 45, 25])[0]
+        paid = Decimal("0.00") if state == "pending" else (total if state == "paid" else _money(total * Decimal(rng.uniform(0.1, 0.9))))
+        billed = created + timedelta(days=rng.randint(0, 7))
+        yield "billing", (bill_id, enrollment_id, branch_id, tuition, books_fee, uniform_fee, other,
+                          total, paid, total - paid, state, staff["cashier"], billed, billed)
+
+        parts = rng.randint(1, 3) if paid else 0
+        remaining = paid
+        for p in range(parts):
+            amount = remaining if p == parts - 1 else _money(remaining / (parts - p))
+            remaining -= amount
+            payment_id = ids("payments")
+            paid_at = billed + timedelta(days=rng.randint(0, 60), minutes=rng.randint(0, 600))
+            yield "payments", (payment_id, bill_id, enrollment_id, branch_id, amount,
+                               rng.choice(["cash", "gcash", "bank"]), paid_at,
+                               f"OR-{paid_at:%Y%m%d}-{payment_id:06X}", "", staff["cashier"])
+
+    # ---- reservations ----
+    with_user = [s for s in students if s[2]]
+    for _ in range(count["reservations"] if with_user else 0):
+        enrollment_id, grade, student_user, parent_user, _student_name = rng.choice(with_user)
+        reservation_id = ids("reservations")
+        created = now - timedelta(days=rng.randint(0, 120), minutes=rng.randint(0, 1440))
+        status = rng.choices(["RESERVED", "PAID", "CLAIMED", "CANCELLED"], weights=[40, 25, 25, 10])[0]
+        paid_at = created + timedelta(days=1) if status in ("PAID", "CLAIMED") else None
+        claimed_at = created + timedelta(days=3) if status == "CLAIMED" else None
+        cancelled_at = created + timedelta(days=2) if status == "CANCELLED" else None
+        reserved_by = parent_user if parent_user and rng.random() < 0.3 else student_user
+        yield "reservations", (reservation_id, student_user, branch_id, grade, status, created,
+                               paid_at, claimed_at, cancelled_at, reserved_by, enrollment_id)
+
+        grade_books = [b for b in books if b[1] == grade] or books
+        for item_id, _grade, price in rng.sample(grade_books, min(len(grade_books), rng.randint(1, 3))):
+            qty = rng.randint(1, 2)
+            yield "reservation_items", (ids("reservation_items"), reservation_id, item_id, qty, None,
+                                        price, price * qty)
+        if rng.random() < 0.4:
+            item_id, _grades, price = rng.choice(uniforms)
+            yield "reservation_items", (ids("reservation_items"), reservation_id, item_id, 1,
+                                        rng.choice(SIZES), price, price)
+
+    # ---- book releases (librarian) ----
+    for enrollment_id, grade, _student_user, _parent_user, student_name in students:
+        if rng.random() >= 0.3:
+            continue
+        release_id = ids("book_releases")
+        yield "book_releases", (release_id, branch_id, enrollment_id, student_name, staff["librarian"],
+                                now - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 600)))
+        grade_books = [b for b in books if b[1] == grade] or books
+        for item_id, _grade, price in rng.sample(grade_books, min(len(grade_books), rng.randint(1, 2))):
+            yield "book_release_items", (ids("book_release_items"), release_id, item_id, 1, price)
+
+    # ---- one finished billing run (cashier billing-runs page) ----
+    started = now - timedelta(days=rng.randint(30, 90))
+    yield "billing_runs", (ids("billing_runs"), branch_id, None, _money(20000), _money(3000), _money(1500),
+                           _money(1000), "done", len(students), 0, len(students), staff["cashier"],
+                           started, started, started + timedelta(minutes=2))
@@ -0,0 +1,277 @@
+"""
+Branch-wide bulk bill generation (billing_runs, migrations/0014).
+
+A billing run applies one fee schedule (tuition, books, uniform, other) to
+every approved enrollment of a branch, optionally of one grade, that has no
+bill yet. The cashier queues it from /cashier/billing-runs; start() works
+through it on a background thread in BATCH_SIZE-enrollment batches, each one
+set-based INSERT ... SELECT committed together with the run's created_count,
+so the page can poll progress and a run that dies half way keeps what it
+billed. Each batch also moves the run's heartbeat_at (migrations/0019); a
+queued or running run without one for STALE_MINUTES is stalled: its worker
+is gone, it no longer blocks a new run of the branch (which fails it), and
+it can be resumed from the command line, keeping its created_count.
+
+Enrollments that already have a bill are never touched, so a run is safe to
+repeat. Every batch (and create_bill in routes/cashier.py) takes the
+branch's billing advisory lock (lock_branch) before checking for an
+existing bill, so a run and a cashier billing the same enrollment by hand
+cannot both insert one.
+
+    python billing.py run 12                 # work through run 12 here
+    python billing.py run 12 --resume        # ... also if it failed or stalled
+
+execute() uses plain SQL (no prepared statements), so the same code works on
+a pooled connection in the web process and a direct one here.
+"""
+import sys
+import argparse
+import logging
+import threading
+import psycopg2
+import psycopg2.extras
+
+from db import get_db_connection, _env_int
+from queries import register, run
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = _env_int("BILLING_RUN_BATCH", 500)
+STALE_MINUTES = _env_int("BILLING_RUN_STALE_MINUTES", 10)
+
+# pg_advisory_xact_lock(key, branch_id) namespace for "billing this branch"
+LOCK_KEY = 741_302_020
+
+register("billing.create_run", """
+    INSERT INTO billing_runs
+      (branch_id, grade_level, tuition_fee, books_fee, uniform_fee, other_fees, created_by)
+    VALUES (%(branch_id)s, %(grade_level)s, %(tuition_fee)s, %(books_fee)s, %(uniform_fee)s,
+            %(other_fees)s, %(created_by)s)
+    RETURNING run_id
+""")
+
+register("billing.active_run", """
+    SELECT run_id FROM billing_runs
+    WHERE branch_id = %s AND status IN ('queued', 'running')
+      AND heartbeat_at >= NOW() - %s * INTERVAL '1 minute'
+    LIMIT 1
+""")
+
+register("billing.fail_stalled", """
+    UPDATE billing_runs
+    SET status = 'failed', finished_at = NOW(),
+        error = 'Stalled: no progress for ' || %s::text || ' minutes'
+    WHERE branch_id = %s AND status IN ('queued', 'running')
+      AND heartbeat_at < NOW() - %s * INTERVAL '1 minute'
+""")
+
+register("billing.runs", """
+    SELECT r.run_id, r.branch_id, r.grade_level, r.tuition_fee, r.books_fee, r.uniform_fee,
+           r.other_fees, r.status, r.total, r.skipped, r.created_count, r.error, r.created_by,
+           r.created_at, r.started_at, r.finished_at,
+           u.username AS created_by_name,
+           (r.status IN ('queued', 'running')
+            AND r.heartbeat_at < NOW() - %s * INTERVAL '1 minute') AS stalled
+    FROM billing_runs r
+    LEFT JOIN users u ON u.user_id = r.created_by
+    WHERE r.branch_id = %s
+    ORDER BY r.created_at DESC
+    LIMIT %s
+""")
+
+register("billing.run", """
+    SELECT r.run_id, r.branch_id, r.grade_level, r.tuition_fee, r.books_fee, r.uniform_fee,
+           r.other_fees, r.status, r.total, r.skipped, r.created_count, r.error, r.created_by,
+           r.created_at, r.started_at, r.finished_at,
+           (r.status IN ('queued', 'running')
+            AND r.heartbeat_at < NOW() - %s * INTERVAL '1 minute') AS stalled
+    FROM billing_runs r
+    WHERE r.run_id = %s AND r.branch_id = %s
+""")
+
+register("billing.unbilled_by_grade", """
+    SELECT e.grade_level, COUNT(*) AS n
+    FROM enrollments e
+    WHERE e.branch_id = %s AND e.status = 'approved'
+      AND NOT EXISTS (SELECT 1 FROM billing b WHERE b.enrollment_id = e.enrollment_id)
+    GROUP BY e.grade_level
+    ORDER BY e.grade_level
+""")
+
+_SCOPE = """
+    FROM enrollments e
+    WHERE e.branch_id = %(branch_id)s AND e.status = 'approved'
+      AND (%(grade_level)s::text IS NULL OR e.grade_level = %(grade_level)s::text)
+"""
+
+# total / skipped: enrollments in scope without / with a bill when the run
+# starts. A resumed run keeps its created_count, so the bills it made before
+# count towards total rather than skipped.
+START_SQL = """
+    UPDATE billing_runs r
+    SET status = 'running', started_at = COALESCE(r.started_at, NOW()), error = NULL,
+        finished_at = NULL, heartbeat_at = NOW(),
+        total = c.unbilled + r.created_count, skipped = GREATEST(c.billed - r.created_count, 0)
+    FROM (
+        SELECT COUNT(*) FILTER (WHERE NOT s.billed) AS unbilled,
+               COUNT(*) FILTER (WHERE s.billed) AS billed
+        FROM (
+            SELECT EXISTS (SELECT 1 FROM billing b WHERE b.enrollment_id = e.enrollment_id) AS billed
+            FROM billing_runs r2
+            JOIN enrollments e
+              ON e.branch_id = r2.branch_id AND e.status = 'approved'
+             AND (r2.grade_level IS NULL OR e.grade_level = r2.grade_level)
+            WHERE r2.run_id = %(run_id)s
+        ) s
+    ) c
+    WHERE r.run_id = %(run_id)s
+      AND (r.status = 'queued'
+           OR (%(resume)s AND (r.status = 'failed'
+                               OR (r.status = 'running'
+                                   AND r.heartbeat_at < NOW() - %(stale_minutes)s * INTERVAL '1 minute'))))
+    RETURNING r.run_id, r.branch_id, r.grade_level, r.total
+"""
+
+# One batch: the next BATCH_SIZE unbilled enrollments after %(after_id)s.
+BATCH_SQL = """
+    WITH todo AS (
+        SELECT e.enrollment_id
+    """ + _SCOPE + """
+          AND e.enrollment_id > %(after_id)s
+          AND NOT EXISTS (SELECT 1 FROM billing b WHERE b.enrollment_id = e.enrollment_id)
+        ORDER BY e.enrollment_id
+        LIMIT %(limit)s
+    ), fees AS (
+        SELECT tuition_fee, books_fee, uniform_fee, other_fees, created_by,
+               tuition_fee + books_fee + uniform_fee + other_fees AS total_amount
+        FROM billing_runs WHERE run_id = %(run_id)s
+    )
+    INSERT INTO billing
+      (enrollment_id, branch_id, tuition_fee, books_fee, uniform_fee, other_fees,
+       total_amount, amount_paid, balance, status, created_by)
+    SELECT todo.enrollment_id, %(branch_id)s, f.tuition_fee, f.books_fee, f.uniform_fee, f.other_fees,
+           f.total_amount, 0, f.total_amount, 'pending', f.created_by
+    FROM todo CROSS JOIN fees f
+    RETURNING enrollment_id
+"""
+
+PROGRESS_SQL = """
+    UPDATE billing_runs SET created_count = created_count + %s, heartbeat_at = NOW()
+    WHERE run_id = %s
+"""
+
+FINISH_SQL = """
+    UPDATE billing_runs SET status = %s, error = %s, finished_at = NOW()
+    WHERE run_id = %s
+"""
+
+
+def lock_branch(cursor, branch_id):
+    """Serialize bill creation for the branch until the transaction ends."""
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (LOCK_KEY, int(branch_id)))
+
+
+def create_run(cursor, branch_id, grade_level, fees, created_by):
+    """Queue a run in the caller's transaction; start() it after the commit."""
+    run(cursor, "billing.create_run", {
+        "branch_id": branch_id,
+        "grade_level": grade_level or None,
+        "created_by": created_by,
+        **fees,
+    })
+    row = cursor.fetchone()
+    return row["run_id"] if isinstance(row, dict) else row[0]
+
+
+def execute(conn, run_id, resume=False):
+    """
+    Work through a queued run (also a failed or stalled one with resume) on
+    conn, committing each batch. Returns the number of bills created, or None when
+    the run was not in a state to start.
+    """
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute(START_SQL, {"run_id": run_id, "resume": resume, "stale_minutes": STALE_MINUTES})
+        job = cur.fetchone()
+        conn.commit()
+        if job is None:
+            return None
+
+        created = 0
+        after_id = 0
+        try:
+            while True:
+                lock_branch(cur, job["branch_id"])
+                cur.execute(BATCH_SQL, {
+                    "run_id": run_id,
+                    "branch_id": job["branch_id"],
+                    "grade_level": job["grade_level"],
+                    "after_id": after_id,
+                    "limit": BATCH_SIZE,
+                })
+                ids = [row["enrollment_id"] for row in cur.fetchall()]
+                cur.execute(PROGRESS_SQL, (len(ids), run_id))
+                conn.commit()
+                created += len(ids)
+                if len(ids) < BATCH_SIZE:
+                    break
+                after_id = max(ids)
+            cur.execute(FINISH_SQL, ("done", None, run_id))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Billing run %s failed", run_id)
+            cur.execute(FINISH_SQL, ("failed", str(e).strip()[:500], run_id))
+            conn.commit()
+            raise
+        logger.info("Billing run %s: %d bill(s) created for branch %s", run_id, created, job["branch_id"])
+        return created
+    finally:
+        cur.close()
+
+
+def _worker(run_id):
+    conn = get_db_connection()
+    try:
+        execute(conn, run_id)
+    except Exception:
+        pass            # logged and recorded on the run by execute()
+    finally:
+        conn.close()
+
+
+def start(run_id):
+    """Work through a queued run on a background thread of this process."""
+    t = threading.Thread(target=_worker, args=(run_id,), name=f"billing-run-{run_id}", daemon=True)
+    t.start()
+    return t
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python billing.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="work through a billing run")
+    p.add_argument("run_id", type=int)
+    p.add_argument("--resume", action="store_true", help="also restart a run that failed or stalled")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        created = execute(conn, args.run_id, resume=args.resume)
+    finally:
+        conn.close()
+    if created is None:
+        logger.error("Run %s is not queued (use --resume for a run that failed or stalled)", args.run_id)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+"""
+Content-addressed storage for enrollment documents (document_blobs,
+migrations/0016).
+
+Every upload is stored once per content, by SHA-256, in a sharded tree under
+the upload folder:
+
+    uploads/blobs/3f/a9/3fa9...c0.pdf      /uploads/blobs/3f/a9/3fa9...c0.pdf
+
+so a parent re-submitting the same PSA or Form 138 adds a document row, not a
+file, and no directory grows past a few hundred entries. enrollment_documents
+rows reference their blob (blob_id); document_blobs.refcount counts them and
+is changed in the same transaction as the rows (Batch.attach(),
+delete_documents()).
+
+Files are put in place by Batch.publish() before the commit, always by an
+atomic rename, so re-publishing an existing blob just replaces it with the
+same bytes. A failed commit leaves the file for the garbage collector rather
+than deleting it, since another submission may be attaching the same blob.
+
+    python blobs.py import                 # move pre-0016 uploads into the store
+    python blobs.py gc                     # delete unreferenced blobs and files
+    python blobs.py gc --rejected-days 90  # ... first dropping the documents of
+                                           #     enrollments rejected 90+ days ago
+                                           #     (enrollments.rejected_at, 0020)
+    python blobs.py recount                # repair refcounts after manual deletes
+
+gc only deletes a blob (and its preview) that has had no references for
+GRACE_MINUTES (default 60), and only removes a stray file (no document_blobs
+row, or a leftover temporary file) that is at least that old, so it never races a
+submission in flight. Deleting documents or enrollments by hand (pgAdmin)
+does not move the counters: run recount afterwards.
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import psycopg2
+
+import uploads
+from db import _env_int
+from queries import register, run
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+PREVIEW_SUFFIX = uploads.PREVIEW_SUFFIX    # previews.py, next to the blob it was rendered from
+GRACE_MINUTES = _env_int("BLOB_GC_GRACE_MINUTES", 60)
+REJECTED_DAYS = _env_int("BLOB_GC_REJECTED_DAYS", 0)      # 0 = keep documents of rejected enrollments
+BATCH_SIZE = _env_int("BLOB_GC_BATCH", 500)
+
+_EXT_ALIASES = {"jpeg": "jpg"}
+
+ATTACH_SQL = """
+    INSERT INTO document_blobs (sha256, ext, size, refcount)
+    VALUES (%s, %s, %s, 1)
+    ON CONFLICT (sha256, ext) DO UPDATE
+    SET refcount = document_blobs.refcount + 1, released_at = NULL
+    RETURNING blob_id
+"""
+
+register("blobs.attach", ATTACH_SQL)
+
+# Documents of enrollments rejected before %(before)s, a batch at a time.
+# The enrollments stay share-locked until the batch commits, so a registrar
+# approving one meanwhile waits, and one approved first is not picked.
+REJECTED_DOCUMENTS_SQL = """
+    SELECT d.doc_id
+    FROM enrollment_documents d
+    JOIN enrollments e ON e.enrollment_id = d.enrollment_id
+    WHERE e.status = 'rejected' AND e.rejected_at < %(before)s
+    ORDER BY d.doc_id
+    LIMIT %(limit)s
+    FOR SHARE OF e
+"""
+
+# Blob rows of those documents, locked in the order attach() takes them, so
+# dropping documents cannot deadlock with a submission.
+LOCK_BLOBS_SQL = """
+    SELECT b.blob_id FROM document_blobs b
+    WHERE b.blob_id IN (SELECT blob_id FROM enrollment_documents WHERE doc_id = ANY(%s))
+    ORDER BY b.sha256, b.ext
+    FOR UPDATE
+"""
+
+DELETE_DOCUMENTS_SQL = """
+    WITH gone AS (
+        DELETE FROM enrollment_documents WHERE doc_id = ANY(%s)
+        RETURNING blob_id
+    )
+    UPDATE document_blobs b
+    SET refcount = b.refcount - g.n,
+        released_at = CASE WHEN b.refcount = g.n THEN NOW() END
+    FROM (SELECT blob_id, COUNT(*) AS n FROM gone WHERE blob_id IS NOT NULL GROUP BY blob_id) g
+    WHERE b.blob_id = g.blob_id
+"""
+
+# Unreferenced past the grace period; never one a document row still points at.
+DELETE_UNREFERENCED_SQL = """
+    DELETE FROM document_blobs b
+    WHERE b.blob_id IN (
+        SELECT blob_id FROM document_blobs
+        WHERE refcount = 0 AND released_at < NOW() - %(grace)s * INTERVAL '1 minute'
+        ORDER BY released_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    )
+      AND NOT EXISTS (SELECT 1 FROM enrollment_documents d WHERE d.blob_id = b.blob_id)
+    RETURNING b.sha256, b.ext
+"""
+
+RECOUNT_SQL = """
+    UPDATE document_blobs b
+    SET refcount = c.n,
+        released_at = CASE WHEN c.n = 0 THEN COALESCE(b.released_at, NOW()) END
+    FROM (
+        SELECT b2.blob_id, COUNT(d.doc_id) AS n
+        FROM document_blobs b2
+        LEFT JOIN enrollment_documents d ON d.blob_id = b2.blob_id
+        GROUP BY b2.blob_id
+    ) c
+    WHERE b.blob_id = c.blob_id AND b.refcount <> c.n
+"""
+
+
+def normalize_ext(ext):
+    ext = ext.lower()
+    return _EXT_ALIASES.get(ext, ext)
+
+
+def blob_name(sha256, ext):
+    """Path of a blob relative to the upload folder, '/'-separated."""
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}.{normalize_ext(ext)}"
+
+
+def blob_path(folder, sha256, ext):
+    return os.path.join(folder, *blob_name(sha256, ext).split("/"))
+
+
+class Batch(uploads.Batch):
+    """uploads.Batch that names each file by its content (see module docstring)."""
+
+    def _name(self, stream, ext):
+        return blob_name(stream.sha256.hexdigest(), ext)
+
+    def attach(self, cursor):
+        """Take a reference on every staged blob; {id(item): blob_id}."""
+        ids = {}
+        for item in sorted(self.items, key=lambda i: i.name):
+            sha256, ext = item.name.rsplit("/", 1)[1].split(".")
+            run(cursor, "blobs.attach", (sha256, ext, item.stream.size))
+            row = cursor.fetchone()
+            ids[id(item)] = row["blob_id"] if isinstance(row, dict) else row[0]
+        return ids
+
+    def discard(self):
+        """Nothing to undo: another submission may share the blob; gc removes strays."""
+        self._published = []
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def import_files(conn, folder, batch=BATCH_SIZE):
+    """
+    Move the files of documents without a blob into the store. Returns
+    (imported, missing): rows moved, rows whose file is not on disk.
+    """
+    cur = conn.cursor()
+    imported = missing = 0
+    after_id = 0
+    try:
+        while True:
+            cur.execute("""
+                SELECT doc_id, file_path FROM enrollment_documents
+                WHERE blob_id IS NULL AND doc_id > %s
+                ORDER BY doc_id
+                LIMIT %s
+            """, (after_id, batch))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            found = []
+            for doc_id, file_path in rows:
+                rel = (file_path or "").removeprefix("/uploads/")
+                old = os.path.join(folder, *rel.split("/"))
+                if rel == file_path or "." not in rel or not os.path.isfile(old):
+                    missing += 1
+                    continue
+                sha256, ext = _hash_file(old), normalize_ext(rel.rsplit(".", 1)[1])
+                found.append((sha256, ext, doc_id, old))
+
+            # same lock order as Batch.attach
+            for sha256, ext, doc_id, old in sorted(found):
+                new = blob_path(folder, sha256, ext)
+                if not os.path.exists(new):
+                    os.makedirs(os.path.dirname(new), exist_ok=True)
+                    tmp = new + ".import"
+                    try:
+                        os.link(old, tmp)
+                    except OSError:
+                        shutil.copyfile(old, tmp)
+                    os.utime(tmp)           # fresh mtime: gc must not take it for a stray yet
+                    os.replace(tmp, new)
+                cur.execute(ATTACH_SQL, (sha256, ext, os.path.getsize(new)))
+                blob_id = cur.fetchone()[0]
+                cur.execute("""
+                    UPDATE enrollment_documents SET blob_id = %s, file_path = %s
+                    WHERE doc_id = %s
+                """, (blob_id, "/uploads/" + blob_name(sha256, ext), doc_id))
+            conn.commit()
+            imported += len(found)
+
+            # the old copies are only removed once no row points at them
+            for _sha256, _ext, _doc_id, old in found:
+                rel = os.path.relpath(old, folder).replace(os.sep, "/")
+                cur.execute("SELECT 1 FROM enrollment_documents WHERE file_path = %s LIMIT 1", ("/uploads/" + rel,))
+                if cur.fetchone() is None:
+                    try:
+                        os.unlink(old)
+                    except FileNotFoundError:
+                        pass
+            conn.rollback()
+        return imported, missing
+    finally:
+        cur.close()
+
+
+def delete_documents(cursor, doc_ids):
+    """Delete document rows and release their blobs, in the caller's transaction."""
+    cursor.execute(LOCK_BLOBS_SQL, (doc_ids,))
+    cursor.execute(DELETE_DOCUMENTS_SQL, (doc_ids,))
+
+
+def recount(conn):
+    """Recompute every refcount from enrollment_documents; returns rows fixed."""
+    cur = conn.cursor()
+    try:
+        # document_blobs first: a submission holding a blob row waits for
+        # nothing here, so it finishes and lets the lock through
+        cur.execute("LOCK TABLE document_blobs, enrollment_documents IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(RECOUNT_SQL)
+        fixed = cur.rowcount
+        conn.commit()
+        return fixed
+    finally:
+        cur.close()
+
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _stray_files(conn, folder, cutoff):
+    """
+    Blob files and previews with no document_blobs row, and leftover temporary
+    files, last modified before cutoff.
+    """
+    root = os.path.join(folder, BLOB_DIR)
+    candidates = []         # ((sha256, ext), path)
+    leftovers = []
+    for dirpath, _dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if name.endswith((".part", ".import")):
+                leftovers.append(path)
+                continue
+            sha256, dot, ext = name.partition(".")
+            if dot and len(sha256) == 64:
+                candidates.append(((sha256, ext.removesuffix(PREVIEW_SUFFIX)), path))
+    if not candidates:
+        return leftovers
+    cur = conn.cursor()
+    try:
+        keys = list({key for key, _path in candidates})
+        cur.execute("""
+            SELECT b.sha256, b.ext
+            FROM document_blobs b
+            JOIN unnest(%s::text[], %s::text[]) AS k(sha256, ext)
+              ON b.sha256 = k.sha256 AND b.ext = k.ext
+        """, ([k[0] for k in keys], [k[1] for k in keys]))
+        known = {(r[0], r[1]) for r in cur.fetchall()}
+        conn.rollback()
+    finally:
+        cur.close()
+    return leftovers + [path for key, path in candidates if key not in known]
+
+
+def gc(conn, folder, grace_minutes=GRACE_MINUTES, rejected_days=REJECTED_DAYS, batch=BATCH_SIZE):
+    """
+    Delete unreferenced blobs (row and file) and stray files. With
+    rejected_days, first drop the documents of enrollments rejected that long
+    ago. Returns {"documents", "blobs", "files"} counts.
+    """
+    counts = {"documents": 0, "blobs": 0, "files": 0}
+    cur = conn.cursor()
+    try:
+        if rejected_days:
+            cur.execute("SELECT NOW() - %s * INTERVAL '1 day'", (rejected_days,))
+            before = cur.fetchone()[0]
+            while True:
+                cur.execute(REJECTED_DOCUMENTS_SQL, {"before": before, "limit": batch})
+                doc_ids = [r[0] for r in cur.fetchall()]
+                if doc_ids:
+                    delete_documents(cur, doc_ids)
+                conn.commit()
+                counts["documents"] += len(doc_ids)
+                if len(doc_ids) < batch:
+                    break
+
+        while True:
+            cur.execute(DELETE_UNREFERENCED_SQL, {"grace": grace_minutes, "limit": batch})
+            gone = cur.fetchall()
+            # unlink before the commit: while the rows are locked no submission
+            # can re-attach these blobs and publish the same file
+            for sha256, ext in gone:
+                path = blob_path(folder, sha256, ext)
+                counts["files"] += _unlink_quietly(path)
+                _unlink_quietly(path + PREVIEW_SUFFIX)
+            conn.commit()
+            counts["blobs"] += len(gone)
+            if len(gone) < batch:
+                break
+    finally:
+        cur.close()
+
+    cutoff = time.time() - grace_minutes * 60
+    for path in _stray_files(conn, folder, cutoff):
+        # re-check: a submission may have just published a fresh copy
+        try:
+            if os.stat(path).st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        counts["files"] += _unlink_quietly(path)
+
+    # empty shard directories, bottom-up; a fresh one may be about to get a file
+    for dirpath, dirs, files in os.walk(os.path.join(folder, BLOB_DIR), topdown=False):
+        if not dirs and not files and dirpath != os.path.join(folder, BLOB_DIR):
+            try:
+                if os.stat(dirpath).st_mtime < cutoff:
+                    os.rmdir(dirpath)
+            except OSError:
+                pass
+
+    incoming = os.path.join(folder, uploads.INCOMING)
+    if os.path.isdir(incoming):
+        for name in os.listdir(incoming):
+            path = os.path.join(incoming, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    counts["files"] += _unlink_quietly(path)
+            except FileNotFoundError:
+                pass
+    return counts
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python blobs.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    parser.add_argument("--folder", default=uploads.upload_folder(), help="upload folder (default: ./uploads)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="move documents stored before 0016 into the blob store")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    sub.add_parser("recount", help="recompute refcounts from enrollment_documents")
+    p = sub.add_parser("gc", help="delete unreferenced blobs and stray files")
+    p.add_argument("--grace-minutes", type=int, default=GRACE_MINUTES)
+    p.add_argument("--rejected-days", type=int, default=REJECTED_DAYS,
+                   help="also drop documents of enrollments rejected this many days ago (0 = never)")
+    p.add_argument("--recount", action="store_true", help="recount refcounts first")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        if args.command == "import":
+            imported, missing = import_files(conn, args.folder, args.batch)
+            logger.info("blobs: %d documents imported, %d without a file on disk", imported, missing)
+        elif args.command == "recount":
+            logger.info("blobs: %d refcounts fixed", recount(conn))
+        else:
+            if args.recount:
+                logger.info("blobs: %d refcounts fixed", recount(conn))
+            counts = gc(conn, args.folder, args.grace_minutes, args.rejected_days, args.batch)
+            logger.info("blobs: %(documents)d rejected documents dropped, %(blobs)d blobs and "
+                        "%(files)d files deleted", counts)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,54 +1,653 @@
 import os
+import time
 import logging
+import threading
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from flask import has_request_context, session
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def get_db_connection():
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning("Invalid %s=%r, using %s", name, os.getenv(name), default)
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning("Invalid %s=%r, using %s", name, os.getenv(name), default)
+        return default
+
+
+def _connect_params():
     """
-    Returns a new PostgreSQL database connection using environment variables:
+    Connection parameters from environment variables:
     DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT
     """
+    return {
+        # Prefer IPv4 loopback to avoid ::1 (IPv6) surprises on Windows
+        "host": os.getenv("DB_HOST", "127.0.0.1"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "dbname": os.getenv("DB_NAME", "liceo_db"),   # dbname is standard param
+        "user": os.getenv("DB_USER", "liceo_db"),
+        "password": os.getenv("DB_PASSWORD", "liceo123"),
+    }
+
+
+def _read_connect_params():
+    """
+    Read-replica connection parameters, or None when DB_READ_HOST is unset.
+    DB_READ_PORT, DB_READ_NAME, DB_READ_USER and DB_READ_PASSWORD default to
+    the primary's values.
+    """
+    host = os.getenv("DB_READ_HOST")
+    if not host:
+        return None
+    params = _connect_params()
+    params.update({
+        "host": host,
+        "port": int(os.getenv("DB_READ_PORT", params["port"])),
+        "dbname": os.getenv("DB_READ_NAME", params["dbname"]),
+        "user": os.getenv("DB_READ_USER", params["user"]),
+        "password": os.getenv("DB_READ_PASSWORD", params["password"]),
+        # a dead replica has to fail fast so requests can fall back to the primary
+        "connect_timeout": _env_int("DB_READ_CONNECT_TIMEOUT", 3),
+    })
+    return params
 
-    # Prefer IPv4 loopback to avoid ::1 (IPv6) surprises on Windows
-    host = os.getenv("DB_HOST", "127.0.0.1")
-    port = int(os.getenv("DB_PORT", "5432"))
 
-    database = os.getenv("DB_NAME", "liceo_db")
-    user = os.getenv("DB_USER", "liceo_db")
-    password = os.getenv("DB_PASSWORD", "liceo123")
+# Called as observer(cursor, query, seconds) after every execute() on a pooled
+# connection's cursors; see querylog.py. None means cursors are not wrapped.
+_query_observer = None
+_timed_cursor_classes = {}
 
-    try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            dbname=database,   # dbname is standard param
-            user=user,
-            password=password,
-        )
+
+def set_query_observer(observer):
+    global _query_observer
+    _query_observer = observer
+
+
+# Called as hook(conn) each time a pool hands out a connection, e.g. to SET
+# per-endpoint timeouts (timeouts.py). The pool's RESET ALL undoes it on return.
+_checkout_hook = None
+
+
+def set_checkout_hook(hook):
+    global _checkout_hook
+    _checkout_hook = hook
+
+
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(self, query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(self, query, time.perf_counter() - started)
+
+
+def _timed_cursor_class(factory):
+    cls = _timed_cursor_classes.get(factory)
+    if cls is None:
+        cls = type("Timed" + factory.__name__, (_TimedCursorMixin, factory), {})
+        _timed_cursor_classes[factory] = cls
+    return cls
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that goes back to its pool on close().
+
+    Blueprints keep calling conn.close() in their finally blocks; for a pooled
+    connection that hands it back instead of tearing down the TCP session.
+    Closing twice is harmless (the second close is ignored). Set _broken to
+    have the pool drop it instead of reusing it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._in_use = False
+        self._broken = False
+        self._last_used = time.monotonic()
+
+    def cursor(self, *args, **kwargs):
+        if _query_observer is not None:
+            factory = kwargs.get("cursor_factory") or self.cursor_factory \
+                or psycopg2.extensions.cursor
+            kwargs["cursor_factory"] = _timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        pool = self._pool
+        if (pool is None or pool.name != "primary" or not replica_configured()
+                or not has_request_context()
+                or self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INTRANS):
+            return super().commit()
+        # only transactions that wrote something get an xid
+        cur = self._raw_cursor()
+        try:
+            cur.execute("SELECT pg_current_xact_id_if_assigned() IS NOT NULL")
+            wrote = cur.fetchone()[0]
+        finally:
+            cur.close()
+        super().commit()
+        if wrote:
+            _remember_write(self)
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            return self._close_physical()
+        if not self._in_use:
+            return None
+        pool.putconn(self)
+
+    def __del__(self):
+        # checked out and dropped without close(): give its slot back
+        pool = self.__dict__.get("_pool")
+        if pool is not None and self._in_use and pool.pid == os.getpid():
+            self._in_use = False
+            pool._discard_leaked(self)
+
+    def _raw_cursor(self):
+        """Cursor for the pool's own housekeeping; not reported to the observer."""
+        return psycopg2.extensions.connection.cursor(self)
+
+    def _close_physical(self):
+        if not self.closed:
+            psycopg2.extensions.connection.close(self)
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of PooledConnection objects.
+
+    - at most `maxconn` connections are open at once; getconn() waits up to
+      `timeout` seconds for one to be returned, then raises PoolError
+    - `minconn` connections are opened up front so the first requests after a
+      worker boots skip the handshake
+    - a connection that sat idle longer than `ping_after` seconds is checked
+      with SELECT 1 before being handed out; dead ones are replaced
+    - on return, open transactions are rolled back and SET parameters reset
+      (RESET ALL), so one request's session state never leaks into the next
+    - a checked-out connection that is garbage-collected without close() is
+      closed and its slot freed, so a leak cannot shrink the pool for good
+    """
+
+    def __init__(self, minconn, maxconn, timeout, ping_after, connect_kwargs, name="primary"):
+        self.name = name
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs
+        self.pid = os.getpid()
+
+        self._idle = []        # LIFO: most recently used first (warm caches)
+        self._size = 0         # open connections, idle + checked out
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(self.minconn):
+            try:
+                conn = self._connect()
+            except Exception:
+                break
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+
+    def _connect(self):
+        params = self.connect_kwargs
+        try:
+            conn = psycopg2.connect(connection_factory=PooledConnection, **params)
+        except psycopg2.OperationalError:
+            logger.error(
+                "DB connection failed. Check DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT. "
+                "Using host=%s port=%s db=%s user=%s",
+                params.get("host"), params.get("port"), params.get("dbname"), params.get("user")
+            )
+            raise
+        except Exception:
+            logger.exception("Unexpected error connecting to DB")
+            raise
+        conn._pool = self
+        return conn
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - conn._last_used < self.ping_after:
+            return True
+        try:
+            cur = conn._raw_cursor()
+            try:
+                cur.execute("SELECT 1")
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, conn):
+        """Return the session to a clean state; False if it must be discarded."""
+        if conn.closed:
+            return False
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # RESET ALL (not DISCARD ALL) so server-side prepared statements survive
+            conn.autocommit = True
+            cur = conn._raw_cursor()
+            try:
+                cur.execute("RESET ALL")
+            finally:
+                cur.close()
+            conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT",
+                             deferrable="DEFAULT", autocommit=False)
+            return True
+        except Exception:
+            logger.warning("Discarding pooled DB connection that failed to reset", exc_info=True)
+            return False
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("DB pool %s exhausted: %s connections in use for %.1fs",
+                                 self.name, self.maxconn, self.timeout)
+                    raise psycopg2.pool.PoolError(
+                        f"no database connection available within {self.timeout:g}s"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_alive(conn):
+                conn._close_physical()
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        conn._in_use = True
+        hook = _checkout_hook
+        if hook is not None:
+            try:
+                hook(conn)
+            except Exception:
+                conn._broken = True
+                self.putconn(conn)
+                raise
         return conn
 
-    except psycopg2.OperationalError as e:
-        logger.error(
-            "DB connection failed. Check DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT. "
-            "Using host=%s port=%s db=%s user=%s",
-            host, port, database, user
+    def putconn(self, conn):
+        conn._in_use = False
+        keep = not conn._broken and self._reset(conn)
+        with self._cond:
+            if keep and not self._closed:
+                conn._last_used = time.monotonic()
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+                conn._close_physical()
+            self._cond.notify()
+
+    def _discard_leaked(self, conn):
+        logger.warning("DB pool %s: a connection was garbage-collected without close()", self.name)
+        try:
+            conn._close_physical()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn._close_physical()
+
+
+_pools = {}                    # "primary" / "read" / "receipts" -> ConnectionPool
+_pool_lock = threading.Lock()
+
+
+def _new_pool(name):
+    if name == "read":
+        params = _read_connect_params()
+        if params is None:
+            raise psycopg2.pool.PoolError("DB_READ_HOST is not set")
+        return ConnectionPool(
+            minconn=_env_int("DB_READ_POOL_MIN", 0),
+            maxconn=_env_int("DB_READ_POOL_MAX", _env_int("DB_POOL_MAX", 10)),
+            timeout=_env_float("DB_POOL_TIMEOUT", 10),
+            ping_after=_env_float("DB_POOL_PING_AFTER", 30),
+            connect_kwargs=params,
+            name="read",
+        )
+    if name == "receipts":
+        # short side transactions taken while a request holds a primary
+        # connection (receipts.py); kept apart so they never wait on that pool
+        return ConnectionPool(
+            minconn=0,
+            maxconn=_env_int("DB_RECEIPTS_POOL_MAX", 2),
+            timeout=_env_float("DB_POOL_TIMEOUT", 10),
+            ping_after=_env_float("DB_POOL_PING_AFTER", 30),
+            connect_kwargs=_connect_params(),
+            name="receipts",
         )
-        raise
+    return ConnectionPool(
+        minconn=_env_int("DB_POOL_MIN", 1),
+        maxconn=_env_int("DB_POOL_MAX", 10),
+        timeout=_env_float("DB_POOL_TIMEOUT", 10),
+        ping_after=_env_float("DB_POOL_PING_AFTER", 30),
+        connect_kwargs=_connect_params(),
+    )
+
+
+def get_pool(name="primary"):
+    """
+    Returns this process's connection pool, creating it on first use.
+    name="read" is the replica pool (only when DB_READ_HOST is set);
+    name="receipts" a small primary pool for receipts.py's block reservations.
+
+    Pool settings come from environment variables:
+    DB_POOL_MIN (default 1), DB_POOL_MAX (default 10),
+    DB_POOL_TIMEOUT (seconds to wait for a free connection, default 10),
+    DB_POOL_PING_AFTER (idle seconds before a liveness check, default 30),
+    DB_READ_POOL_MIN (default 0), DB_READ_POOL_MAX (default DB_POOL_MAX),
+    DB_RECEIPTS_POOL_MAX (default 2)
+    """
+    pool = _pools.get(name)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        # After a fork (gunicorn preload) the parent's sockets are not ours:
+        # drop them without closing so the parent's sessions stay intact.
+        pool = _pools.get(name)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[name] = _new_pool(name)
+        return pool
+
 
+def close_pool():
+    """Close every idle pooled connection (e.g. on worker shutdown)."""
+    with _pool_lock:
+        for pool in _pools.values():
+            if pool.pid == os.getpid():
+                pool.closeall()
+        _pools.clear()
+
+
+def get_db_connection():
+    """
+    Returns a PostgreSQL connection from the process-wide pool.
+    Call conn.close() when done, as before: it goes back to the pool.
+    """
+    return get_pool().getconn()
+
+
+# =======================
+# READ REPLICA
+# =======================
+# Read-only handlers call get_read_connection(). With DB_READ_HOST set it
+# hands out a replica connection unless
+# - the replica failed recently (tried again after DB_READ_RETRY_AFTER s),
+# - it lags more than DB_READ_MAX_LAG s (checked every DB_READ_LAG_CHECK s), or
+# - this user committed a write the replica has not replayed yet: commits on
+#   the primary store their WAL position in the Flask session, and reads go
+#   to the primary until the replica has caught up to it (read-your-writes),
+# in which case it falls back to a primary connection.
+READ_MAX_LAG = _env_float("DB_READ_MAX_LAG", 10)
+READ_LAG_CHECK = _env_float("DB_READ_LAG_CHECK", 5)
+READ_RETRY_AFTER = _env_float("DB_READ_RETRY_AFTER", 30)
+WRITE_LSN_KEY = "_db_write_lsn"
+
+_replica = {"down_until": 0.0, "checked_at": float("-inf"), "lag": 0.0}
+_replica_lock = threading.Lock()
+
+
+def replica_configured():
+    return bool(os.getenv("DB_READ_HOST"))
+
+
+def _remember_write(conn):
+    """Store the primary's WAL position after this user's committed write."""
+    try:
+        cur = conn._raw_cursor()
+        try:
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            session[WRITE_LSN_KEY] = cur.fetchone()[0]
+        finally:
+            cur.close()
+        psycopg2.extensions.connection.rollback(conn)
     except Exception:
-        logger.exception("Unexpected error connecting to DB")
-        raise
+        logger.warning("Could not record write position for read-your-writes", exc_info=True)
+
+
+def _replica_down(reason):
+    with _replica_lock:
+        _replica["down_until"] = time.monotonic() + READ_RETRY_AFTER
+    logger.warning("Read replica %s; using the primary for %ss", reason, READ_RETRY_AFTER)
+
+
+def _replica_ready(conn, lsn):
+    """True if the replica behind `conn` is fresh enough for this request."""
+    now = time.monotonic()
+    cur = conn._raw_cursor()
+    try:
+        if now - _replica["checked_at"] >= READ_LAG_CHECK:
+            cur.execute("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """)
+            lag = float(cur.fetchone()[0])
+            with _replica_lock:
+                if lag > READ_MAX_LAG >= _replica["lag"]:
+                    logger.warning("Read replica is %.1fs behind; using the primary", lag)
+                _replica["checked_at"] = now
+                _replica["lag"] = lag
+        if _replica["lag"] > READ_MAX_LAG:
+            return False
+
+        if lsn:
+            cur.execute(
+                "SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, NOT pg_is_in_recovery())",
+                (lsn,),
+            )
+            if not cur.fetchone()[0]:
+                return False
+            session.pop(WRITE_LSN_KEY, None)
+        return True
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def get_read_connection():
+    """
+    Returns a connection for read-only work: the read replica when one is
+    configured and usable, otherwise the primary. Close it as usual.
+    Never write through it.
+    """
+    if not replica_configured() or time.monotonic() < _replica["down_until"]:
+        return get_db_connection()
+
+    lsn = session.get(WRITE_LSN_KEY) if has_request_context() else None
+    try:
+        conn = get_pool("read").getconn()
+    except psycopg2.pool.PoolError:
+        # replica pool busy: not a replica failure
+        return get_db_connection()
+    except Exception:
+        _replica_down("is unreachable")
+        return get_db_connection()
+
+    try:
+        ready = _replica_ready(conn, lsn)
+    except Exception:
+        conn._broken = True
+        conn.close()
+        _replica_down("failed a freshness check")
+        return get_db_connection()
+
+    if not ready:
+        conn.close()
+        return get_db_connection()
+    return conn
+
+
+# =======================
+# BRANCH STATUS CACHE
+# =======================
+# is_branch_active() runs on every payment/reservation/enrollment POST, but
+# branch status almost never changes. Lookups are cached per process for
+# BRANCH_STATUS_TTL seconds; when a branch is changed, notify_branch_changed()
+# sends a NOTIFY that a listener thread in every worker uses to drop the entry
+# right away. The TTL only matters if the listener is down.
+BRANCH_STATUS_TTL = _env_float("BRANCH_STATUS_TTL", 60)
+BRANCH_CHANNEL = "liceo_branch_changed"
+
+_branch_status = {}            # branch_id -> (is_active, expires_at)
+_branch_generation = 0         # bumped by every invalidation
+_branch_status_lock = threading.Lock()
+_listener = None               # (pid, thread)
+_listener_lock = threading.Lock()
+
+
+def invalidate_branch_status(branch_id=None):
+    """Drop one cached branch status (or all of them) in this process."""
+    global _branch_generation
+    with _branch_status_lock:
+        _branch_generation += 1
+        if branch_id is None:
+            _branch_status.clear()
+        else:
+            _branch_status.pop(int(branch_id), None)
+
+
+def notify_branch_changed(cursor, branch_id):
+    """
+    Tell every worker process to forget its cached status for branch_id.
+    Runs on the caller's cursor, so the NOTIFY is only delivered on commit.
+    """
+    cursor.execute("SELECT pg_notify(%s, %s)", (BRANCH_CHANNEL, str(branch_id)))
+    invalidate_branch_status(branch_id)
+
+
+def _listen_for_branch_changes():
+    import select
+
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**_connect_params())
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {BRANCH_CHANNEL}")
+            # anything cached before LISTEN was issued may have missed a NOTIFY
+            invalidate_branch_status()
+            backoff = 1
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    note = conn.notifies.pop(0)
+                    payload = (note.payload or "").strip()
+                    invalidate_branch_status(int(payload) if payload.isdigit() else None)
+        except Exception:
+            logger.warning("Branch status listener lost its connection; retrying in %ss", backoff)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        invalidate_branch_status()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+
+def _ensure_branch_listener():
+    global _listener
+    if _listener is not None and _listener[0] == os.getpid():
+        return
+    with _listener_lock:
+        if _listener is None or _listener[0] != os.getpid():
+            t = threading.Thread(target=_listen_for_branch_changes,
+                                 name="branch-status-listener", daemon=True)
+            t.start()
+            _listener = (os.getpid(), t)
 
 
 def is_branch_active(branch_id):
     """
     Returns True if branch status is 'active' (or branch does not exist),
     False if status is anything else (e.g. 'inactive').
+    Served from the per-process branch status cache when possible.
     """
     if not branch_id:
         return True
+    branch_id = int(branch_id)
+
+    _ensure_branch_listener()
+    now = time.monotonic()
+    with _branch_status_lock:
+        cached = _branch_status.get(branch_id)
+        generation = _branch_generation
+    if cached and cached[1] > now:
+        return cached[0]
 
     conn = get_db_connection()
     cur = conn.cursor()
@@ -56,9 +655,9 @@ def is_branch_active(branch_id):
         cur.execute("SELECT status FROM branches WHERE branch_id = %s", (branch_id,))
         row = cur.fetchone()
         if not row:
-            return True
-        status = row[0]
-        return str(status or "").strip().lower() == "active"
+            active = True
+        else:
+            active = str(row[0] or "").strip().lower() == "active"
     except Exception:
         logger.exception("Failed to check branch status")
         return True
@@ -68,3 +667,9 @@ def is_branch_active(branch_id):
         except Exception:
             pass
         conn.close()
+
+    with _branch_status_lock:
+        # a NOTIFY that arrived during the SELECT may be newer than what we read
+        if generation == _branch_generation:
+            _branch_status[branch_id] = (active, now + BRANCH_STATUS_TTL)
+    return active
@@ -0,0 +1,86 @@
+"""
+Per-branch enrollment numbers (enrollment_counters, migrations/0015).
+
+branch_enrollment_no is the number parents see on the success page and the
+registrar lists by (#1, #2, ... per branch). next_number() takes it from the
+branch's counter row inside the enrollment's own transaction: the row stays
+locked until that transaction ends, so concurrent submissions to one branch
+queue on it briefly instead of racing on MAX()+1, and a rollback gives the
+number back. uq_enrollments_branch_no (0003) still backs it.
+
+    python enrollments.py backfill      # counters up to MAX(branch_enrollment_no)
+
+Run the backfill after loading enrollments by other means than student.enroll
+(a restore, a bulk COPY). It only ever moves a counter forward.
+"""
+import sys
+import argparse
+import logging
+import psycopg2
+
+from queries import register, run
+
+logger = logging.getLogger(__name__)
+
+register("enrollments.next_number", """
+    INSERT INTO enrollment_counters (branch_id, last_no)
+    VALUES (%s, 1)
+    ON CONFLICT (branch_id) DO UPDATE
+    SET last_no = enrollment_counters.last_no + 1
+    RETURNING last_no
+""")
+
+BACKFILL_SQL = """
+    INSERT INTO enrollment_counters (branch_id, last_no)
+    SELECT br.branch_id, COALESCE(MAX(e.branch_enrollment_no), 0)
+    FROM branches br
+    LEFT JOIN enrollments e ON e.branch_id = br.branch_id
+    GROUP BY br.branch_id
+    ON CONFLICT (branch_id) DO UPDATE
+    SET last_no = GREATEST(enrollment_counters.last_no, EXCLUDED.last_no)
+"""
+
+
+def next_number(cursor, branch_id):
+    """Next enrollment number of the branch; the caller's transaction owns it."""
+    run(cursor, "enrollments.next_number", (branch_id,))
+    row = cursor.fetchone()
+    return row["last_no"] if isinstance(row, dict) else row[0]
+
+
+def backfill(conn):
+    """Raise every branch's counter to its highest existing number."""
+    cur = conn.cursor()
+    try:
+        cur.execute(BACKFILL_SQL)
+        rows = cur.rowcount
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python enrollments.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="raise the counters to the existing enrollment numbers")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        count = backfill(conn)
+    finally:
+        conn.close()
+    logger.info("enrollment_counters: %d branches checked", count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Versioned SQL migrations.
+
+    python migrate.py status            # applied / pending versions
+    python migrate.py up                # apply pending migrations in order
+    python migrate.py up --to 0004      # ... up to and including a version
+    python migrate.py mark --all        # record as applied without running them
+    python migrate.py mark 0001 0002    # (for databases migrated by hand in pgAdmin)
+
+`up` refuses to start on a database that has the app's tables but no
+recorded migrations: it cannot know which files were already run by hand.
+`mark` the versions that database already has first (a baseline), then run
+`up` for the rest. `up --existing-schema` skips the check for a database
+built from the `sql` dump, which predates every migration.
+
+Migrations are migrations/NNNN_name.sql, applied in version order. Each
+applied version is stored in schema_migrations with a checksum of the file;
+`status` warns when an applied file was edited afterwards.
+
+A migration runs in one transaction together with its schema_migrations row.
+A file containing the line
+
+    -- migrate: no-transaction
+
+is run statement by statement outside a transaction instead, which is what
+CREATE INDEX CONCURRENTLY needs (the table stays writable while the index
+builds). Such files must be safe to re-run (IF NOT EXISTS): a failure half
+way leaves the earlier statements applied and the version unrecorded. A
+failed concurrent build also leaves an INVALID index behind; it is dropped
+before the statement is retried, so IF NOT EXISTS does not skip it.
+
+Only one runner works on a database at a time (advisory lock), and DDL waits
+at most MIGRATE_LOCK_TIMEOUT (default 5s) for a table lock instead of
+queueing every request behind it. Connection settings are the usual
+DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD.
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import logging
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+LOCK_TIMEOUT = os.getenv("MIGRATE_LOCK_TIMEOUT", "5s")
+ADVISORY_LOCK_ID = 741_302_001
+
+_FILENAME = re.compile(r"(\d+)_(\w+)\.sql$")
+_NO_TRANSACTION = re.compile(r"^\s*--\s*migrate:\s*no-transaction\s*$", re.IGNORECASE | re.MULTILINE)
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+# Things a ';' inside of does not end a statement.
+_TOKEN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\1\$|;", re.DOTALL)
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def checksum(sql):
+    # line endings differ between checkouts (several files here are CRLF)
+    return hashlib.sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+
+
+def migrations(directory=MIGRATIONS_DIR):
+    """[(version, name, path)] sorted by version."""
+    found = []
+    for fname in os.listdir(directory):
+        m = _FILENAME.match(fname)
+        if m:
+            found.append((m.group(1), m.group(2), os.path.join(directory, fname)))
+        elif fname.endswith(".sql"):
+            logger.warning("Ignoring %s: migration files are named NNNN_name.sql", fname)
+    found.sort(key=lambda m: int(m[0]))
+    versions = [m[0] for m in found]
+    duplicates = sorted({v for v in versions if versions.count(v) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate migration versions: {', '.join(duplicates)}")
+    return found
+
+
+def split_statements(sql):
+    """Split on top-level ';' (not inside quotes, dollar quotes or comments)."""
+    statements = []
+    start = 0
+    for m in _TOKEN.finditer(sql):
+        if m.group(0) == ";":
+            statements.append(sql[start:m.start()])
+            start = m.end()
+    statements.append(sql[start:])
+    return [s.strip() for s in statements if _COMMENTS.sub("", s).strip()]
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     VARCHAR(20) PRIMARY KEY,
+            name        VARCHAR(200) NOT NULL,
+            checksum    CHAR(64) NOT NULL,
+            applied_at  TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """)
+
+
+def applied(conn):
+    """{version: (name, checksum, applied_at)} already recorded."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        _ensure_table(cur)
+        cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def _record(cur, version, name, sql, duration_ms):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+        (version, name, checksum(sql), duration_ms),
+    )
+
+
+def _drop_invalid_index(cur, name):
+    cur.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (name,))
+    if cur.fetchone():
+        logger.warning("Dropping invalid index %s left by an earlier failed build", name)
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def apply(conn, version, name, path, transform=None):
+    """Run one migration file and record it."""
+    sql = _read(path)
+    body = transform(sql) if transform else sql
+    started = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        if _NO_TRANSACTION.search(sql):
+            conn.autocommit = True
+            for stmt in split_statements(body):
+                m = _CONCURRENT_INDEX.search(stmt)
+                if m:
+                    _drop_invalid_index(cur, m.group(1))
+                cur.execute(stmt)
+            _record(cur, version, name, sql, int((time.perf_counter() - started) * 1000))
+        else:
+            conn.autocommit = False
+            try:
+                if split_statements(body):     # transform may leave only comments
+                    cur.execute(body)
+                _record(cur, version, name, sql, int((time.perf_counter() - started) * 1000))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        cur.close()
+        conn.autocommit = True
+    logger.info("Applied %s_%s in %.1fs", version, name, time.perf_counter() - started)
+
+
+def _lock(conn):
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("SET lock_timeout = %s", (LOCK_TIMEOUT,))
+        cur.execute("SET statement_timeout = 0")
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            raise RuntimeError("another migration run holds the lock on this database")
+    finally:
+        cur.close()
+
+
+def _unlock(conn):
+    if conn.closed:
+        return
+    conn.rollback()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+    finally:
+        cur.close()
+
+
+def _unrecorded_schema(conn):
+    """True if the app's tables exist although schema_migrations is empty."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('public.enrollments') IS NOT NULL")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+def migrate(conn, target=None, transform=None, directory=MIGRATIONS_DIR, existing_schema=False):
+    """
+    Apply pending migrations (up to `target`) in version order.
+    `transform(sql)` may rewrite each file before it runs (bench strips
+    GRANTs); the checksum is always of the file itself. Returns the versions
+    applied. Raises RuntimeError on a database with tables but no recorded
+    migrations unless existing_schema is set (see the module docstring).
+    """
+    _lock(conn)
+    try:
+        done = applied(conn)
+        if not done and not existing_schema and _unrecorded_schema(conn):
+            raise RuntimeError(
+                "schema_migrations is empty but this database already has tables. "
+                "Record the migrations it already has first, e.g. "
+                "`python migrate.py mark 0001 0002` (or `mark --all` if it is fully up to date), "
+                "then run `up` again; use `up --existing-schema` only for a database "
+                "freshly built from the sql dump."
+            )
+        ran = []
+        for version, name, path in migrations(directory):
+            if target is not None and int(version) > int(target):
+                break
+            if version in done:
+                continue
+            apply(conn, version, name, path, transform=transform)
+            ran.append(version)
+        return ran
+    finally:
+        _unlock(conn)
+
+
+def mark(conn, versions=None, directory=MIGRATIONS_DIR):
+    """Record migrations as applied without running them (None = all)."""
+    _lock(conn)
+    try:
+        done = applied(conn)
+        cur = conn.cursor()
+        try:
+            marked = []
+            for version, name, path in migrations(directory):
+                if version in done or (versions is not None and version not in versions):
+                    continue
+                _record(cur, version, name, _read(path), None)
+                marked.append(version)
+        finally:
+            cur.close()
+        unknown = set(versions or ()) - {m[0] for m in migrations(directory)}
+        if unknown:
+            logger.warning("No migration file for version(s): %s", ", ".join(sorted(unknown)))
+        return marked
+    finally:
+        _unlock(conn)
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """[(version, name, state)] where state is applied / pending / changed."""
+    done = applied(conn)
+    rows = []
+    for version, name, path in migrations(directory):
+        if version not in done:
+            rows.append((version, name, "pending"))
+        elif done[version][1] != checksum(_read(path)):
+            rows.append((version, name, "changed since applied"))
+        else:
+            rows.append((version, name, f"applied {done[version][2]:%Y-%m-%d %H:%M}"))
+    return rows
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python migrate.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="list applied and pending migrations")
+    p = sub.add_parser("up", help="apply pending migrations")
+    p.add_argument("--to", default=None, help="stop after this version")
+    p.add_argument("--existing-schema", action="store_true",
+                   help="run on tables no migration was recorded for (a fresh load of the sql dump)")
+    p = sub.add_parser("mark", help="record migrations as applied without running them")
+    p.add_argument("versions", nargs="*")
+    p.add_argument("--all", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        if args.command == "status":
+            for version, name, state in status(conn):
+                logger.info("%s  %-45s %s", version, name, state)
+        elif args.command == "up":
+            try:
+                ran = migrate(conn, target=args.to, existing_schema=args.existing_schema)
+            except RuntimeError as e:
+                logger.error("%s", e)
+                return 1
+            logger.info("%d migration(s) applied", len(ran))
+        else:
+            if not args.all and not args.versions:
+                parser.error("mark needs versions or --all")
+            marked = mark(conn, None if args.all else set(args.versions))
+            logger.info("Marked %s", ", ".join(marked) or "nothing")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
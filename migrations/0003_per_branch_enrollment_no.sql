@@ -0,0 +1,25 @@
+-- Per-branch enrollment numbers: branch_enrollment_no is the user-visible
+-- number, unique and sequential per branch (1, 2, 3... per branch; handed
+-- out by enrollments.py).
+--
+-- Only the schema change is versioned. The one-off data reset that used to
+-- precede it (deleting every enrollment, payment, billing, parent and
+-- student account row and restarting their sequences) is not a migration
+-- and must never run as part of `migrate.py up`.
+
+ALTER TABLE public.enrollments
+    ADD COLUMN IF NOT EXISTS branch_enrollment_no INTEGER;
+
+-- no two students in the same branch share a branch_enrollment_no
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'uq_enrollments_branch_no'
+    ) THEN
+        ALTER TABLE public.enrollments
+            ADD CONSTRAINT uq_enrollments_branch_no
+            UNIQUE (branch_id, branch_enrollment_no);
+    END IF;
+END
+$$;
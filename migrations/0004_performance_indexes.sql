@@ -0,0 +1,45 @@
+-- Performance index pack, derived from the WHERE / ORDER BY clauses in routes/.
+-- migrate: no-transaction
+--
+-- Built CONCURRENTLY so enrollments, payments and reservations stay writable
+-- while the indexes build. bench/indexes.py EXPLAINs the queries listed next
+-- to each index and fails if they do not use it.
+--
+-- users(username) and student_accounts(username) are not here: the UNIQUE
+-- constraints users_username_key / student_accounts_username_key already
+-- index them (login, account creation, cashier reservation join).
+
+-- cashier dashboard queue: WHERE branch_id = ? AND status = 'approved' ORDER BY ..., created_at DESC
+-- teacher roster:          WHERE branch_id = ? AND status = 'approved'
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollments_branch_status_created
+    ON public.enrollments (branch_id, status, created_at DESC);
+
+-- reservations per branch and status (RESERVED / PAID / CLAIMED queues), newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservations_branch_status_created
+    ON public.reservations (branch_id, status, created_at DESC);
+
+-- cashier reservation list: WHERE r.branch_id = ? ORDER BY r.created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservations_branch_created
+    ON public.reservations (branch_id, created_at DESC);
+
+-- librarian releases: WHERE br.branch_id = ? ORDER BY br.created_at DESC LIMIT 50
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_releases_branch_created
+    ON public.book_releases (branch_id, created_at DESC);
+
+-- teacher dashboard / student portal announcements:
+--   WHERE a.branch_id = ? AND a.grade_level ILIKE ... ORDER BY a.created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_teacher_ann_branch_created
+    ON public.teacher_announcements (branch_id, created_at DESC);
+
+-- per-enrollment lookups: registrar dashboard, /track, parent and student portals
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollment_documents_enrollment
+    ON public.enrollment_documents (enrollment_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollment_books_enrollment
+    ON public.enrollment_books (enrollment_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollment_uniforms_enrollment
+    ON public.enrollment_uniforms (enrollment_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_student_accounts_enrollment
+    ON public.student_accounts (enrollment_id);
@@ -0,0 +1,17 @@
+-- Daily collection rollups: one row per branch, day, cashier and payment
+-- method, kept up to date by the payment insert (rollups.record_payment) in
+-- the same transaction. Fill or repair it from payments with
+--     python rollups.py backfill
+
+CREATE TABLE IF NOT EXISTS public.daily_collections (
+    branch_id       INTEGER NOT NULL REFERENCES public.branches(branch_id) ON DELETE CASCADE,
+    collection_date DATE NOT NULL,
+    received_by     INTEGER NOT NULL,
+    payment_method  VARCHAR(20) NOT NULL,
+    payment_count   INTEGER NOT NULL DEFAULT 0,
+    total_amount    NUMERIC(14,2) NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (branch_id, collection_date, received_by, payment_method)
+);
+
+GRANT INSERT, DELETE, SELECT, UPDATE ON TABLE public.daily_collections TO liceo_db;
@@ -0,0 +1,9 @@
+-- Each branch's local timezone. Report periods (day, week, month, term) and
+-- the daily_collections days are branch-local; payments.payment_date stays a
+-- timestamp in the server's TimeZone.
+--
+-- After changing a branch's timezone, rebuild its rollups:
+--     python rollups.py backfill
+
+ALTER TABLE public.branches
+    ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) NOT NULL DEFAULT 'Asia/Manila';
@@ -0,0 +1,7 @@
+-- Cashier reports and exports: WHERE p.branch_id = ? AND p.payment_date >= ? AND p.payment_date < ?
+-- ORDER BY p.payment_date (routes/cashier.py). Replaces scanning every payment
+-- of the day across branches through idx_payments_payment_date.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_branch_date
+    ON public.payments (branch_id, payment_date);
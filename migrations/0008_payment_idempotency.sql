@@ -0,0 +1,13 @@
+-- Idempotency key for posted payments (routes/cashier.py process_payment).
+-- migrate: no-transaction
+--
+-- The payment form carries a one-time key; a resubmitted or double-clicked
+-- form inserts nothing the second time and lands on the first receipt.
+-- Payments posted before this migration have no key.
+
+ALTER TABLE public.payments
+    ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_payments_idempotency_key
+    ON public.payments (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
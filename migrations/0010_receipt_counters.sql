@@ -0,0 +1,27 @@
+-- Sequential receipt numbers per branch, series and branch-local day
+-- (receipts.py), replacing the random OR-YYYYMMDD-XXXXXX suffix.
+-- migrate: no-transaction
+--
+--   OR  official receipts for payments: gap-free, taken inside the payment's
+--       own transaction
+--   CS  claim slips for reservations: handed out from pre-allocated blocks,
+--       so numbers skipped by a restarted worker are never reused
+--
+-- payments.receipt_number is already UNIQUE (payments_receipt_number_key).
+
+CREATE TABLE IF NOT EXISTS public.receipt_counters (
+    branch_id    INTEGER NOT NULL REFERENCES public.branches(branch_id) ON DELETE CASCADE,
+    series       VARCHAR(4) NOT NULL,
+    receipt_date DATE NOT NULL,
+    last_number  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (branch_id, series, receipt_date)
+);
+
+GRANT INSERT, SELECT, UPDATE ON TABLE public.receipt_counters TO liceo_db;
+
+ALTER TABLE public.reservations
+    ADD COLUMN IF NOT EXISTS receipt_number VARCHAR(50);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_reservations_receipt_number
+    ON public.reservations (receipt_number)
+    WHERE receipt_number IS NOT NULL;
@@ -0,0 +1,16 @@
+-- Cashier student search and autocomplete (routes/cashier.py):
+--   WHERE e.branch_id = ? AND (<vector> @@ to_tsquery('simple', 'jua:* & del:*')
+--                              OR e.branch_enrollment_no = ? OR e.enrollment_id = ?)
+-- migrate: no-transaction
+--
+-- Full-text (tsvector) rather than pg_trgm, which not every server here has
+-- installed: name words match by prefix, so typing "jua del" finds
+-- "Juan Dela Cruz". The expression must stay identical to ENROLLMENT_SEARCH_VECTOR
+-- in routes/cashier.py or the planner will not use the index.
+-- branch_enrollment_no is covered by the (branch_id, branch_enrollment_no)
+-- unique constraint from 0003, enrollment_id by the primary key.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollments_search
+    ON public.enrollments
+    USING gin (to_tsvector('simple'::regconfig,
+                           COALESCE(student_name, '') || ' ' || COALESCE(guardian_name, '')));
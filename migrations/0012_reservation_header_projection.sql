@@ -0,0 +1,17 @@
+-- Reservation header projection: who the reservation is for, who made it and
+-- its totals, stored on the reservation when it is written (reservations.py)
+-- so the cashier list reads one table instead of resolving users ->
+-- student_accounts -> enrollments and parent_student per row.
+--
+-- New columns default to empty; fill existing reservations afterwards with
+--     python reservations.py backfill
+
+ALTER TABLE public.reservations
+    ADD COLUMN IF NOT EXISTS student_name             TEXT,
+    ADD COLUMN IF NOT EXISTS student_username         TEXT,
+    ADD COLUMN IF NOT EXISTS grade_level              TEXT,
+    ADD COLUMN IF NOT EXISTS reserved_by_role         VARCHAR(10),
+    ADD COLUMN IF NOT EXISTS reserved_by_name         TEXT,
+    ADD COLUMN IF NOT EXISTS reserved_by_relationship TEXT,
+    ADD COLUMN IF NOT EXISTS total_qty                INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS total_amount             NUMERIC(12,2) NOT NULL DEFAULT 0;
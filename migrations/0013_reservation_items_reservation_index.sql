@@ -0,0 +1,9 @@
+-- Reservation totals (reservations.py refresh/backfill, receipt and item views):
+--   SELECT ... FROM reservation_items WHERE reservation_id = ?
+-- migrate: no-transaction
+--
+-- reservation_items had no index on its parent key, so summing one
+-- reservation's lines read the whole table.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_items_reservation
+    ON public.reservation_items (reservation_id);
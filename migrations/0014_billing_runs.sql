@@ -0,0 +1,31 @@
+-- Branch-wide bulk bill generation (billing.py): one row per run, with the
+-- fee schedule it applies and its progress. A run bills every approved
+-- enrollment of the branch (optionally one grade) that has no bill yet, in
+-- batches, from a background thread; created_count moves with each batch.
+--
+--   status  queued -> running -> done | failed
+
+CREATE TABLE IF NOT EXISTS public.billing_runs (
+    run_id        SERIAL PRIMARY KEY,
+    branch_id     INTEGER NOT NULL REFERENCES public.branches(branch_id) ON DELETE CASCADE,
+    grade_level   VARCHAR(50),
+    tuition_fee   NUMERIC(10,2) NOT NULL DEFAULT 0,
+    books_fee     NUMERIC(10,2) NOT NULL DEFAULT 0,
+    uniform_fee   NUMERIC(10,2) NOT NULL DEFAULT 0,
+    other_fees    NUMERIC(10,2) NOT NULL DEFAULT 0,
+    status        VARCHAR(10) NOT NULL DEFAULT 'queued',
+    total         INTEGER,
+    skipped       INTEGER,
+    created_count INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    created_by    INTEGER NOT NULL,
+    created_at    TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    started_at    TIMESTAMP WITHOUT TIME ZONE,
+    finished_at   TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_billing_runs_branch_created
+    ON public.billing_runs (branch_id, created_at DESC);
+
+GRANT INSERT, SELECT, UPDATE ON TABLE public.billing_runs TO liceo_db;
+GRANT USAGE, SELECT ON SEQUENCE public.billing_runs_run_id_seq TO liceo_db;
@@ -0,0 +1,22 @@
+-- Per-branch enrollment numbers from a counter row (enrollments.py),
+-- replacing COALESCE(MAX(branch_enrollment_no), 0) + 1 in student.enroll,
+-- which scanned the branch's enrollments and let two parents submitting at
+-- once race into uq_enrollments_branch_no.
+--
+-- last_no is the highest number handed out so far; the backfill starts every
+-- branch at its current MAX, and never moves a counter backwards.
+
+CREATE TABLE IF NOT EXISTS public.enrollment_counters (
+    branch_id INTEGER PRIMARY KEY REFERENCES public.branches(branch_id) ON DELETE CASCADE,
+    last_no   INTEGER NOT NULL DEFAULT 0
+);
+
+GRANT INSERT, SELECT, UPDATE ON TABLE public.enrollment_counters TO liceo_db;
+
+INSERT INTO public.enrollment_counters (branch_id, last_no)
+SELECT br.branch_id, COALESCE(MAX(e.branch_enrollment_no), 0)
+FROM public.branches br
+LEFT JOIN public.enrollments e ON e.branch_id = br.branch_id
+GROUP BY br.branch_id
+ON CONFLICT (branch_id) DO UPDATE
+SET last_no = GREATEST(enrollment_counters.last_no, EXCLUDED.last_no);
@@ -0,0 +1,33 @@
+-- Content-addressed storage for enrollment documents (blobs.py).
+--
+-- Each distinct upload is stored once, as
+-- uploads/blobs/<sha[0:2]>/<sha[2:4]>/<sha256>.<ext>, instead of one UUID-named
+-- copy per submission in a single flat directory. enrollment_documents.blob_id
+-- points at it; refcount is the number of document rows that do, kept by the
+-- code that inserts and deletes those rows. released_at is when it last
+-- dropped to 0, so the garbage collector (python blobs.py gc) can leave a
+-- grace period before deleting the row and the file.
+--
+-- Rows from before this migration keep blob_id NULL and their old file_path
+-- until `python blobs.py import` moves their files into the store.
+
+CREATE TABLE IF NOT EXISTS public.document_blobs (
+    blob_id     SERIAL PRIMARY KEY,
+    sha256      CHAR(64) NOT NULL,
+    ext         VARCHAR(8) NOT NULL,
+    size        BIGINT NOT NULL,
+    refcount    INTEGER NOT NULL DEFAULT 0 CHECK (refcount >= 0),
+    created_at  TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    released_at TIMESTAMP WITHOUT TIME ZONE,
+    CONSTRAINT uq_document_blobs_sha256_ext UNIQUE (sha256, ext)
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_blobs_unreferenced
+    ON public.document_blobs (released_at)
+    WHERE refcount = 0;
+
+ALTER TABLE public.enrollment_documents
+    ADD COLUMN IF NOT EXISTS blob_id INTEGER REFERENCES public.document_blobs(blob_id);
+
+GRANT INSERT, DELETE, SELECT, UPDATE ON TABLE public.document_blobs TO liceo_db;
+GRANT USAGE, SELECT ON SEQUENCE public.document_blobs_blob_id_seq TO liceo_db;
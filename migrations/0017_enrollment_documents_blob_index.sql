@@ -0,0 +1,8 @@
+-- Blob garbage collection and refcount repair (blobs.py):
+--   DELETE FROM document_blobs ... (foreign key check on enrollment_documents.blob_id)
+--   SELECT COUNT(*) FROM enrollment_documents WHERE blob_id = ?
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollment_documents_blob
+    ON public.enrollment_documents (blob_id)
+    WHERE blob_id IS NOT NULL;
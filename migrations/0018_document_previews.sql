@@ -0,0 +1,20 @@
+-- Preview images for enrollment documents (previews.py).
+--
+-- A background worker renders a small JPEG of each blob (images, and the
+-- first page of PDFs) next to the original, as <blob file>.preview.jpg, and
+-- records the outcome here:
+--
+--   pending      not rendered yet (every blob stored before this migration too)
+--   working      claimed by a worker at preview_at; reclaimed if that is too
+--                long ago (the worker died)
+--   ready        preview on disk
+--   failed       the file could not be rendered
+--   unsupported  no renderer for the type (e.g. PDFs without pdftoppm)
+
+ALTER TABLE public.document_blobs
+    ADD COLUMN IF NOT EXISTS preview_state VARCHAR(12) NOT NULL DEFAULT 'pending',
+    ADD COLUMN IF NOT EXISTS preview_at TIMESTAMP WITHOUT TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_document_blobs_preview_queue
+    ON public.document_blobs (blob_id)
+    WHERE preview_state IN ('pending', 'working');
@@ -0,0 +1,9 @@
+-- Billing run heartbeat (billing.py): every batch of a running run moves
+-- heartbeat_at, so a run whose worker died (process restart, killed thread)
+-- can be told apart from a slow one. A queued or running run with no
+-- heartbeat for BILLING_RUN_STALE_MINUTES is shown as stalled, no longer
+-- blocks a new run of its branch, and can be resumed with
+-- python billing.py run <run_id> --resume.
+
+ALTER TABLE public.billing_runs
+    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW();
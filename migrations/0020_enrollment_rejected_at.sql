@@ -0,0 +1,14 @@
+-- When an enrollment was rejected (routes/registrar.py sets it, a parent's
+-- resubmission clears it). blobs.py gc --rejected-days counts from here, not
+-- from the submission date, so a late rejection keeps its documents for the
+-- full period.
+--
+-- Enrollments rejected before this migration have no recorded date; their
+-- period starts now.
+
+ALTER TABLE public.enrollments
+    ADD COLUMN IF NOT EXISTS rejected_at TIMESTAMP WITHOUT TIME ZONE;
+
+UPDATE public.enrollments
+SET rejected_at = NOW()
+WHERE status = 'rejected' AND rejected_at IS NULL;
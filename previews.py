@@ -0,0 +1,237 @@
+"""
+Preview images for enrollment documents (document_blobs.preview_state,
+migrations/0018).
+
+For every blob (blobs.py) a small JPEG is rendered next to the original,
+
+    uploads/blobs/3f/a9/3fa9...c0.pdf.preview.jpg
+
+from the image itself or the first page of a PDF, so the registrar dashboard
+can show thumbnails and only fetch the full file when one is opened.
+
+Rendering never happens in the request that uploads the file. notify(),
+called after an enrollment commits, wakes a background thread of this process
+that claims pending blobs in CLAIM_BATCH batches (FOR UPDATE SKIP LOCKED, so
+several processes share the queue), renders them outside any transaction and
+records the result; it exits once the queue is empty. A claim older than
+STALE_MINUTES is taken over, in case a worker died half way. The same queue
+can be worked from the command line:
+
+    python previews.py run                 # until the queue is empty
+    python previews.py reset               # re-queue failed / unsupported previews
+
+Images need Pillow; PDFs also need poppler's pdftoppm on PATH. Without them
+previews are marked unsupported and the dashboard shows the plain link.
+"""
+import os
+import sys
+import shutil
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+import psycopg2
+
+import blobs
+import uploads
+from db import get_db_connection, _env_int
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:          # optional: no previews without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = blobs.PREVIEW_SUFFIX
+SIZE = _env_int("PREVIEW_SIZE", 320)                # longest side, pixels
+QUALITY = _env_int("PREVIEW_QUALITY", 80)
+CLAIM_BATCH = _env_int("PREVIEW_BATCH", 20)
+STALE_MINUTES = _env_int("PREVIEW_STALE_MINUTES", 10)
+PDF_TIMEOUT = _env_int("PREVIEW_PDF_TIMEOUT", 30)   # seconds per pdftoppm run
+
+IMAGE_TYPES = {"jpg", "jpeg", "png"}
+
+# Plain SQL: the worker uses a pooled connection in the web process and a
+# direct one from the command line.
+CLAIM_SQL = """
+    UPDATE document_blobs b
+    SET preview_state = 'working', preview_at = NOW()
+    WHERE b.blob_id IN (
+        SELECT blob_id FROM document_blobs
+        WHERE preview_state = 'pending'
+           OR (preview_state = 'working' AND preview_at < NOW() - %s * INTERVAL '1 minute')
+        ORDER BY blob_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING b.blob_id, b.sha256, b.ext
+"""
+
+FINISH_SQL = """
+    UPDATE document_blobs SET preview_state = %s, preview_at = NOW()
+    WHERE blob_id = %s AND preview_state = 'working'
+"""
+
+RESET_SQL = """
+    UPDATE document_blobs SET preview_state = 'pending', preview_at = NULL
+    WHERE preview_state IN ('failed', 'unsupported')
+"""
+
+
+def url(file_path):
+    """Preview URL of a document's file_path."""
+    return file_path + SUFFIX
+
+
+def path_for(original):
+    return original + SUFFIX
+
+
+def _save_jpeg(img, dest):
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        background = Image.new("RGB", img.size, "white")
+        img = img.convert("RGBA")
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    img.thumbnail((SIZE, SIZE))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "JPEG", quality=QUALITY, optimize=True)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _render_image(src, dest):
+    with Image.open(src) as img:
+        img.draft("RGB", (SIZE, SIZE))      # JPEG: decode at reduced scale
+        _save_jpeg(img, dest)
+
+
+def _render_pdf(src, dest):
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, "page")
+        subprocess.run(
+            ["pdftoppm", "-f", "1", "-l", "1", "-singlefile", "-png", "-scale-to", str(SIZE * 2), src, prefix],
+            check=True, timeout=PDF_TIMEOUT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        with Image.open(prefix + ".png") as img:
+            _save_jpeg(img, dest)
+
+
+def render(src, ext):
+    """Write the preview of src; returns the new preview_state."""
+    ext = blobs.normalize_ext(ext)
+    if Image is None:
+        return "unsupported"
+    if ext in IMAGE_TYPES:
+        renderer = _render_image
+    elif ext == "pdf" and shutil.which("pdftoppm"):
+        renderer = _render_pdf
+    else:
+        return "unsupported"
+    if not os.path.exists(src):
+        return "failed"
+    try:
+        renderer(src, path_for(src))
+        return "ready"
+    except Exception:
+        logger.warning("Preview of %s failed", src, exc_info=True)
+        return "failed"
+
+
+def work(conn, folder):
+    """Render until the queue is empty; returns the number of blobs handled."""
+    cur = conn.cursor()
+    handled = 0
+    try:
+        while True:
+            cur.execute(CLAIM_SQL, (STALE_MINUTES, CLAIM_BATCH))
+            claimed = cur.fetchall()
+            conn.commit()
+            if not claimed:
+                return handled
+            for blob_id, sha256, ext in claimed:
+                state = render(blobs.blob_path(folder, sha256, ext), ext)
+                cur.execute(FINISH_SQL, (state, blob_id))
+                conn.commit()
+                handled += 1
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run(folder):
+    global _worker
+    while True:
+        _wake.clear()
+        conn = get_db_connection()
+        try:
+            work(conn, folder)
+        except Exception:
+            logger.exception("Preview worker failed")
+        finally:
+            conn.close()
+        with _worker_lock:
+            if not _wake.is_set():
+                _worker = None
+                return
+
+
+def notify(folder=None):
+    """New blobs are queued: make sure this process has a worker on it."""
+    global _worker
+    with _worker_lock:
+        _wake.set()
+        if _worker is None:
+            _worker = threading.Thread(target=_run, args=(folder or uploads.upload_folder(),),
+                                       name="preview-worker", daemon=True)
+            _worker.start()
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python previews.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    parser.add_argument("--folder", default=uploads.upload_folder(), help="upload folder (default: ./uploads)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="render pending previews until the queue is empty")
+    sub.add_parser("reset", help="re-queue failed and unsupported previews")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        if args.command == "run":
+            logger.info("previews: %d blobs handled", work(conn, args.folder))
+        else:
+            cur = conn.cursor()
+            cur.execute(RESET_SQL)
+            logger.info("previews: %d blobs re-queued", cur.rowcount)
+            conn.commit()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Shared data-access layer: named SQL statements executed as server-side
+prepared statements.
+
+Blueprints register their SQL once at import time:
+
+    register("cashier.reservation_header", \"\"\"SELECT ... WHERE r.reservation_id = %s\"\"\")
+
+and run it by name:
+
+    header = query_one("cashier.reservation_header", (reservation_id, branch_id))
+
+The first time a statement runs on a pooled connection it is PREPAREd; after
+that only EXECUTE name(params) goes over the wire, so hot statements skip
+parsing and planning. Prepared statements live as long as the connection
+(the pool resets with RESET ALL, not DISCARD ALL).
+
+Registered statements list their columns: register() rejects "SELECT *" and
+"alias.*". A prepared plan's result type is fixed, so once a migration adds
+a column to the table every connection that prepared a * over it would fail
+that statement ("cached plan must not change result type").
+
+Placeholders are the usual psycopg2 ones (%s or %(name)s). Postgres infers
+parameter types from context; where it cannot (e.g. "%s IS NULL"), cast the
+placeholder in the SQL (%s::int).
+
+Every call is timed per statement name (see query_stats()) and calls slower
+than SLOW_QUERY_MS (default 500) are logged.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import psycopg2
+import psycopg2.extras
+from db import get_db_connection, get_read_connection
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+QUERIES = {}          # name -> (original sql, prepared sql, param names or None)
+_STATEMENTS = {}      # PREPARE name -> query name
+
+_stats = {}           # name -> [calls, total_ms, max_ms]
+_stats_lock = threading.Lock()
+
+_PLACEHOLDER = re.compile(r"%%|%\((\w+)\)s|%s")
+# * or alias.* in a select list (not COUNT(*), not multiplication)
+_STAR = re.compile(r"(?<![\w(])(?:\w+\.)?\*(?=\s*(?:,|FROM\b))", re.IGNORECASE)
+
+
+def _convert_placeholders(sql):
+    """
+    Turn psycopg2 placeholders into $1..$n.
+    Returns (prepared_sql, names) where names is None for positional %s,
+    or the ordered list of distinct %(name)s keys.
+    """
+    names = []
+    positional = [0]
+    kinds = set()
+
+    def repl(m):
+        token = m.group(0)
+        if token == "%%":
+            return "%"
+        if token == "%s":
+            kinds.add("positional")
+            positional[0] += 1
+            return f"${positional[0]}"
+        kinds.add("named")
+        key = m.group(1)
+        if key not in names:
+            names.append(key)
+        return f"${names.index(key) + 1}"
+
+    converted = _PLACEHOLDER.sub(repl, sql)
+    if len(kinds) > 1:
+        raise ValueError("cannot mix %s and %(name)s placeholders in one query")
+    return converted, (names if "named" in kinds else None)
+
+
+def register(name, sql):
+    """Add a named statement to the registry (idempotent for identical SQL)."""
+    existing = QUERIES.get(name)
+    if existing and existing[0] != sql:
+        raise ValueError(f"query {name!r} is already registered with different SQL")
+    if _STAR.search(sql):
+        raise ValueError(f"query {name!r} selects *; list the columns (see the module docstring)")
+    prepared_sql, names = _convert_placeholders(sql)
+    stmt = _statement_name(name)
+    owner = _STATEMENTS.setdefault(stmt, name)
+    if owner != name:
+        raise ValueError(f"queries {owner!r} and {name!r} map to the same statement name {stmt}")
+    QUERIES[name] = (sql, prepared_sql, names)
+    return name
+
+
+def _statement_name(name):
+    # readable prefix plus a hash of the full name: names that only differ
+    # after the cut (or in punctuation) still get distinct statements
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return "q_" + re.sub(r"\W", "_", name)[:50] + "_" + digest
+
+
+def _record(name, elapsed_ms):
+    with _stats_lock:
+        st = _stats.get(name)
+        if st is None:
+            _stats[name] = [1, elapsed_ms, elapsed_ms]
+        else:
+            st[0] += 1
+            st[1] += elapsed_ms
+            if elapsed_ms > st[2]:
+                st[2] = elapsed_ms
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning("Slow query %s: %.1f ms", name, elapsed_ms)
+
+
+def query_stats():
+    """Per-statement timings for this process: {name: {calls, total_ms, avg_ms, max_ms}}."""
+    with _stats_lock:
+        return {
+            name: {
+                "calls": calls,
+                "total_ms": round(total, 2),
+                "avg_ms": round(total / calls, 2) if calls else 0.0,
+                "max_ms": round(peak, 2),
+            }
+            for name, (calls, total, peak) in _stats.items()
+        }
+
+
+def run(cursor, name, params=None):
+    """
+    Execute registered statement `name` on an existing cursor.
+    The cursor's connection remembers which statements it has prepared.
+    """
+    try:
+        _sql, prepared_sql, names = QUERIES[name]
+    except KeyError:
+        raise KeyError(f"unknown query {name!r}; register() it first") from None
+
+    conn = cursor.connection
+    prepared = getattr(conn, "_prepared", None)
+    if prepared is None:
+        prepared = set()
+        conn._prepared = prepared
+
+    stmt = _statement_name(name)
+    if names is not None:
+        params = [(params or {})[key] for key in names]
+    params = tuple(params or ())
+
+    started = time.perf_counter()
+    try:
+        if stmt not in prepared:
+            cursor.execute(f"PREPARE {stmt} AS {prepared_sql}")
+            prepared.add(stmt)
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {stmt} ({placeholders})", params)
+        else:
+            cursor.execute(f"EXECUTE {stmt}")
+    except psycopg2.errors.FeatureNotSupported:
+        # "cached plan must not change result type": a column changed type
+        # under a prepared statement. Retire this connection so its prepared
+        # statements go too.
+        conn._broken = True
+        raise
+    finally:
+        _record(name, (time.perf_counter() - started) * 1000)
+    return cursor
+
+
+def query_all(name, params=None, conn=None, cursor_factory=psycopg2.extras.RealDictCursor,
+              read=False):
+    """
+    Return all rows of a named query (RealDictCursor rows by default).
+    read=True sends it to the read replica (when it opens the connection).
+    """
+    own = conn is None
+    db = (get_read_connection() if read else get_db_connection()) if own else conn
+    cur = db.cursor(cursor_factory=cursor_factory)
+    try:
+        run(cur, name, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+        if own:
+            db.close()
+
+
+def query_one(name, params=None, conn=None, cursor_factory=psycopg2.extras.RealDictCursor,
+              read=False):
+    """
+    Return the first row of a named query, or None.
+    read=True sends it to the read replica (when it opens the connection).
+    """
+    own = conn is None
+    db = (get_read_connection() if read else get_db_connection()) if own else conn
+    cur = db.cursor(cursor_factory=cursor_factory)
+    try:
+        run(cur, name, params)
+        return cur.fetchone()
+    finally:
+        cur.close()
+        if own:
+            db.close()
+
+
+def execute(name, params=None, conn=None):
+    """
+    Run a named write statement and return its rowcount.
+    Commits only when it opened the connection itself; with conn= the caller
+    owns the transaction.
+    """
+    own = conn is None
+    db = get_db_connection() if own else conn
+    cur = db.cursor()
+    try:
+        run(cur, name, params)
+        if own:
+            db.commit()
+        return cur.rowcount
+    except Exception:
+        if own:
+            db.rollback()
+        raise
+    finally:
+        cur.close()
+        if own:
+            db.close()
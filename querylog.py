@@ -0,0 +1,164 @@
+"""
+Per-request query accounting.
+
+Every cursor handed out by a pooled connection reports each execute() here
+(see db.set_query_observer). Inside a Flask request we count the statements,
+add up DB time, and group them by normalized SQL (literals and whitespace
+stripped) so a statement that runs once per row stands out.
+
+- each response carries X-DB-Query-Count and X-DB-Query-Time-Ms; when some
+  statement ran more than N_PLUS_ONE_THRESHOLD times (default 10) it also
+  gets X-DB-Repeated-Queries and a warning is logged
+- per-endpoint totals are kept for the life of the process and shown on the
+  dev-only /_debug/queries page (routes/debug.py); they are only collected
+  when that page is enabled (debug_enabled), and requests that match no
+  route share one UNMATCHED entry, so 404s cannot grow the table
+"""
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+from flask import current_app, g, has_request_context, request
+import db
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = db._env_int("N_PLUS_ONE_THRESHOLD", 10)
+
+_endpoints = {}         # endpoint -> dict of running totals
+UNMATCHED = "<unmatched>"
+_endpoints_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse a statement to its shape: literals/placeholders -> ?, one line."""
+    text = _STRING.sub("?", sql)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("(?...)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+class RequestQueries:
+    __slots__ = ("count", "total_ms", "statements", "started")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+        self.started = time.perf_counter()
+
+    def repeated(self, threshold=None):
+        limit = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(sql, n) for sql, n in self.statements.most_common() if n > limit]
+
+
+def _observe(cursor, query, elapsed):
+    if not has_request_context():
+        return
+    log = g.get("_db_queries")
+    if log is None:
+        return
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        try:
+            query = query.as_string(cursor)
+        except Exception:
+            query = str(query)
+    log.count += 1
+    log.total_ms += elapsed * 1000
+    log.statements[normalize_sql(query)] += 1
+
+
+def _before_request():
+    g._db_queries = RequestQueries()
+
+
+def _after_request(response):
+    log = g.pop("_db_queries", None)
+    if log is None:
+        return response
+
+    repeated = log.repeated()
+    response.headers["X-DB-Query-Count"] = str(log.count)
+    response.headers["X-DB-Query-Time-Ms"] = f"{log.total_ms:.1f}"
+    if repeated:
+        response.headers["X-DB-Repeated-Queries"] = str(len(repeated))
+        for sql, n in repeated:
+            logger.warning("Possible N+1 on %s %s: %sx %s",
+                           request.method, request.path, n, sql[:200])
+
+    if debug_enabled(current_app):
+        _record_endpoint(request.endpoint or UNMATCHED, log, repeated,
+                         (time.perf_counter() - log.started) * 1000)
+    return response
+
+
+def _record_endpoint(endpoint, log, repeated, elapsed_ms):
+    with _endpoints_lock:
+        st = _endpoints.get(endpoint)
+        if st is None:
+            st = _endpoints[endpoint] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_ms": 0.0,
+                "max_db_ms": 0.0,
+                "request_ms": 0.0,
+                "repeated": {},
+            }
+        st["requests"] += 1
+        st["queries"] += log.count
+        st["max_queries"] = max(st["max_queries"], log.count)
+        st["db_ms"] += log.total_ms
+        st["max_db_ms"] = max(st["max_db_ms"], log.total_ms)
+        st["request_ms"] += elapsed_ms
+        for sql, n in repeated:
+            st["repeated"][sql] = max(st["repeated"].get(sql, 0), n)
+
+
+def endpoint_stats():
+    """Per-endpoint totals, worst (most queries per request) first."""
+    with _endpoints_lock:
+        rows = []
+        for endpoint, st in _endpoints.items():
+            n = st["requests"] or 1
+            rows.append({
+                "endpoint": endpoint,
+                "requests": st["requests"],
+                "avg_queries": round(st["queries"] / n, 1),
+                "max_queries": st["max_queries"],
+                "avg_db_ms": round(st["db_ms"] / n, 1),
+                "max_db_ms": round(st["max_db_ms"], 1),
+                "avg_request_ms": round(st["request_ms"] / n, 1),
+                "repeated": sorted(st["repeated"].items(), key=lambda kv: -kv[1]),
+            })
+    rows.sort(key=lambda r: (r["max_queries"], r["avg_db_ms"]), reverse=True)
+    return rows
+
+
+def reset_stats():
+    with _endpoints_lock:
+        _endpoints.clear()
+
+
+def debug_enabled(app):
+    """The debug page is only served in debug mode or with DEBUG_QUERIES=1."""
+    return app.debug or os.getenv("DEBUG_QUERIES") == "1"
+
+
+def init_app(app):
+    db.set_query_observer(_observe)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
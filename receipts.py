@@ -0,0 +1,124 @@
+"""
+Receipt numbers: SERIES-YYYYMMDD-BBB-NNNNN, numbered per branch, series and
+branch-local day (receipt_counters, migrations/0010).
+
+    OR-20250613-004-00017    17th official receipt of branch 4 that day
+
+Two ways to take numbers from the same counters:
+
+  next_number(cursor, branch_id, series)
+      One number, inside the caller's transaction. The counter row stays
+      locked until that transaction ends, and a rollback gives the number
+      back, so the series has no gaps. Used for payment receipts (OR);
+      call it as late as possible in the transaction so concurrent cashiers
+      of the branch queue on the counter only briefly.
+
+  allocate(branch_id, series) / allocate_many(branch_id, count, series)
+      Numbers from a block of RECEIPT_BLOCK_SIZE (default 20) that this
+      process reserved in its own short transaction. Cashiers rarely touch
+      the counter row, but numbers left in a block when a worker restarts
+      (or the day changes) are skipped. Used for reservation claim slips (CS).
+      Blocks are reserved on a connection of the small "receipts" pool
+      (db.get_pool), never a second one from the request pool: callers
+      already hold a request connection, and a burst of them each waiting
+      for another would drain that pool.
+
+UNIQUE constraints on payments.receipt_number and reservations.receipt_number
+back both.
+"""
+import time
+import threading
+from db import get_pool, _env_int
+from queries import register, run
+
+PAYMENT_SERIES = "OR"
+CLAIM_SERIES = "CS"
+
+BLOCK_SIZE = _env_int("RECEIPT_BLOCK_SIZE", 20)
+
+register("receipts.take", """
+    INSERT INTO receipt_counters (branch_id, series, receipt_date, last_number)
+    SELECT br.branch_id, %(series)s, (NOW() AT TIME ZONE br.timezone)::date, %(count)s
+    FROM branches br
+    WHERE br.branch_id = %(branch_id)s
+    ON CONFLICT (branch_id, series, receipt_date) DO UPDATE
+    SET last_number = receipt_counters.last_number + EXCLUDED.last_number
+    RETURNING receipt_date, last_number
+""")
+
+register("receipts.day_ends", """
+    SELECT EXTRACT(EPOCH FROM ((%s::date + 1)::timestamp AT TIME ZONE timezone))
+    FROM branches
+    WHERE branch_id = %s
+""")
+
+_blocks = {}            # (branch_id, series) -> [receipt_date, next, last, valid until (epoch)]
+_blocks_lock = threading.Lock()
+
+
+def format_number(series, branch_id, receipt_date, number):
+    return f"{series}-{receipt_date:%Y%m%d}-{branch_id:03d}-{number:05d}"
+
+
+def _take(cursor, branch_id, series, count):
+    """(receipt_date, first, last) of `count` numbers taken from the counter."""
+    run(cursor, "receipts.take", {"branch_id": branch_id, "series": series, "count": count})
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"unknown branch {branch_id}")
+    receipt_date, last = (row["receipt_date"], row["last_number"]) if isinstance(row, dict) else row
+    return receipt_date, last - count + 1, last
+
+
+def next_number(cursor, branch_id, series=PAYMENT_SERIES):
+    """Next gap-free number; the caller's transaction owns it."""
+    receipt_date, number, _last = _take(cursor, branch_id, series, 1)
+    return format_number(series, branch_id, receipt_date, number)
+
+
+def _reserve_block(branch_id, series, size):
+    conn = get_pool("receipts").getconn()
+    cur = conn.cursor()
+    try:
+        receipt_date, first, last = _take(cur, branch_id, series, size)
+        run(cur, "receipts.day_ends", (receipt_date, branch_id))
+        day_ends = float(cur.fetchone()[0])
+        conn.commit()
+        return [receipt_date, first, last, day_ends]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def allocate_many(branch_id, count, series=CLAIM_SERIES):
+    """
+    `count` numbers from this process's block, in order. When the block runs
+    short, one new block covers the rest (at least BLOCK_SIZE numbers).
+    """
+    key = (branch_id, series)
+    numbers = []
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block is not None and time.time() < block[3]:
+            while block[1] <= block[2] and len(numbers) < count:
+                numbers.append(format_number(series, branch_id, block[0], block[1]))
+                block[1] += 1
+    if len(numbers) == count:
+        return numbers
+
+    # reserve outside the lock; two threads racing here only cost a spare block
+    block = _reserve_block(branch_id, series, max(BLOCK_SIZE, count - len(numbers)))
+    while len(numbers) < count:
+        numbers.append(format_number(series, branch_id, block[0], block[1]))
+        block[1] += 1
+    with _blocks_lock:
+        _blocks[key] = block
+    return numbers
+
+
+def allocate(branch_id, series=CLAIM_SERIES):
+    """Next number from this process's block, reserving a new block when needed."""
+    return allocate_many(branch_id, 1, series)[0]
@@ -0,0 +1,200 @@
+"""
+Cashier report periods and exports.
+
+A report covers whole branch-local days [start, end): a day, its Monday-based
+week, its calendar month or its school term (TERMS). bounds() turns those
+days into payment_date limits in the server's TimeZone, so the payment
+queries are plain range predicates on (branch_id, payment_date) and use
+idx_payments_branch_date; the totals come from daily_collections
+(rollups.py), whose days are branch-local too.
+
+Detail rows are read through a server-side cursor (payment_rows) and written
+out as they arrive: CSV is streamed to the client, XLSX is written to a
+temporary file in openpyxl's write-only mode. XLSX needs openpyxl; without it
+only CSV is offered.
+"""
+import io
+import csv
+import tempfile
+from datetime import date, timedelta
+import psycopg2.extras
+
+try:
+    import openpyxl
+except ImportError:          # optional: XLSX export only
+    openpyxl = None
+
+from queries import register, run
+
+PERIODS = ("day", "week", "month", "term")
+
+# School terms as (name, first day, first day after) in (month, day); a term
+# whose end is before its start runs into the next year.
+TERMS = [
+    ("First Semester", (6, 1), (11, 1)),
+    ("Second Semester", (11, 1), (4, 1)),
+    ("Summer", (4, 1), (6, 1)),
+]
+
+# rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    ("receipt_number", "Receipt #"),
+    ("payment_date", "Date/Time"),
+    ("student_name", "Student Name"),
+    ("grade_level", "Grade"),
+    ("amount", "Amount"),
+    ("payment_method", "Method"),
+    ("received_by_name", "Received By"),
+]
+
+register("reports.branch_today", """
+    SELECT (NOW() AT TIME ZONE timezone)::date AS today FROM branches WHERE branch_id = %s
+""")
+
+register("reports.branch_bounds", """
+    SELECT br.timezone,
+           (%(start)s::timestamp AT TIME ZONE br.timezone) AT TIME ZONE current_setting('TimeZone') AS start_at,
+           (%(end)s::timestamp AT TIME ZONE br.timezone) AT TIME ZONE current_setting('TimeZone') AS end_at
+    FROM branches br
+    WHERE br.branch_id = %(branch_id)s
+""")
+
+PAYMENTS_SQL = """
+    SELECT
+      p.payment_id,
+      p.receipt_number,
+      p.amount,
+      p.payment_method,
+      (p.payment_date AT TIME ZONE current_setting('TimeZone')) AT TIME ZONE %(timezone)s AS payment_date,
+      e.student_name,
+      e.grade_level,
+      u.username AS received_by_name
+    FROM payments p
+    JOIN enrollments e ON p.enrollment_id = e.enrollment_id
+    JOIN users u ON p.received_by = u.user_id
+    WHERE p.branch_id = %(branch_id)s
+      AND p.payment_date >= %(start_at)s
+      AND p.payment_date < %(end_at)s
+    ORDER BY p.payment_date, p.payment_id
+"""
+
+
+def _term(day):
+    for name, (sm, sd), (em, ed) in TERMS:
+        start = date(day.year, sm, sd)
+        end = date(day.year, em, ed)
+        if end <= start:
+            # wraps into the next year: day is in either the first or second half
+            if day >= start:
+                end = date(day.year + 1, em, ed)
+            else:
+                start = date(day.year - 1, sm, sd)
+        if start <= day < end:
+            return name, start, end
+    raise ValueError(f"no term in TERMS covers {day}")
+
+
+def period_range(period, day):
+    """(start, end, label) for the period containing `day`; end is exclusive."""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+        label = f"Week of {start:%b %d, %Y}"
+    elif period == "month":
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        label = f"{start:%B %Y}"
+    elif period == "term":
+        name, start, end = _term(day)
+        label = f"{name} {start.year}" + (f"–{end.year}" if end.year != start.year else "")
+    else:
+        start = day
+        end = day + timedelta(days=1)
+        label = f"{day:%B %d, %Y}"
+    return start, end, label
+
+
+def branch_today(cursor, branch_id):
+    """The branch's local date now (the server's date for an unknown branch)."""
+    run(cursor, "reports.branch_today", (branch_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return date.today()
+    return row["today"] if isinstance(row, dict) else row[0]
+
+
+def bounds(cursor, branch_id, start, end):
+    """
+    {"timezone", "start_at", "end_at"}: the branch-local days [start, end) as
+    payment_date limits in the server's TimeZone. None for an unknown branch.
+    """
+    run(cursor, "reports.branch_bounds", {"branch_id": branch_id, "start": start, "end": end})
+    return cursor.fetchone()
+
+
+def payment_rows(conn, branch_id, window, limit=None):
+    """
+    Payments of the branch inside window (from bounds()), oldest first, as
+    dicts, read FETCH_SIZE at a time through a server-side cursor. The
+    connection must not be in autocommit mode; the cursor lives until the
+    generator is exhausted or closed.
+    """
+    cur = conn.cursor(name="report_payments", cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.itersize = FETCH_SIZE
+    try:
+        sql = PAYMENTS_SQL + (" LIMIT %(limit)s" if limit is not None else "")
+        cur.execute(sql, {
+            "branch_id": branch_id,
+            "timezone": window["timezone"],
+            "start_at": window["start_at"],
+            "end_at": window["end_at"],
+            "limit": limit,
+        })
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+
+def _cell(key, value):
+    if value is None:
+        return ""
+    if key == "payment_date":
+        return value.strftime("%Y-%m-%d %H:%M")
+    if key == "payment_method":
+        return value.upper()
+    return value
+
+
+def csv_chunks(rows, batch=500):
+    """Encode rows as CSV (header first), yielding a str every `batch` rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([title for _key, title in EXPORT_COLUMNS])
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_cell(key, row[key]) for key, _title in EXPORT_COLUMNS])
+        if n % batch == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def xlsx_file(rows):
+    """
+    Write rows to an XLSX workbook in a temporary file and return it, rewound.
+    Write-only mode keeps only the current row in memory.
+    """
+    if openpyxl is None:
+        raise RuntimeError("XLSX export needs openpyxl (pip install openpyxl)")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title="Collections")
+    ws.append([title for _key, title in EXPORT_COLUMNS])
+    for row in rows:
+        ws.append([_cell(key, row[key]) for key, _title in EXPORT_COLUMNS])
+    out = tempfile.TemporaryFile()
+    wb.save(out)
+    out.seek(0)
+    return out
@@ -0,0 +1,389 @@
+"""
+Reservations: header projection (migrations/0012), loading, claiming and
+cancelling.
+
+Each reservation row carries its student's name, username and grade, the
+enrollment it is for, who reserved it (student or parent, name and
+relationship) and its item totals. refresh() recomputes them from the source
+tables inside the transaction that writes the reservation and its items, so
+the cashier list pages through reservations alone.
+
+load() reads one reservation's header and all its items in a single round
+trip for the cashier view and claim slip pages. The claim slip's header and
+items are kept per process (cache_receipt / cached_receipt) under the
+reservation's version, a hash of its row, so a reprint is one primary-key
+lookup until the reservation changes. Only the data is cached: the page is
+rendered on every request, since base.html shows the signed-in user and
+flashed messages.
+
+claim() and cancel() take any number of reservations of a branch in the
+caller's transaction with a fixed number of statements: the reservations are
+locked in id order, then the inventory rows they touch in item id order (so
+concurrent cashiers cannot deadlock), each reservation is checked against the
+locked stock, and the accepted ones are written with one UPDATE per table.
+Each returns {reservation_id: None if done, else the reason it was skipped};
+pass them a plain (tuple) cursor.
+
+    python reservations.py backfill              # every reservation
+    python reservations.py backfill --batch 500
+
+Reservations made before the projection existed have no enrollment_id; for
+those the student is resolved as the old list did (student account, else the
+parent's first linked child).
+"""
+import sys
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+import psycopg2
+
+from db import _env_int
+from queries import register, run
+import receipts
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+CLAIMABLE = ("RESERVED", "PAID")
+CANCELLABLE = ("RESERVED",)
+
+# claim slips (header and items) kept per process; pages render per request
+RECEIPT_CACHE_SIZE = _env_int("RECEIPT_CACHE_SIZE", 256)
+
+# reservations.load returns the header's columns, then the item's, then the
+# version; load() splits each row after the first HEADER_COLUMNS.
+HEADER_COLUMNS = 15
+
+_receipts = OrderedDict()      # (branch_id, reservation_id) -> (version, (header, items))
+_receipts_lock = threading.Lock()
+
+REFRESH_SQL = """
+    UPDATE reservations r
+    SET student_name = src.student_name,
+        student_username = src.student_username,
+        grade_level = src.grade_level,
+        enrollment_id = src.enrollment_id,
+        reserved_by_role = src.reserved_by_role,
+        reserved_by_name = src.reserved_by_name,
+        reserved_by_relationship = src.relationship,
+        total_qty = src.total_qty,
+        total_amount = src.total_amount
+    FROM (
+        SELECT
+            r2.reservation_id,
+            COALESCE(u.username, '') AS student_username,
+            COALESCE(e.student_name, svp.student_name, u.username, '') AS student_name,
+            COALESCE(r2.student_grade_level, svp.grade_level) AS grade_level,
+            COALESCE(r2.enrollment_id, e.enrollment_id) AS enrollment_id,
+            CASE WHEN reserved_by.role = 'parent' THEN 'parent' ELSE 'student' END AS reserved_by_role,
+            CASE WHEN reserved_by.role = 'parent'
+                 THEN COALESCE(svp.guardian_name, reserved_by.username)
+            END AS reserved_by_name,
+            svp.relationship,
+            COALESCE(t.total_qty, 0) AS total_qty,
+            COALESCE(t.total_amount, 0) AS total_amount
+        FROM reservations r2
+        LEFT JOIN users u ON u.user_id = r2.student_user_id
+        LEFT JOIN student_accounts sa ON sa.username = u.username
+        LEFT JOIN enrollments e ON e.enrollment_id = COALESCE(r2.enrollment_id, sa.enrollment_id)
+        LEFT JOIN users reserved_by ON reserved_by.user_id = r2.reserved_by_user_id
+        LEFT JOIN LATERAL (
+            SELECT e3.student_name, e3.grade_level, e3.guardian_name, ps.relationship
+            FROM parent_student ps
+            JOIN enrollments e3 ON e3.enrollment_id = ps.student_id
+            WHERE ps.parent_id = r2.reserved_by_user_id
+            ORDER BY (ps.student_id = r2.enrollment_id) DESC NULLS LAST, ps.student_id
+            LIMIT 1
+        ) svp ON (reserved_by.role = 'parent')
+        LEFT JOIN LATERAL (
+            SELECT SUM(ri.qty) AS total_qty, SUM(ri.line_total) AS total_amount
+            FROM reservation_items ri
+            WHERE ri.reservation_id = r2.reservation_id
+        ) t ON TRUE
+        WHERE r2.reservation_id = ANY(%s)
+    ) src
+    WHERE r.reservation_id = src.reservation_id
+"""
+
+register("reservations.refresh", REFRESH_SQL)
+
+# One row per item (one row with NULL items for an empty reservation); the
+# header columns repeat on each, which for a handful of items is cheaper than
+# a second round trip.
+register("reservations.load", """
+    SELECT
+        r.reservation_id,
+        COALESCE(r.student_username, '') AS username,
+        r.student_user_id,
+        r.student_grade_level,
+        COALESCE(r.student_name, '') AS full_name,
+        r.grade_level,
+        NULL AS strand,
+        r.status,
+        r.created_at,
+        COALESCE(r.reserved_by_role, 'student') AS reserved_by_role,
+        r.reserved_by_name AS parent_name,
+        r.reserved_by_relationship AS relationship,
+        r.claimed_at,
+        b.branch_name,
+        r.receipt_number,
+        ii.item_name,
+        ri.qty,
+        COALESCE(NULLIF(TRIM(ri.size_label), ''), ii.publisher, ii.size_label) AS display_label,
+        ri.unit_price,
+        ri.line_total,
+        ii.category,
+        md5(r::text) AS version
+    FROM reservations r
+    LEFT JOIN branches b ON b.branch_id = r.branch_id
+    LEFT JOIN (reservation_items ri
+               JOIN inventory_items ii ON ii.item_id = ri.item_id)
+           ON ri.reservation_id = r.reservation_id
+    WHERE r.reservation_id = %s AND r.branch_id = %s
+    ORDER BY ii.category, ii.item_name
+""")
+
+register("reservations.version", """
+    SELECT md5(r::text) FROM reservations r
+    WHERE r.reservation_id = %s AND r.branch_id = %s
+""")
+
+
+register("reservations.lock", """
+    SELECT reservation_id, status FROM reservations
+    WHERE branch_id = %s AND reservation_id = ANY(%s)
+    ORDER BY reservation_id
+    FOR UPDATE
+""")
+
+register("reservations.lines", """
+    SELECT reservation_id, item_id, SUM(qty) AS qty
+    FROM reservation_items
+    WHERE reservation_id = ANY(%s)
+    GROUP BY reservation_id, item_id
+""")
+
+register("reservations.lock_stock", """
+    SELECT item_id, stock_total, reserved_qty FROM inventory_items
+    WHERE branch_id = %s
+      AND item_id IN (SELECT item_id FROM reservation_items WHERE reservation_id = ANY(%s))
+    ORDER BY item_id
+    FOR UPDATE
+""")
+
+_LINE_TOTALS = """
+    FROM (
+        SELECT item_id, SUM(qty) AS qty FROM reservation_items
+        WHERE reservation_id = ANY(%(ids)s)
+        GROUP BY item_id
+    ) d
+    WHERE ii.item_id = d.item_id AND ii.branch_id = %(branch_id)s
+"""
+
+register("reservations.take_stock", """
+    UPDATE inventory_items ii
+    SET stock_total = ii.stock_total - d.qty,
+        reserved_qty = ii.reserved_qty - d.qty
+""" + _LINE_TOTALS)
+
+register("reservations.release_stock", """
+    UPDATE inventory_items ii
+    SET reserved_qty = GREATEST(ii.reserved_qty - d.qty, 0)
+""" + _LINE_TOTALS)
+
+register("reservations.mark_claimed", """
+    UPDATE reservations r
+    SET status = 'CLAIMED', claimed_at = NOW(),
+        receipt_number = COALESCE(r.receipt_number, n.receipt_number)
+    FROM unnest(%s::int[], %s::text[]) AS n(reservation_id, receipt_number)
+    WHERE r.reservation_id = n.reservation_id AND r.branch_id = %s
+""")
+
+register("reservations.mark_cancelled", """
+    UPDATE reservations
+    SET status = 'CANCELLED', cancelled_at = NOW()
+    WHERE branch_id = %s AND reservation_id = ANY(%s)
+""")
+
+
+def refresh(cursor, reservation_ids):
+    """Recompute the projection for these reservations (an id or a list), in the caller's transaction."""
+    if isinstance(reservation_ids, int):
+        reservation_ids = [reservation_ids]
+    run(cursor, "reservations.refresh", (list(reservation_ids),))
+    return cursor.rowcount
+
+
+def load(cursor, reservation_id, branch_id):
+    """
+    (header, items, version) of a reservation in the branch, or
+    (None, [], None). The header and each item are dicts keyed by column
+    name (pass a plain cursor). Items are ordered by category, then name.
+    """
+    run(cursor, "reservations.load", (reservation_id, branch_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return None, [], None
+    names = [col[0] for col in cursor.description]
+    header = dict(zip(names[:HEADER_COLUMNS], rows[0][:HEADER_COLUMNS]))
+    item_names = names[HEADER_COLUMNS:-1]
+    items = [dict(zip(item_names, row[HEADER_COLUMNS:-1])) for row in rows if row[HEADER_COLUMNS] is not None]
+    return header, items, rows[0][-1]
+
+
+def version(cursor, reservation_id, branch_id):
+    """Current version of a reservation in the branch (None if there is none)."""
+    run(cursor, "reservations.version", (reservation_id, branch_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def cached_receipt(branch_id, reservation_id, current_version):
+    """(header, items) of the claim slip if cached at this version, else None."""
+    key = (branch_id, reservation_id)
+    with _receipts_lock:
+        entry = _receipts.get(key)
+        if entry is None or entry[0] != current_version:
+            return None
+        _receipts.move_to_end(key)
+        return entry[1]
+
+
+def cache_receipt(branch_id, reservation_id, current_version, header, items):
+    with _receipts_lock:
+        _receipts[(branch_id, reservation_id)] = (current_version, (header, items))
+        _receipts.move_to_end((branch_id, reservation_id))
+        while len(_receipts) > RECEIPT_CACHE_SIZE:
+            _receipts.popitem(last=False)
+
+
+def _lock(cursor, branch_id, reservation_ids, allowed, wrong_status):
+    """Lock the reservations; {id: reason} for the ones that cannot change, and the rest."""
+    ids = sorted({int(i) for i in reservation_ids})
+    run(cursor, "reservations.lock", (branch_id, ids))
+    status = dict(cursor.fetchall())
+    results = {}
+    accepted = []
+    for reservation_id in ids:
+        if reservation_id not in status:
+            results[reservation_id] = "Reservation not found."
+        elif status[reservation_id] not in allowed:
+            results[reservation_id] = wrong_status
+        else:
+            accepted.append(reservation_id)
+    return results, accepted
+
+
+def claim(cursor, branch_id, reservation_ids):
+    """
+    Hand out RESERVED or PAID reservations: take their items out of stock and
+    reserved_qty and mark them CLAIMED with a claim slip number. A reservation
+    whose items are not all in stock is skipped ("Stock mismatch."), checked
+    in id order against what the earlier ones left.
+    """
+    results, accepted = _lock(cursor, branch_id, reservation_ids, CLAIMABLE,
+                              "Reservation must be RESERVED or PAID.")
+    if not accepted:
+        return results
+
+    run(cursor, "reservations.lock_stock", (branch_id, accepted))
+    stock = {item_id: [int(total or 0), int(reserved or 0)] for item_id, total, reserved in cursor.fetchall()}
+    run(cursor, "reservations.lines", (accepted,))
+    lines = {}
+    for reservation_id, item_id, qty in cursor.fetchall():
+        lines.setdefault(reservation_id, []).append((item_id, int(qty)))
+
+    claimed = []
+    for reservation_id in accepted:
+        wanted = lines.get(reservation_id, [])
+        if any(item_id not in stock for item_id, _qty in wanted):
+            results[reservation_id] = "Item not found."
+            continue
+        if any(qty > stock[item_id][1] or qty > stock[item_id][0] for item_id, qty in wanted):
+            results[reservation_id] = "Stock mismatch."
+            continue
+        for item_id, qty in wanted:
+            stock[item_id][0] -= qty
+            stock[item_id][1] -= qty
+        results[reservation_id] = None
+        claimed.append(reservation_id)
+
+    if claimed:
+        run(cursor, "reservations.take_stock", {"ids": claimed, "branch_id": branch_id})
+        # claim slip numbers from this worker's pre-allocated block (receipts.py)
+        numbers = receipts.allocate_many(branch_id, len(claimed), receipts.CLAIM_SERIES)
+        run(cursor, "reservations.mark_claimed", (claimed, numbers, branch_id))
+    return results
+
+
+def cancel(cursor, branch_id, reservation_ids):
+    """Cancel RESERVED reservations and give their items back to stock (reserved_qty)."""
+    results, accepted = _lock(cursor, branch_id, reservation_ids, CANCELLABLE,
+                              "Only RESERVED can be cancelled.")
+    if not accepted:
+        return results
+
+    run(cursor, "reservations.lock_stock", (branch_id, accepted))
+    run(cursor, "reservations.release_stock", {"ids": accepted, "branch_id": branch_id})
+    run(cursor, "reservations.mark_cancelled", (branch_id, accepted))
+    results.update(dict.fromkeys(accepted))
+    return results
+
+
+def backfill(conn, batch=BATCH_SIZE):
+    """Refresh every reservation, `batch` rows per transaction. Returns the count."""
+    cur = conn.cursor()
+    done = 0
+    last_id = 0
+    try:
+        while True:
+            cur.execute("""
+                SELECT reservation_id FROM reservations
+                WHERE reservation_id > %s
+                ORDER BY reservation_id
+                LIMIT %s
+            """, (last_id, batch))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                conn.commit()       # end the last SELECT's transaction
+                break
+            # plain execute: scripts use unpooled connections (no prepared statements)
+            cur.execute(REFRESH_SQL, (ids,))
+            done += cur.rowcount
+            conn.commit()
+            last_id = ids[-1]
+        return done
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python reservations.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("backfill", help="fill the header projection of existing reservations")
+    p.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        count = backfill(conn, args.batch)
+    finally:
+        conn.close()
+    logger.info("reservations: %d headers refreshed", count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
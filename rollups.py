@@ -0,0 +1,144 @@
+"""
+Daily collection rollups (daily_collections, migrations/0005).
+
+One row per (branch, day, cashier, payment method) with the payment count
+and amount. process_payment calls record_payment() in the transaction that
+inserts the payment, so the dashboard and report totals are primary-key
+lookups instead of COUNT/SUM over payments. Days are branch-local
+(branches.timezone, see reports.py); payment_date is in the server's
+TimeZone.
+
+    python rollups.py backfill                               # everything
+    python rollups.py backfill --from 2025-06-01 --to 2025-07-01
+
+backfill() rebuilds the days in [from, to) from payments; run it once after
+the migration, and again for any range where payments were changed outside
+process_payment (deletes through ON DELETE CASCADE, manual fixes).
+"""
+import sys
+import argparse
+import logging
+from datetime import date, timedelta
+import psycopg2
+
+from queries import register, run
+
+logger = logging.getLogger(__name__)
+
+# payment_date (server TimeZone) -> the branch's calendar day
+LOCAL_DAY = "((p.payment_date AT TIME ZONE current_setting('TimeZone')) AT TIME ZONE br.timezone)::date"
+
+register("rollups.record_payment", """
+    INSERT INTO daily_collections
+      (branch_id, collection_date, received_by, payment_method, payment_count, total_amount)
+    SELECT p.branch_id, """ + LOCAL_DAY + """, p.received_by, COALESCE(p.payment_method, 'cash'), 1, p.amount
+    FROM payments p
+    JOIN branches br ON br.branch_id = p.branch_id
+    WHERE p.payment_id = %s
+    ON CONFLICT (branch_id, collection_date, received_by, payment_method) DO UPDATE
+    SET payment_count = daily_collections.payment_count + EXCLUDED.payment_count,
+        total_amount  = daily_collections.total_amount + EXCLUDED.total_amount,
+        updated_at    = NOW()
+""")
+
+register("rollups.totals", """
+    SELECT COALESCE(SUM(payment_count), 0) AS payment_count,
+           COALESCE(SUM(total_amount), 0) AS total_collected
+    FROM daily_collections
+    WHERE branch_id = %s
+      AND collection_date >= %s AND collection_date < %s
+""")
+
+register("rollups.cashier_totals", """
+    SELECT COALESCE(SUM(payment_count), 0) AS payment_count,
+           COALESCE(SUM(total_amount), 0) AS total_collected
+    FROM daily_collections
+    WHERE branch_id = %s
+      AND collection_date >= %s AND collection_date < %s
+      AND received_by = %s
+""")
+
+
+def record_payment(cursor, payment_id):
+    """Add one new payment to its day's rollup. Call before the commit."""
+    run(cursor, "rollups.record_payment", (payment_id,))
+
+
+def totals(cursor, branch_id, start, end=None, received_by=None):
+    """
+    {"payment_count", "total_collected"} for days in [start, end) (end
+    defaults to the day after start), optionally for one cashier.
+    """
+    end = end or start + timedelta(days=1)
+    if received_by is None:
+        run(cursor, "rollups.totals", (branch_id, start, end))
+    else:
+        run(cursor, "rollups.cashier_totals", (branch_id, start, end, received_by))
+    row = cursor.fetchone()
+    if isinstance(row, dict):
+        return row
+    return {"payment_count": row[0], "total_collected": row[1]}
+
+
+def backfill(conn, start=None, end=None):
+    """Rebuild the rollup rows for days in [start, end) from payments."""
+    start = start or date.min
+    end = end or date.max
+    cur = conn.cursor()
+    try:
+        # Blocks record_payment() until we commit, so a payment committing
+        # between our DELETE and INSERT cannot be dropped or counted twice.
+        cur.execute("LOCK TABLE daily_collections IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("""
+            DELETE FROM daily_collections
+            WHERE collection_date >= %s AND collection_date < %s
+        """, (start, end))
+        # local days are at most a day off the server's, so the payment_date
+        # window is widened by a day on each side and then trimmed exactly
+        cur.execute("""
+            INSERT INTO daily_collections
+              (branch_id, collection_date, received_by, payment_method, payment_count, total_amount)
+            SELECT p.branch_id, """ + LOCAL_DAY + """, p.received_by, COALESCE(p.payment_method, 'cash'),
+                   COUNT(*), SUM(p.amount)
+            FROM payments p
+            JOIN branches br ON br.branch_id = p.branch_id
+            WHERE p.payment_date >= %(start)s::date - 1 AND p.payment_date < %(end)s::date + 1
+              AND """ + LOCAL_DAY + """ >= %(start)s AND """ + LOCAL_DAY + """ < %(end)s
+            GROUP BY 1, 2, 3, 4
+        """, {"start": start, "end": end})
+        rows = cur.rowcount
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def main(argv=None):
+    from db import _connect_params
+
+    parser = argparse.ArgumentParser(prog="python rollups.py", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="database name (default: DB_NAME)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("backfill", help="rebuild daily_collections from payments")
+    p.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    p.add_argument("--to", dest="end", type=date.fromisoformat, default=None, help="exclusive")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", force=True)
+
+    params = _connect_params()
+    if args.db:
+        params["dbname"] = args.db
+    conn = psycopg2.connect(**params)
+    try:
+        rows = backfill(conn, args.start, args.end)
+    finally:
+        conn.close()
+    logger.info("daily_collections: %d rows rebuilt", rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,4 @@
 import os
-from flask import send_from_directory
 
 # Import your blueprints
 from routes.auth import auth_bp  # type: ignore
@@ -13,6 +12,11 @@ from routes.parent import parent_bp  # type: ignore
 from routes.student_portal import student_portal_bp  # type: ignore
 from routes.librarian import librarian_bp  # type: ignore
 from routes.teacher import teacher_bp  # type: ignore
+from routes.debug import debug_bp  # type: ignore
+import querylog
+import timeouts
+import uploads
+import assets
 
 
 def _register_bp_once(app, bp, **kwargs):
@@ -33,6 +37,12 @@ def init_routes(app):
     # Optional: store on app config
     app.config["UPLOAD_FOLDER"] = upload_folder
 
+    # Stream uploads to uploads/.incoming/ with per-file / per-request limits
+    uploads.init_app(app)
+
+    # Fingerprinted static URLs, immutable caching, WebP/gzip variants
+    assets.init_app(app)
+
     # Register blueprints (safe)
     _register_bp_once(app, auth_bp)
     _register_bp_once(app, super_admin_bp)
@@ -45,9 +55,20 @@ def init_routes(app):
     _register_bp_once(app, student_portal_bp)
     _register_bp_once(app, librarian_bp)
     _register_bp_once(app, teacher_bp)
+    _register_bp_once(app, debug_bp)
+
+    # Query count / DB time per request (headers + /_debug/queries)
+    if not app.config.get("QUERYLOG_INSTALLED"):
+        querylog.init_app(app)
+        app.config["QUERYLOG_INSTALLED"] = True
+
+    # Per-endpoint statement/lock timeouts + clean 503 page when one fires
+    if not app.config.get("TIMEOUTS_INSTALLED"):
+        timeouts.init_app(app)
+        app.config["TIMEOUTS_INSTALLED"] = True
 
     # Serve uploaded files (avoid duplicate route on reload)
     if "uploaded_file" not in app.view_functions:
         @app.route("/uploads/<path:filename>")
         def uploaded_file(filename):
-            return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
\ No newline at end of file
+            return uploads.send(app.config["UPLOAD_FOLDER"], filename)
\ No newline at end of file
@@ -1,10 +1,60 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, url_for
 from db import get_db_connection
+from queries import register, run
+import timeouts
 from werkzeug.security import check_password_hash, generate_password_hash
 import psycopg2.extras
 
 auth_bp = Blueprint("auth", __name__)
 
+# Login lookups run on every sign-in attempt: prepared once per connection.
+register("auth.user_by_username", """
+    SELECT user_id, branch_id, username, password, role, status, require_password_change,
+           last_password_change, grade_level, enrollment_id, full_name, gender
+    FROM users
+    WHERE username=%s
+""")
+
+register("auth.branch_name", "SELECT branch_name FROM branches WHERE branch_id = %s")
+
+register("auth.student_by_enrollment", """
+    SELECT e.enrollment_id, e.student_name, e.grade_level, e.branch_id,
+           sa.account_id
+    FROM enrollments e
+    LEFT JOIN student_accounts sa ON sa.enrollment_id = e.enrollment_id
+    WHERE e.enrollment_id = %s
+    LIMIT 1
+""")
+
+register("auth.student_by_username", """
+    SELECT sa.account_id, sa.enrollment_id,
+           e.student_name, e.grade_level, e.branch_id
+    FROM student_accounts sa
+    JOIN enrollments e ON e.enrollment_id = sa.enrollment_id
+    WHERE sa.username = %s
+    LIMIT 1
+""")
+
+register("auth.student_account", """
+    SELECT
+        sa.account_id, sa.enrollment_id, sa.branch_id, sa.username, sa.password, sa.email,
+        sa.is_active, sa.created_at, sa.require_password_change, sa.last_password_change,
+        e.branch_id AS enroll_branch_id,
+        e.student_name,
+        e.grade_level
+    FROM student_accounts sa
+    JOIN enrollments e ON sa.enrollment_id = e.enrollment_id
+    WHERE sa.username=%s
+    LIMIT 1
+""")
+
+register("auth.user_id_by_username", """
+    SELECT user_id
+    FROM users
+    WHERE username=%s
+    LIMIT 1
+""")
+
 def check_password_change_required(user_data, is_student=False):
     """Check if user needs to change password on first login"""
     return user_data.get("require_password_change", 0) == 1
@@ -21,7 +71,7 @@ def login():
 
         try:
             # ✅ 1) Check regular users (super_admin, branch_admin, registrar, cashier, parent, librarian, student if exists)
-            cursor.execute("SELECT * FROM users WHERE username=%s", (username,))
+            run(cursor, "auth.user_by_username", (username,))
             user = cursor.fetchone()
 
             if user:
@@ -43,10 +93,7 @@ def login():
 
                     # Fetch branch name for sidebar display
                     if user.get("branch_id"):
-                        cursor.execute(
-                            "SELECT branch_name FROM branches WHERE branch_id = %s",
-                            (user["branch_id"],)
-                        )
+                        run(cursor, "auth.branch_name", (user["branch_id"],))
                         brow = cursor.fetchone()
                         session["branch_name"] = brow["branch_name"] if brow else None
                     else:
@@ -58,23 +105,9 @@ def login():
                     if role == "student":
                         enrollment_id = user.get("enrollment_id")
                         if enrollment_id:
-                            cursor.execute("""
-                                SELECT e.enrollment_id, e.student_name, e.grade_level, e.branch_id,
-                                       sa.account_id
-                                FROM enrollments e
-                                LEFT JOIN student_accounts sa ON sa.enrollment_id = e.enrollment_id
-                                WHERE e.enrollment_id = %s
-                                LIMIT 1
-                            """, (enrollment_id,))
+                            run(cursor, "auth.student_by_enrollment", (enrollment_id,))
                         else:
-                            cursor.execute("""
-                                SELECT sa.account_id, sa.enrollment_id,
-                                       e.student_name, e.grade_level, e.branch_id
-                                FROM student_accounts sa
-                                JOIN enrollments e ON e.enrollment_id = sa.enrollment_id
-                                WHERE sa.username = %s
-                                LIMIT 1
-                            """, (username,))
+                            run(cursor, "auth.student_by_username", (username,))
                         en = cursor.fetchone()
                         if en:
                             session["student_account_id"]  = en.get("account_id")
@@ -85,10 +118,7 @@ def login():
 
                             # Make sure sidebar branch label follows the student's actual branch
                             if session.get("branch_id"):
-                                cursor.execute(
-                                    "SELECT branch_name FROM branches WHERE branch_id = %s",
-                                    (session["branch_id"],),
-                                )
+                                run(cursor, "auth.branch_name", (session["branch_id"],))
                                 brow = cursor.fetchone()
                                 if brow:
                                     session["branch_name"] = brow["branch_name"]
@@ -117,17 +147,7 @@ def login():
 
 
             # ✅ 2) Check student accounts (MAIN student login path)
-            cursor.execute("""
-                SELECT
-                    sa.*,
-                    e.branch_id AS enroll_branch_id,
-                    e.student_name,
-                    e.grade_level
-                FROM student_accounts sa
-                JOIN enrollments e ON sa.enrollment_id = e.enrollment_id
-                WHERE sa.username=%s
-                LIMIT 1
-            """, (username,))
+            run(cursor, "auth.student_account", (username,))
             student = cursor.fetchone()
 
             if student and student.get("is_active"):
@@ -143,12 +163,7 @@ def login():
                     enrollment_id = student.get("enrollment_id")
 
                     # ✅ ensure student has a matching row in users (reservations.student_user_id NOT NULL)
-                    cursor.execute("""
-                        SELECT user_id
-                        FROM users
-                        WHERE username=%s
-                        LIMIT 1
-                    """, (username,))
+                    run(cursor, "auth.user_id_by_username", (username,))
                     urow = cursor.fetchone()
 
                     if urow:
@@ -184,10 +199,7 @@ def login():
 
                     # Sidebar branch label for student logins (student_accounts path)
                     if branch_id:
-                        cursor.execute(
-                            "SELECT branch_name FROM branches WHERE branch_id = %s",
-                            (branch_id,),
-                        )
+                        run(cursor, "auth.branch_name", (branch_id,))
                         brow = cursor.fetchone()
                         session["branch_name"] = brow["branch_name"] if brow else None
                     else:
@@ -206,6 +218,9 @@ def login():
             flash("Invalid username or password", "error")
             return redirect(url_for("auth.login"))
 
+        except timeouts.ERRORS:
+            db.rollback()
+            raise
         except Exception as e:
             db.rollback()
             flash(f"Login error: {str(e)}", "error")
@@ -342,6 +357,9 @@ def change_password():
                 else:
                     return redirect("/super-admin")
 
+            except timeouts.ERRORS:
+                db.rollback()
+                raise
             except Exception as e:
                 db.rollback()
                 err_msg = str(e).strip()
@@ -1,23 +1,84 @@
-from flask import Blueprint, render_template, request, redirect, session, flash, url_for, jsonify
-from db import get_db_connection, is_branch_active
-from datetime import datetime, date
-from decimal import Decimal
+from flask import (Blueprint, render_template, request, redirect, session, flash, url_for, jsonify,
+                   Response, abort, send_file, stream_with_context)
+from db import get_db_connection, get_read_connection, is_branch_active
+from queries import register, run, query_all, query_one
+import rollups
+import receipts
+import reports as reports_mod
+import reservations
+import billing
+import timeouts
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
+import re
 import secrets
 import psycopg2.extras
 
 cashier_bp = Blueprint("cashier", __name__)
 
-def generate_receipt_number():
-    """Generate unique receipt number: OR-YYYYMMDD-XXXXX"""
-    today = datetime.now().strftime("%Y%m%d")
-    random_part = secrets.token_hex(3).upper()  # 6 character hex
-    return f"OR-{today}-{random_part}"
-
-
 def _require_cashier():
     return session.get("role") == "cashier"
 
 
+# =======================
+# CASHIER WORK QUEUE
+# =======================
+# Approved enrollments split into buckets by bill state, in the order the
+# cashier works them. Counts come from one aggregate; each bucket is paged
+# newest first with a keyset cursor (created_at, enrollment_id), so a page
+# costs the same however deep it is and the full list is never built.
+QUEUE_PAGE_SIZE = 50
+
+# bucket -> condition on the LEFT JOINed billing row b
+QUEUE_BUCKETS = {
+    "unbilled": "b.bill_id IS NULL",
+    "pending": "b.status = 'pending'",
+    "partial": "b.status = 'partial'",
+    "paid": "b.bill_id IS NOT NULL AND b.status IS DISTINCT FROM 'pending' AND b.status IS DISTINCT FROM 'partial'",
+}
+
+_QUEUE_FROM = """
+    FROM enrollments e
+    LEFT JOIN billing b
+      ON b.enrollment_id = e.enrollment_id
+     AND b.branch_id = e.branch_id
+    WHERE e.branch_id = %(branch_id)s AND e.status = 'approved'
+"""
+
+register("cashier.queue_counts", "SELECT COUNT(*) AS total, " + ", ".join(
+    f"COUNT(*) FILTER (WHERE {cond}) AS {bucket}" for bucket, cond in QUEUE_BUCKETS.items()
+) + _QUEUE_FROM)
+
+for _bucket, _cond in QUEUE_BUCKETS.items():
+    # created_at <= ? lets idx_enrollments_branch_status_created drive the
+    # scan; the OR breaks ties on the same timestamp by id.
+    register(f"cashier.queue_{_bucket}", """
+        SELECT e.enrollment_id, e.student_name, e.grade_level, e.branch_id, e.status, e.created_at,
+               e.user_id, e.gender, e.dob, e.address, e.contact_number, e.guardian_name,
+               e.guardian_contact, e.previous_school, e.branch_enrollment_no,
+               b.bill_id, b.balance, b.status AS bill_status
+    """ + _QUEUE_FROM + f"""
+          AND {_cond}
+          AND e.created_at <= %(after_at)s
+          AND (e.created_at < %(after_at)s OR e.enrollment_id < %(after_id)s)
+        ORDER BY e.created_at DESC, e.enrollment_id DESC
+        LIMIT %(limit)s
+    """)
+
+
+def _queue_cursor(row):
+    return f"{row['created_at'].isoformat()}_{row['enrollment_id']}"
+
+
+def _parse_queue_cursor(raw):
+    """(created_at, enrollment_id) from ?after=, or the start of the bucket."""
+    at, _, enrollment_id = (raw or "").rpartition("_")
+    try:
+        return datetime.fromisoformat(at), int(enrollment_id)
+    except ValueError:
+        return datetime.max, 2 ** 31 - 1
+
+
 @cashier_bp.route("/cashier")
 def dashboard():
     if not _require_cashier():
@@ -26,53 +87,44 @@ def dashboard():
         flash("No branch assigned. Please contact admin.", "error")
         return redirect(url_for("auth.login"))
 
+    branch_id = session.get("branch_id")
     db = get_db_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        cursor.execute("""
-            SELECT e.*, b.bill_id, b.balance, b.status AS bill_status
-            FROM enrollments e
-            LEFT JOIN billing b
-              ON e.enrollment_id = b.enrollment_id
-             AND b.branch_id = %s
-            WHERE e.branch_id = %s AND e.status = 'approved'
-            ORDER BY
-              CASE
-                WHEN b.bill_id IS NULL THEN 0
-                WHEN b.status = 'pending' THEN 1
-                WHEN b.status = 'partial' THEN 2
-                ELSE 3
-              END,
-              e.created_at DESC
-        """, (session.get("branch_id"), session.get("branch_id")))
-        enrollments = cursor.fetchall()
-
-        cursor.execute("""
-            SELECT
-              COUNT(*) AS payment_count,
-              COALESCE(SUM(amount), 0) AS total_collected
-            FROM payments
-            WHERE payment_date::date = %s
-              AND branch_id = %s
-              AND received_by = %s
-        """, (date.today(), session.get("branch_id"), session.get("user_id")))
-        today_summary = cursor.fetchone() or {"payment_count": 0, "total_collected": 0}
-
-        cursor.execute("""
-            SELECT COUNT(*) AS pending_count
-            FROM billing b
-            JOIN enrollments e ON b.enrollment_id = e.enrollment_id
-            WHERE e.branch_id = %s
-              AND b.status IN ('pending', 'partial')
-        """, (session.get("branch_id"),))
-        pending_info = cursor.fetchone() or {"pending_count": 0}
+        counts = query_one("cashier.queue_counts", {"branch_id": branch_id}, conn=db)
+
+        bucket = request.args.get("bucket")
+        if bucket not in QUEUE_BUCKETS:
+            # first bucket with work in it, like the old CASE ordering
+            bucket = next((b for b in QUEUE_BUCKETS if counts[b]), "unbilled")
+
+        after = request.args.get("after")
+        after_at, after_id = _parse_queue_cursor(after)
+        enrollments = query_all(f"cashier.queue_{bucket}", {
+            "branch_id": branch_id,
+            "after_at": after_at,
+            "after_id": after_id,
+            "limit": QUEUE_PAGE_SIZE + 1,
+        }, conn=db)
+        next_cursor = None
+        if len(enrollments) > QUEUE_PAGE_SIZE:
+            enrollments = enrollments[:QUEUE_PAGE_SIZE]
+            next_cursor = _queue_cursor(enrollments[-1])
+
+        today = reports_mod.branch_today(cursor, branch_id)
+        today_summary = rollups.totals(cursor, branch_id, today, received_by=session.get("user_id"))
 
         return render_template(
             "cashier_dashboard.html",
             enrollments=enrollments,
             today_summary=today_summary,
-            pending_count=pending_info["pending_count"]
+            pending_count=counts["pending"] + counts["partial"],
+            counts=counts,
+            buckets=list(QUEUE_BUCKETS),
+            bucket=bucket,
+            next_cursor=next_cursor,
+            is_first_page=not after,
         )
     finally:
         cursor.close()
@@ -126,6 +178,15 @@ def create_bill(enrollment_id):
             total_amount = tuition_fee + books_fee + uniform_fee + other_fees
 
             try:
+                # a bulk billing run may have billed it since the page loaded
+                billing.lock_branch(cursor, session.get("branch_id"))
+                cursor.execute("SELECT bill_id FROM billing WHERE enrollment_id = %s", (enrollment_id,))
+                existing_bill = cursor.fetchone()
+                if existing_bill:
+                    db.rollback()
+                    flash("Bill already exists for this enrollment", "warning")
+                    return redirect(url_for("cashier.view_bill", bill_id=existing_bill["bill_id"]))
+
                 cursor.execute("""
                     INSERT INTO billing
                       (enrollment_id, branch_id, tuition_fee, books_fee, uniform_fee, other_fees,
@@ -149,6 +210,9 @@ def create_bill(enrollment_id):
                 flash(f"Bill created successfully! Total: ₱{total_amount:,.2f}", "success")
                 return redirect(url_for("cashier.view_bill", bill_id=bill_id))
 
+            except timeouts.ERRORS:
+                db.rollback()
+                raise
             except Exception as e:
                 db.rollback()
                 flash(f"Failed to create bill: {str(e)}", "error")
@@ -164,6 +228,93 @@ def create_bill(enrollment_id):
         db.close()
 
 
+# =======================
+# BULK BILLING RUNS
+# =======================
+# One fee schedule applied to every approved, unbilled enrollment of the
+# branch (optionally one grade) by a background billing run (billing.py).
+BILLING_RUN_FEES = ("tuition_fee", "books_fee", "uniform_fee", "other_fees")
+BILLING_RUNS_SHOWN = 20
+
+
+def _billing_run_json(r):
+    return {
+        "run_id": r["run_id"],
+        "status": "stalled" if r["stalled"] else r["status"],
+        "grade_level": r["grade_level"],
+        "total": r["total"],
+        "skipped": r["skipped"],
+        "created_count": r["created_count"],
+        "error": r["error"],
+        "started_at": r["started_at"].isoformat() if r["started_at"] else None,
+        "finished_at": r["finished_at"].isoformat() if r["finished_at"] else None,
+    }
+
+
+@cashier_bp.route("/cashier/billing-runs", methods=["GET", "POST"])
+def billing_runs():
+    if not _require_cashier():
+        return redirect("/")
+
+    branch_id = session.get("branch_id")
+    db = get_db_connection()
+    cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        if request.method == "POST":
+            if not is_branch_active(branch_id):
+                flash("This branch is currently deactivated. New billing records are not allowed.", "error")
+                return redirect(url_for("cashier.billing_runs"))
+
+            fees = {name: _parse_amount(request.form.get(name)).quantize(Decimal("0.01"))
+                    for name in BILLING_RUN_FEES}
+            if any(fee < 0 for fee in fees.values()) or sum(fees.values()) <= 0:
+                flash("Enter the fees to bill (at least one above zero, none negative).", "error")
+                return redirect(url_for("cashier.billing_runs"))
+
+            # one run at a time per branch, checked under the branch's billing lock;
+            # a stalled run (its worker died) is failed and no longer counts
+            billing.lock_branch(cursor, branch_id)
+            run(cursor, "billing.fail_stalled", (billing.STALE_MINUTES, branch_id, billing.STALE_MINUTES))
+            active = query_one("billing.active_run", (branch_id, billing.STALE_MINUTES), conn=db)
+            if active:
+                db.rollback()
+                flash(f"Billing run #{active['run_id']} is still in progress.", "warning")
+                return redirect(url_for("cashier.billing_runs"))
+
+            run_id = billing.create_run(cursor, branch_id, request.form.get("grade_level"), fees,
+                                        session.get("user_id"))
+            db.commit()
+            billing.start(run_id)
+            flash(f"Billing run #{run_id} started.", "success")
+            return redirect(url_for("cashier.billing_runs"))
+
+        runs = query_all("billing.runs", (billing.STALE_MINUTES, branch_id, BILLING_RUNS_SHOWN), conn=db)
+        unbilled = query_all("billing.unbilled_by_grade", (branch_id,), conn=db)
+        return render_template(
+            "cashier_billing_runs.html",
+            runs=runs,
+            unbilled=unbilled,
+            unbilled_total=sum(r["n"] for r in unbilled),
+            in_progress=any(r["status"] in ("queued", "running") and not r["stalled"] for r in runs),
+        )
+    finally:
+        cursor.close()
+        db.close()
+
+
+@cashier_bp.route("/cashier/api/billing-runs/<int:run_id>")
+def api_billing_run(run_id):
+    """Progress of one billing run of the cashier's branch as JSON."""
+    if not _require_cashier():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    r = query_one("billing.run", (billing.STALE_MINUTES, run_id, session.get("branch_id")))
+    if r is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(_billing_run_json(r))
+
+
 @cashier_bp.route("/cashier/bill/<int:bill_id>")
 def view_bill(bill_id):
     if not _require_cashier():
@@ -203,6 +354,103 @@ def view_bill(bill_id):
         db.close()
 
 
+# Payment posting. Several cashiers may post against the same bill at once:
+# the balance is checked and moved in one UPDATE (the row lock serialises
+# concurrent posts and the WHERE is re-checked against the committed balance),
+# and the form's idempotency key makes a resubmitted form a no-op.
+register("cashier.payment_by_key", """
+    SELECT payment_id, bill_id, receipt_number
+    FROM payments
+    WHERE idempotency_key = %s AND branch_id = %s
+""")
+
+register("cashier.insert_payment", """
+    INSERT INTO payments
+      (bill_id, enrollment_id, branch_id, amount, payment_method,
+       receipt_number, notes, received_by, idempotency_key)
+    VALUES
+      (%(bill_id)s, %(enrollment_id)s, %(branch_id)s, %(amount)s, %(payment_method)s,
+       %(receipt_number)s, %(notes)s, %(received_by)s, %(idempotency_key)s)
+    ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+    RETURNING payment_id
+""")
+
+register("cashier.apply_payment", """
+    UPDATE billing
+    SET amount_paid = COALESCE(amount_paid, 0) + %(amount)s,
+        balance = GREATEST(total_amount - (COALESCE(amount_paid, 0) + %(amount)s), 0),
+        status = CASE WHEN total_amount - (COALESCE(amount_paid, 0) + %(amount)s) <= 0
+                      THEN 'paid' ELSE 'partial' END,
+        updated_at = NOW()
+    WHERE bill_id = %(bill_id)s
+      AND branch_id = %(branch_id)s
+      AND status <> 'paid'
+      AND balance >= %(amount)s
+    RETURNING balance, status
+""")
+
+
+def _parse_amount(text):
+    try:
+        amount = Decimal(text or "0")
+    except InvalidOperation:
+        return Decimal("0")
+    return amount if amount.is_finite() else Decimal("0")
+
+
+def post_payment(cursor, bill, amount, payment_method, notes, received_by, idempotency_key):
+    """
+    Move the bill's balance and insert the payment with the next official
+    receipt number, in the caller's transaction. Returns
+    (payment_id, receipt_number, None) on success, (None, None, "balance")
+    when the bill can no longer take the amount, and
+    (payment_id, receipt_number, "duplicate") when idempotency_key was
+    already posted. On a problem the caller must roll back (nothing of this
+    call may be committed); otherwise it commits.
+
+    Locks are always taken bill row first, then the branch's receipt
+    counter, so concurrent posts queue instead of deadlocking.
+    """
+    branch_id = bill["branch_id"]
+
+    def posted_already():
+        if idempotency_key is None:
+            return None
+        run(cursor, "cashier.payment_by_key", (idempotency_key, branch_id))
+        return cursor.fetchone()
+
+    run(cursor, "cashier.apply_payment", {"amount": amount, "bill_id": bill["bill_id"], "branch_id": branch_id})
+    if cursor.fetchone() is None:
+        # a double-submitted form that lost the race finds the bill drained
+        # by its twin, which has committed by the time the lock is released
+        existing = posted_already()
+        if existing:
+            return existing["payment_id"], existing["receipt_number"], "duplicate"
+        return None, None, "balance"
+
+    receipt_number = receipts.next_number(cursor, branch_id, receipts.PAYMENT_SERIES)
+    run(cursor, "cashier.insert_payment", {
+        "bill_id": bill["bill_id"],
+        "enrollment_id": bill["enrollment_id"],
+        "branch_id": branch_id,
+        "amount": amount,
+        "payment_method": payment_method,
+        "receipt_number": receipt_number,
+        "notes": notes,
+        "received_by": received_by,
+        "idempotency_key": idempotency_key,
+    })
+    row = cursor.fetchone()
+    if row is None:
+        # same key committed by a concurrent submit (ON CONFLICT DO NOTHING)
+        existing = posted_already()
+        return existing["payment_id"], existing["receipt_number"], "duplicate"
+    payment_id = row["payment_id"]
+
+    rollups.record_payment(cursor, payment_id)
+    return payment_id, receipt_number, None
+
+
 @cashier_bp.route("/cashier/process-payment/<int:bill_id>", methods=["GET", "POST"])
 def process_payment(bill_id):
     if not _require_cashier():
@@ -216,6 +464,16 @@ def process_payment(bill_id):
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
+        idempotency_key = request.form.get("idempotency_key", "").strip()[:64]
+        if request.method == "POST" and idempotency_key:
+            # resubmitted form (double click, back + submit): show the first receipt
+            run(cursor, "cashier.payment_by_key", (idempotency_key, session.get("branch_id")))
+            existing = cursor.fetchone()
+            db.rollback()
+            if existing and existing["bill_id"] == bill_id:
+                flash(f"This payment was already recorded. Receipt: {existing['receipt_number']}", "info")
+                return redirect(url_for("cashier.print_receipt", payment_id=existing["payment_id"]))
+
         cursor.execute("""
             SELECT b.*, e.student_name, e.grade_level
             FROM billing b
@@ -233,7 +491,7 @@ def process_payment(bill_id):
             return redirect(url_for("cashier.view_bill", bill_id=bill_id))
 
         if request.method == "POST":
-            amount = Decimal(request.form.get("amount", "0") or "0")
+            amount = _parse_amount(request.form.get("amount"))
             payment_method = request.form.get("payment_method", "cash")
             notes = request.form.get("notes", "")
 
@@ -246,54 +504,37 @@ def process_payment(bill_id):
                 )
             else:
                 try:
-                    receipt_number = generate_receipt_number()
-
-                    cursor.execute("""
-                        INSERT INTO payments
-                          (bill_id, enrollment_id, branch_id, amount, payment_method,
-                           receipt_number, notes, received_by)
-                        VALUES
-                          (%s, %s, %s, %s, %s,
-                           %s, %s, %s)
-                        RETURNING payment_id
-                    """, (
-                        bill_id,
-                        bill["enrollment_id"],
-                        session.get("branch_id"),
-                        amount,
-                        payment_method,
-                        receipt_number,
-                        notes,
-                        session.get("user_id"),
-                    ))
-                    payment_id = cursor.fetchone()["payment_id"]
-
-                    amount_paid_now = Decimal(str(bill.get("amount_paid", 0)))
-                    total_amount = Decimal(str(bill.get("total_amount", 0)))
-
-                    new_amount_paid = amount_paid_now + amount
-                    new_balance = total_amount - new_amount_paid
-                    if new_balance < 0:
-                        new_balance = Decimal("0")
-
-                    new_status = "paid" if new_balance == 0 else "partial"
-
-                    cursor.execute("""
-                        UPDATE billing
-                        SET amount_paid = %s, balance = %s, status = %s
-                        WHERE bill_id = %s
-                    """, (new_amount_paid, new_balance, new_status, bill_id))
+                    payment_id, receipt_number, problem = post_payment(
+                        cursor, bill, amount, payment_method, notes,
+                        session.get("user_id"), idempotency_key or None,
+                    )
+                    if problem == "balance":
+                        # another cashier posted against this bill after it was loaded
+                        db.rollback()
+                        flash("The balance changed while this form was open (another payment was posted). "
+                              "Check the new balance and try again.", "error")
+                        return redirect(url_for("cashier.process_payment", bill_id=bill_id))
+                    if problem == "duplicate":
+                        db.rollback()
+                        flash(f"This payment was already recorded. Receipt: {receipt_number}", "info")
+                        return redirect(url_for("cashier.print_receipt", payment_id=payment_id))
 
                     db.commit()
-
                     flash(f"Payment recorded successfully! Receipt: {receipt_number}", "success")
                     return redirect(url_for("cashier.print_receipt", payment_id=payment_id))
 
+                except timeouts.ERRORS:
+                    db.rollback()
+                    raise
                 except Exception as e:
                     db.rollback()
                     flash(f"Failed to process payment: {str(e)}", "error")
 
-        return render_template("cashier_process_payment.html", bill=bill)
+        return render_template(
+            "cashier_process_payment.html",
+            bill=bill,
+            idempotency_key=idempotency_key or secrets.token_urlsafe(24),
+        )
     finally:
         cursor.close()
         db.close()
@@ -333,58 +574,169 @@ def print_receipt(payment_id):
         db.close()
 
 
+# Reports cover a branch-local day, week, month or school term (reports.py).
+# The page shows the first REPORT_PAGE_ROWS payments; the CSV/XLSX exports
+# stream all of them from a server-side cursor.
+REPORT_PAGE_ROWS = 500
+
+
+def _report_request(cursor):
+    """(period, day, start, end, label, window) from the query string or form."""
+    period = request.values.get("period", "day")
+    if period not in reports_mod.PERIODS:
+        period = "day"
+    branch_id = session.get("branch_id")
+    try:
+        day = date.fromisoformat(request.values.get("report_date", ""))
+        # a period running past 9999-12-31 (or before 0001-01-01) cannot be shown
+        start, end, label = reports_mod.period_range(period, day)
+    except (ValueError, OverflowError):
+        day = reports_mod.branch_today(cursor, branch_id)
+        start, end, label = reports_mod.period_range(period, day)
+    window = reports_mod.bounds(cursor, branch_id, start, end)
+    if window is None:
+        abort(404)
+    return period, day, start, end, label, window
+
+
 @cashier_bp.route("/cashier/reports", methods=["GET", "POST"])
 def reports():
     if not _require_cashier():
         return redirect("/")
 
-    report_date = request.form.get("report_date", date.today().strftime("%Y-%m-%d"))
-
-    db = get_db_connection()
+    branch_id = session.get("branch_id")
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        cursor.execute("""
-            SELECT
-              p.payment_id,
-              p.receipt_number,
-              p.amount,
-              p.payment_method,
-              p.payment_date,
-              e.student_name,
-              e.grade_level,
-              u.username AS received_by_name
-            FROM payments p
-            JOIN enrollments e ON p.enrollment_id = e.enrollment_id
-            JOIN users u ON p.received_by = u.user_id
-            WHERE p.payment_date::date = %s
-              AND e.branch_id = %s
-            ORDER BY p.payment_date DESC
-        """, (report_date, session.get("branch_id")))
-        payments = cursor.fetchall()
+        period, day, start, end, label, window = _report_request(cursor)
+        payments = list(reports_mod.payment_rows(db, branch_id, window, limit=REPORT_PAGE_ROWS + 1))
+        truncated = len(payments) > REPORT_PAGE_ROWS
+        payments = payments[:REPORT_PAGE_ROWS]
 
-        cursor.execute("""
-            SELECT
-              COUNT(*) AS transaction_count,
-              COALESCE(SUM(p.amount), 0) AS total_collected
-            FROM payments p
-            JOIN enrollments e ON p.enrollment_id = e.enrollment_id
-            WHERE p.payment_date::date = %s
-              AND e.branch_id = %s
-        """, (report_date, session.get("branch_id")))
-        summary = cursor.fetchone() or {"transaction_count": 0, "total_collected": 0}
+        totals = rollups.totals(cursor, branch_id, start, end)
+        summary = {"transaction_count": totals["payment_count"], "total_collected": totals["total_collected"]}
 
         return render_template(
             "cashier_reports.html",
             payments=payments,
             summary=summary,
-            report_date=report_date
+            report_date=day.strftime("%Y-%m-%d"),
+            period=period,
+            periods=reports_mod.PERIODS,
+            period_label=label,
+            truncated=truncated,
+            xlsx_available=reports_mod.openpyxl is not None,
         )
     finally:
         cursor.close()
         db.close()
 
 
+@cashier_bp.route("/cashier/reports/export.<fmt>")
+def reports_export(fmt):
+    if not _require_cashier():
+        return redirect("/")
+    if fmt not in ("csv", "xlsx"):
+        return "Unknown export format", 404
+    if fmt == "xlsx" and reports_mod.openpyxl is None:
+        flash("XLSX export is not available on this server; download CSV instead.", "error")
+        return redirect(url_for("cashier.reports", **request.args))
+
+    branch_id = session.get("branch_id")
+    db = get_read_connection()
+    cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        period, day, start, end, label, window = _report_request(cursor)
+    except Exception:
+        db.close()
+        raise
+    finally:
+        cursor.close()
+    filename = f"collections_{period}_{start:%Y%m%d}-{end - timedelta(days=1):%Y%m%d}.{fmt}"
+
+    if fmt == "xlsx":
+        try:
+            out = reports_mod.xlsx_file(reports_mod.payment_rows(db, branch_id, window))
+        finally:
+            db.close()
+        return send_file(
+            out,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            as_attachment=True,
+            download_name=filename,
+        )
+
+    def generate():
+        # holds the connection until the last row is sent (or the client goes away)
+        try:
+            for chunk in reports_mod.csv_chunks(reports_mod.payment_rows(db, branch_id, window)):
+                yield chunk.encode("utf-8")
+        finally:
+            db.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# =======================
+# STUDENT SEARCH
+# =======================
+# Full-text search over student and guardian names (idx_enrollments_search,
+# migrations/0011; keep the expression identical), plus exact enrollment
+# number / id. Every word typed is a prefix: "jua del" finds "Juan Dela Cruz".
+ENROLLMENT_SEARCH_VECTOR = (
+    "to_tsvector('simple'::regconfig, COALESCE(e.student_name, '') || ' ' || COALESCE(e.guardian_name, ''))"
+)
+SEARCH_PAGE_LIMIT = 50
+AUTOCOMPLETE_LIMIT = 10
+
+register("cashier.search", """
+    SELECT e.enrollment_id, e.branch_enrollment_no, e.student_name, e.grade_level,
+           e.guardian_name, e.created_at,
+           b.bill_id, b.balance, b.status AS bill_status, b.total_amount, b.amount_paid
+    FROM enrollments e
+    LEFT JOIN billing b ON e.enrollment_id = b.enrollment_id
+    WHERE e.branch_id = %(branch_id)s
+      AND (""" + ENROLLMENT_SEARCH_VECTOR + """ @@ to_tsquery('simple', %(terms)s)
+           OR e.branch_enrollment_no = %(number)s
+           OR e.enrollment_id = %(number)s)
+    ORDER BY (e.branch_enrollment_no = %(number)s OR e.enrollment_id = %(number)s) DESC NULLS LAST,
+             ts_rank(""" + ENROLLMENT_SEARCH_VECTOR + """, to_tsquery('simple', %(terms)s)) DESC,
+             e.student_name, e.enrollment_id
+    LIMIT %(limit)s
+""")
+
+_SEARCH_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _search_terms(text):
+    """
+    tsquery text for what the cashier typed: every word as a prefix, ANDed
+    ("juan d" -> "juan:* & d:*"). Only letters and digits are kept, so
+    nothing typed can be tsquery syntax.
+    """
+    words = _SEARCH_WORD.findall(text.lower())[:8]
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def search_students(branch_id, text, limit, conn=None):
+    text = (text or "").strip()[:100]
+    terms = _search_terms(text)
+    number = int(text) if text.isdigit() and len(text) < 10 else None
+    if not terms and number is None:
+        return []
+    return query_all("cashier.search", {
+        "branch_id": branch_id,
+        "terms": terms,         # '' matches nothing (number-only search)
+        "number": number,
+        "limit": limit,
+    }, conn=conn)
+
+
 @cashier_bp.route("/cashier/search", methods=["GET", "POST"])
 def search():
     if not _require_cashier():
@@ -395,38 +747,37 @@ def search():
 
     if request.method == "POST":
         search_query = request.form.get("search_query", "").strip()
-
         if search_query:
-            db = get_db_connection()
-            cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-            try:
-                is_numeric = search_query.isdigit()
+            results = search_students(session.get("branch_id"), search_query, SEARCH_PAGE_LIMIT)
 
-                cursor.execute("""
-                    SELECT e.*, b.bill_id, b.balance, b.status AS bill_status,
-                           b.total_amount, b.amount_paid
-                    FROM enrollments e
-                    LEFT JOIN billing b ON e.enrollment_id = b.enrollment_id
-                    WHERE e.branch_id = %s
-                      AND (
-                        (%s AND e.enrollment_id = %s)
-                        OR (e.student_name ILIKE %s)
-                      )
-                    ORDER BY e.created_at DESC
-                """, (
-                    session.get("branch_id"),
-                    is_numeric,
-                    int(search_query) if is_numeric else 0,
-                    f"%{search_query}%"
-                ))
+    return render_template(
+        "cashier_search.html",
+        results=results,
+        search_query=search_query,
+        limit=SEARCH_PAGE_LIMIT,
+    )
 
-                results = cursor.fetchall()
-            finally:
-                cursor.close()
-                db.close()
 
-    return render_template("cashier_search.html", results=results, search_query=search_query)
+@cashier_bp.route("/cashier/api/search", methods=["GET"])
+def api_search():
+    """Autocomplete for the search box: up to AUTOCOMPLETE_LIMIT matches as JSON."""
+    if not _require_cashier():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    rows = search_students(session.get("branch_id"), request.args.get("q", ""), AUTOCOMPLETE_LIMIT)
+    return jsonify([
+        {
+            "enrollment_id": r["enrollment_id"],
+            "branch_enrollment_no": r["branch_enrollment_no"],
+            "student_name": r["student_name"],
+            "grade_level": r["grade_level"],
+            "guardian_name": r["guardian_name"],
+            "bill_id": r["bill_id"],
+            "bill_status": r["bill_status"],
+            "balance": float(r["balance"]) if r["balance"] is not None else None,
+        }
+        for r in rows
+    ])
 
 
 # =======================
@@ -443,79 +794,98 @@ def _normalize_category(raw: str | None) -> str | None:
     return None
 
 
+# The list reads the header projection stored on each reservation
+# (reservations.py), so a page is one index range scan of reservations with
+# no per-row joins. Paged newest first with a keyset cursor (created_at,
+# reservation_id) like the work queue, optionally narrowed to one status and
+# to branch-local days [from, to].
+RESERVATION_PAGE_SIZE = 50
+RESERVATION_STATUSES = ("RESERVED", "PAID", "CLAIMED", "CANCELLED")
+
+_RESERVATION_LIST_FROM = """
+    FROM reservations r
+    WHERE r.branch_id = %(branch_id)s
+      AND r.created_at >= %(start_at)s AND r.created_at < %(end_at)s
+"""
+
+register("cashier.reservation_counts", "SELECT COUNT(*) AS total, " + ", ".join(
+    f"COUNT(*) FILTER (WHERE r.status = '{status}') AS {status.lower()}" for status in RESERVATION_STATUSES
+) + _RESERVATION_LIST_FROM)
+
+for _name, _cond in (("all", ""), ("status", "AND r.status = %(status)s")):
+    register(f"cashier.reservation_page_{_name}", """
+        SELECT r.reservation_id, r.enrollment_id, r.student_name, r.student_username, r.grade_level,
+               r.reserved_by_role, r.reserved_by_name, r.reserved_by_relationship,
+               r.status, r.created_at, r.total_qty, r.total_amount
+    """ + _RESERVATION_LIST_FROM + f"""
+          {_cond}
+          AND r.created_at <= %(after_at)s
+          AND (r.created_at < %(after_at)s OR r.reservation_id < %(after_id)s)
+        ORDER BY r.created_at DESC, r.reservation_id DESC
+        LIMIT %(limit)s
+    """)
+
 @cashier_bp.route("/cashier/reservations")
 def cashier_reservations():
     if not _require_cashier():
         return redirect(url_for("auth.login"))
 
     branch_id = session.get("branch_id")
-    conn = get_db_connection()
-    cur = None
+    status = (request.args.get("status") or "").upper()
+    if status not in RESERVATION_STATUSES:
+        status = ""
+    days = {}
+    for key in ("from", "to"):
+        try:
+            days[key] = date.fromisoformat(request.args.get(key, ""))
+        except ValueError:
+            days[key] = None
+
+    db = get_db_connection()
+    cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cur = conn.cursor()
+        # an open end of the date range is an unbounded timestamp; so is
+        # to=9999-12-31, which has no next day
+        end = days["to"] + timedelta(days=1) if days["to"] and days["to"] < date.max else date.max
+        window = reports_mod.bounds(cursor, branch_id, days["from"] or date.min, end)
+        if window is None:
+            abort(404)
+        params = {
+            "branch_id": branch_id,
+            "start_at": window["start_at"] if days["from"] else datetime.min,
+            "end_at": window["end_at"] if days["to"] else datetime.max,
+        }
+        counts = query_one("cashier.reservation_counts", params, conn=db)
+
+        after = request.args.get("after")
+        after_at, after_id = _parse_queue_cursor(after)
+        rows = query_all("cashier.reservation_page_" + ("status" if status else "all"), {
+            **params,
+            "status": status,
+            "after_at": after_at,
+            "after_id": after_id,
+            "limit": RESERVATION_PAGE_SIZE + 1,
+        }, conn=db)
+        next_cursor = None
+        if len(rows) > RESERVATION_PAGE_SIZE:
+            rows = rows[:RESERVATION_PAGE_SIZE]
+            last = rows[-1]
+            next_cursor = f"{last['created_at'].isoformat()}_{last['reservation_id']}"
 
-        cur.execute("""
-            SELECT
-                r.reservation_id,          -- 0
-                COALESCE(u.username, '') AS username,   -- 1
-                r.student_user_id,         -- 2
-                r.student_grade_level,     -- 3
-                COALESCE(
-                    e.student_name,
-                    svp.student_name,
-                    u.username,
-                    ''
-                ) AS full_name,            -- 4
-                COALESCE(r.student_grade_level, svp.grade_level) AS grade_level, -- 5
-                NULL AS strand,            -- 6
-                r.status,                  -- 7
-                r.created_at,              -- 8
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN 'parent'
-                  ELSE 'student'
-                END AS reserved_by_role,   -- 9
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN COALESCE(
-                    svp.guardian_name,
-                    reserved_by.username
-                  )
-                  ELSE NULL
-                END AS parent_name,        -- 10
-                svp.relationship           -- 11
-            FROM reservations r
-            LEFT JOIN users u ON u.user_id = r.student_user_id
-            LEFT JOIN student_accounts sa ON sa.username = u.username
-            LEFT JOIN enrollments e ON e.enrollment_id = sa.enrollment_id
-            LEFT JOIN users reserved_by ON reserved_by.user_id = r.reserved_by_user_id
-            LEFT JOIN LATERAL (
-                SELECT
-                    e2.student_name,
-                    e2.grade_level,
-                    e2.guardian_name,
-                    ps2.relationship
-                FROM parent_student ps2
-                JOIN enrollments e2 ON e2.enrollment_id = ps2.student_id
-                WHERE ps2.parent_id = r.reserved_by_user_id
-                ORDER BY ps2.student_id
-                LIMIT 1
-            ) svp ON (reserved_by.role = 'parent')
-            WHERE r.branch_id = %s
-            ORDER BY r.created_at DESC
-        """, (branch_id,))
-        rows = cur.fetchall() or []
+        return render_template(
+            "cashier_reservations.html",
+            rows=rows,
+            counts=counts,
+            statuses=RESERVATION_STATUSES,
+            status=status,
+            date_from=days["from"].isoformat() if days["from"] else "",
+            date_to=days["to"].isoformat() if days["to"] else "",
+            next_cursor=next_cursor,
+            is_first_page=not after,
+        )
     finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
-        conn.close()
-
-    return render_template("cashier_reservations.html", rows=rows)
+        cursor.close()
+        db.close()
 
 
 @cashier_bp.route("/cashier/reservations/<int:reservation_id>")
@@ -528,119 +898,7 @@ def cashier_reservation_view(reservation_id):
     cur = None
     try:
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT
-                r.reservation_id,
-                COALESCE(u.username, '') AS username,
-                r.student_user_id,
-                r.student_grade_level,
-                COALESCE(
-                    e.student_name,
-                    svp.student_name,
-                    u.username,
-                    ''
-                ) AS full_name,
-                COALESCE(r.student_grade_level, svp.grade_level) AS grade_level,
-                NULL AS strand,
-                r.status,
-                r.created_at,
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN 'parent'
-                  ELSE 'student'
-                END AS reserved_by_role,
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN COALESCE(
-                    svp.guardian_name,
-                    reserved_by.username
-                  )
-                  ELSE NULL
-                END AS parent_name,
-                svp.relationship
-            FROM reservations r
-            LEFT JOIN users u ON u.user_id = r.student_user_id
-            LEFT JOIN student_accounts sa ON sa.username = u.username
-            LEFT JOIN enrollments e ON e.enrollment_id = sa.enrollment_id
-            LEFT JOIN users reserved_by ON reserved_by.user_id = r.reserved_by_user_id
-            LEFT JOIN LATERAL (
-                SELECT
-                    e2.student_name,
-                    e2.grade_level,
-                    e2.guardian_name,
-                    ps2.relationship
-                FROM parent_student ps2
-                JOIN enrollments e2 ON e2.enrollment_id = ps2.student_id
-                WHERE ps2.parent_id = r.reserved_by_user_id
-                ORDER BY ps2.student_id
-                LIMIT 1
-            ) svp ON (reserved_by.role = 'parent')
-            WHERE r.reservation_id = %s AND r.branch_id = %s
-            LIMIT 1
-        """, (reservation_id, branch_id))
-        header = cur.fetchone()
-        if not header:
-            return render_template("template_missing.html", missing="Reservation not found")
-
-        # 1) Get available categories for this reservation (so UI can show BOOK + UNIFORM)
-        cur.execute("""
-            SELECT DISTINCT ii.category
-            FROM reservation_items ri
-            JOIN inventory_items ii ON ii.item_id = ri.item_id
-            WHERE ri.reservation_id = %s
-            ORDER BY ii.category
-        """, (reservation_id,))
-        categories = [row[0] for row in (cur.fetchall() or []) if row and row[0]]
-
-        # 2) Determine selected category (default UNIFORM if present)
-        selected_category = _normalize_category(request.args.get("category"))
-        if not selected_category:
-            if "UNIFORM" in categories:
-                selected_category = "UNIFORM"
-            elif categories:
-                # fallback to first available category in DB
-                selected_category = str(categories[0]).upper()
-            else:
-                selected_category = None
-
-        # 3) Compute grand total (ALL categories)
-        cur.execute("""
-            SELECT COALESCE(SUM(ri.line_total), 0)
-            FROM reservation_items ri
-            WHERE ri.reservation_id = %s
-        """, (reservation_id,))
-        grand_total = cur.fetchone()[0] or 0
-
-        # 4) Fetch items (filtered by selected_category, like your UI tabs/filter)
-        if selected_category:
-            cur.execute("""
-                SELECT ii.item_name, ri.qty,
-                       COALESCE(NULLIF(TRIM(ri.size_label), ''), ii.publisher, ii.size_label) AS display_label,
-                       ri.unit_price, ri.line_total, ii.category
-                FROM reservation_items ri
-                JOIN inventory_items ii ON ii.item_id = ri.item_id
-                WHERE ri.reservation_id = %s
-                  AND UPPER(ii.category) = %s
-                ORDER BY ii.item_name
-            """, (reservation_id, selected_category))
-        else:
-            # no items / no category
-            cur.execute("""
-                SELECT ii.item_name, ri.qty,
-                       COALESCE(NULLIF(TRIM(ri.size_label), ''), ii.publisher, ii.size_label) AS display_label,
-                       ri.unit_price, ri.line_total, ii.category
-                FROM reservation_items ri
-                JOIN inventory_items ii ON ii.item_id = ri.item_id
-                WHERE ri.reservation_id = %s
-                ORDER BY ii.category, ii.item_name
-            """, (reservation_id,))
-
-        items = cur.fetchall() or []
-        total = sum(item[4] for item in items)  # filtered total (based on selected_category)
-
+        header, all_items, _version = reservations.load(cur, reservation_id, branch_id)
     finally:
         if cur:
             try:
@@ -649,6 +907,33 @@ def cashier_reservation_view(reservation_id):
                 pass
         conn.close()
 
+    if not header:
+        return render_template("template_missing.html", missing="Reservation not found")
+
+    # categories present (so UI can show BOOK + UNIFORM), in the loader's order
+    categories = []
+    for item in all_items:
+        if item["category"] and item["category"] not in categories:
+            categories.append(item["category"])
+
+    # selected category (default UNIFORM if present)
+    selected_category = _normalize_category(request.args.get("category"))
+    if not selected_category:
+        if "UNIFORM" in categories:
+            selected_category = "UNIFORM"
+        elif categories:
+            # fallback to first available category
+            selected_category = str(categories[0]).upper()
+        else:
+            selected_category = None
+
+    grand_total = sum(item["line_total"] for item in all_items)
+    if selected_category:
+        items = [item for item in all_items if str(item["category"] or "").upper() == selected_category]
+    else:
+        items = all_items
+    total = sum(item["line_total"] for item in items)  # filtered total (based on selected_category)
+
     return render_template(
         "cashier_reservation_view.html",
         header=header,
@@ -696,67 +981,24 @@ def cashier_mark_paid(reservation_id):
     return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
 
 
-@cashier_bp.route("/cashier/reservations/<int:reservation_id>/mark-claimed", methods=["POST"])
-def cashier_mark_claimed(reservation_id):
-    if not _require_cashier():
-        return redirect(url_for("auth.login"))
+# Claiming and cancelling go through reservations.claim / reservations.cancel,
+# which handle any number of reservations with a fixed number of statements;
+# the bulk endpoints take up to BULK_RESERVATION_LIMIT ids in one transaction
+# for distribution day.
+BULK_RESERVATION_LIMIT = 500
+BULK_ACTIONS = {"claim": reservations.claim, "cancel": reservations.cancel}
 
+
+def _change_reservations(action, reservation_ids):
+    """Run a BULK_ACTIONS action in one transaction: {reservation_id: None or reason}."""
     branch_id = session.get("branch_id")
-    if not is_branch_active(branch_id):
-        flash("This branch is currently deactivated. Changes to reservations are not allowed.", "error")
-        return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
     conn = get_db_connection()
     cur = None
     try:
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT status
-            FROM reservations
-            WHERE reservation_id = %s AND branch_id = %s
-            FOR UPDATE
-        """, (reservation_id, branch_id))
-        r = cur.fetchone()
-        if not r:
-            raise Exception("Reservation not found.")
-        if r[0] not in ("PAID", "RESERVED"):
-            raise Exception("Reservation must be RESERVED or PAID.")
-
-        cur.execute("SELECT item_id, qty FROM reservation_items WHERE reservation_id = %s", (reservation_id,))
-        lines = cur.fetchall() or []
-
-        for item_id, qty in lines:
-            cur.execute("""
-                SELECT stock_total, reserved_qty
-                FROM inventory_items
-                WHERE item_id = %s AND branch_id = %s
-                FOR UPDATE
-            """, (item_id, branch_id))
-            it = cur.fetchone()
-            if not it:
-                raise Exception("Item not found.")
-
-            stock_total, reserved_qty = int(it[0] or 0), int(it[1] or 0)
-
-            if qty > reserved_qty or qty > stock_total:
-                raise Exception("Stock mismatch.")
-
-            # ✅ FIX: include branch_id in WHERE to avoid updating other branches
-            cur.execute("""
-                UPDATE inventory_items
-                SET stock_total = stock_total - %s,
-                    reserved_qty = reserved_qty - %s
-                WHERE item_id = %s AND branch_id = %s
-            """, (qty, qty, item_id, branch_id))
-
-        cur.execute("""
-            UPDATE reservations
-            SET status = 'CLAIMED', claimed_at = NOW()
-            WHERE reservation_id = %s AND branch_id = %s
-        """, (reservation_id, branch_id))
-
+        results = BULK_ACTIONS[action](cur, branch_id, reservation_ids)
         conn.commit()
-
+        return results
     except Exception:
         try:
             conn.rollback()
@@ -771,68 +1013,103 @@ def cashier_mark_claimed(reservation_id):
                 pass
         conn.close()
 
-    return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
-
 
-@cashier_bp.route("/cashier/reservations/<int:reservation_id>/cancel", methods=["POST"])
-def cashier_cancel_reservation(reservation_id):
+def _change_one_reservation(action, reservation_id):
     if not _require_cashier():
         return redirect(url_for("auth.login"))
 
-    branch_id = session.get("branch_id")
-    if not is_branch_active(branch_id):
+    if not is_branch_active(session.get("branch_id")):
         flash("This branch is currently deactivated. Changes to reservations are not allowed.", "error")
         return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
-    conn = get_db_connection()
-    cur = None
-    try:
-        cur = conn.cursor()
 
-        cur.execute("""
-            SELECT status
-            FROM reservations
-            WHERE reservation_id = %s AND branch_id = %s
-            FOR UPDATE
-        """, (reservation_id, branch_id))
-        r = cur.fetchone()
-        if not r:
-            raise Exception("Reservation not found.")
-        if r[0] != "RESERVED":
-            raise Exception("Only RESERVED can be cancelled.")
-
-        cur.execute("SELECT item_id, qty FROM reservation_items WHERE reservation_id = %s", (reservation_id,))
-        lines = cur.fetchall() or []
-
-        for item_id, qty in lines:
-            cur.execute("""
-                UPDATE inventory_items
-                SET reserved_qty = GREATEST(reserved_qty - %s, 0)
-                WHERE item_id = %s AND branch_id = %s
-            """, (qty, item_id, branch_id))
+    error = _change_reservations(action, [reservation_id]).get(reservation_id)
+    if error:
+        flash(error, "error")
+    return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
 
-        cur.execute("""
-            UPDATE reservations
-            SET status = 'CANCELLED', cancelled_at = NOW()
-            WHERE reservation_id = %s AND branch_id = %s
-        """, (reservation_id, branch_id))
 
-        conn.commit()
+@cashier_bp.route("/cashier/reservations/<int:reservation_id>/mark-claimed", methods=["POST"])
+def cashier_mark_claimed(reservation_id):
+    return _change_one_reservation("claim", reservation_id)
 
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        raise
-    finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
-        conn.close()
 
-    return redirect(url_for("cashier.cashier_reservation_view", reservation_id=reservation_id))
+@cashier_bp.route("/cashier/reservations/<int:reservation_id>/cancel", methods=["POST"])
+def cashier_cancel_reservation(reservation_id):
+    return _change_one_reservation("cancel", reservation_id)
+
+
+def _bulk_ids(values):
+    """Reservation ids from form/JSON values (ints or comma/space separated strings)."""
+    ids = []
+    for value in values:
+        for part in re.split(r"[\s,]+", str(value)):
+            if part.isdigit():
+                ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+
+@cashier_bp.route("/cashier/reservations/bulk", methods=["POST"])
+def cashier_bulk_reservations():
+    """Claim or cancel the reservations ticked on the list page."""
+    if not _require_cashier():
+        return redirect(url_for("auth.login"))
+
+    back = url_for("cashier.cashier_reservations", status=request.form.get("status") or None,
+                   **{"from": request.form.get("from") or None, "to": request.form.get("to") or None})
+    action = request.form.get("action")
+    ids = _bulk_ids(request.form.getlist("reservation_id"))
+    if action not in BULK_ACTIONS or not ids:
+        flash("Select reservations and an action.", "error")
+        return redirect(back)
+    if len(ids) > BULK_RESERVATION_LIMIT:
+        flash(f"At most {BULK_RESERVATION_LIMIT} reservations at a time.", "error")
+        return redirect(back)
+    if not is_branch_active(session.get("branch_id")):
+        flash("This branch is currently deactivated. Changes to reservations are not allowed.", "error")
+        return redirect(back)
+
+    results = _change_reservations(action, ids)
+    done = [i for i, error in results.items() if error is None]
+    skipped = {i: error for i, error in results.items() if error is not None}
+    verb = "claimed" if action == "claim" else "cancelled"
+    if done:
+        flash(f"{len(done)} reservation(s) {verb}.", "success")
+    if skipped:
+        flash("Skipped " + "; ".join(f"#{i}: {error}" for i, error in sorted(skipped.items())), "error")
+    return redirect(back)
+
+
+@cashier_bp.route("/cashier/api/reservations/bulk", methods=["POST"])
+def api_bulk_reservations():
+    """
+    JSON {"action": "claim" | "cancel", "reservation_ids": [...]} ->
+    {"action", "done", "skipped", "results": [{"reservation_id", "ok", "error"}]}.
+    """
+    if not _require_cashier():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    action = payload.get("action")
+    raw = payload.get("reservation_ids") or []
+    ids = _bulk_ids(raw if isinstance(raw, list) else [raw])
+    if action not in BULK_ACTIONS or not ids:
+        return jsonify({"error": "bad_request", "message": "action (claim or cancel) and reservation_ids are required"}), 400
+    if len(ids) > BULK_RESERVATION_LIMIT:
+        return jsonify({"error": "too_many", "message": f"At most {BULK_RESERVATION_LIMIT} reservations at a time"}), 400
+    if not is_branch_active(session.get("branch_id")):
+        return jsonify({"error": "branch_inactive",
+                        "message": "This branch is currently deactivated. Changes to reservations are not allowed."}), 409
+
+    results = _change_reservations(action, ids)
+    return jsonify({
+        "action": action,
+        "done": sum(1 for error in results.values() if error is None),
+        "skipped": sum(1 for error in results.values() if error is not None),
+        "results": [
+            {"reservation_id": i, "ok": results[i] is None, "error": results[i]}
+            for i in ids
+        ],
+    })
 
 
 @cashier_bp.route("/cashier/reservations/<int:reservation_id>/receipt")
@@ -846,72 +1123,23 @@ def reservation_receipt(reservation_id):
     try:
         cur = conn.cursor()
 
-        cur.execute("""
-            SELECT
-                r.reservation_id,                       -- 0
-                COALESCE(u.username, '') AS username,   -- 1
-                r.student_grade_level,                  -- 2
-                r.status,                               -- 3
-                r.created_at,                           -- 4
-                r.claimed_at,                           -- 5
-                b.branch_name,                          -- 6
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN 'parent'
-                  ELSE 'student'
-                END AS reserved_by_role,                -- 7
-                CASE
-                  WHEN r.reserved_by_user_id IS NOT NULL
-                       AND reserved_by.role = 'parent'
-                  THEN COALESCE(svp.guardian_name, reserved_by.username)
-                  ELSE NULL
-                END AS parent_name,                     -- 8
-                svp.relationship,                       -- 9
-                COALESCE(e.student_name, svp.student_name, u.username, '') AS student_name -- 10
-            FROM reservations r
-            LEFT JOIN users u ON u.user_id = r.student_user_id
-            LEFT JOIN student_accounts sa ON sa.username = u.username
-            LEFT JOIN enrollments e ON e.enrollment_id = sa.enrollment_id
-            LEFT JOIN branches b ON b.branch_id = r.branch_id
-            LEFT JOIN users reserved_by ON reserved_by.user_id = r.reserved_by_user_id
-            LEFT JOIN LATERAL (
-                SELECT
-                    e2.student_name,
-                    e2.grade_level,
-                    e2.guardian_name,
-                    ps2.relationship
-                FROM parent_student ps2
-                JOIN enrollments e2 ON e2.enrollment_id = ps2.student_id
-                WHERE ps2.parent_id = r.reserved_by_user_id
-                ORDER BY ps2.student_id
-                LIMIT 1
-            ) svp ON (reserved_by.role = 'parent')
-            WHERE r.reservation_id = %s AND r.branch_id = %s
-            LIMIT 1
-        """, (reservation_id, branch_id))
-        header = cur.fetchone()
+        # reprint: one primary-key lookup decides whether the cached slip is current
+        current = reservations.version(cur, reservation_id, branch_id)
+        cached = reservations.cached_receipt(branch_id, reservation_id, current) if current else None
+        if cached is not None:
+            header, items = cached
+        else:
+            header, items, current = reservations.load(cur, reservation_id, branch_id)
 
-        if not header:
-            return render_template("template_missing.html", missing="Receipt not found"), 404
+            if not header:
+                return render_template("template_missing.html", missing="Receipt not found"), 404
 
-        # NOTE: status is header[3]
-        if header[3] != "CLAIMED":
-            return render_template("template_missing.html", missing="Receipt only for claimed"), 403
+            if header["status"] != "CLAIMED":
+                return render_template("template_missing.html", missing="Receipt only for claimed"), 403
 
-        cur.execute("""
-            SELECT ii.item_name, ri.qty,
-                   COALESCE(NULLIF(TRIM(ri.size_label), ''), ii.publisher, ii.size_label) AS display_label,
-                   ri.unit_price, ri.line_total, ii.category
-            FROM reservation_items ri
-            JOIN inventory_items ii ON ii.item_id = ri.item_id
-            WHERE ri.reservation_id = %s
-            ORDER BY ii.category, ii.item_name
-        """, (reservation_id,))
-        items = cur.fetchall() or []
-
-        total = sum(item[4] for item in items)
+            reservations.cache_receipt(branch_id, reservation_id, current, header, items)
 
+        total = sum(item["line_total"] for item in items)
         return render_template("reservation_receipt.html", header=header, items=items, total=total, now=datetime.now)
     finally:
         if cur:
@@ -920,7 +1148,7 @@ def reservation_receipt(reservation_id):
             except Exception:
                 pass
         conn.close()
-        
+
 @cashier_bp.after_request
 def add_no_cache_headers(response):
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, private"
@@ -0,0 +1,26 @@
+from flask import Blueprint, render_template, request, abort, current_app, redirect, url_for
+import querylog
+from queries import query_stats
+
+debug_bp = Blueprint("debug", __name__)
+
+
+# =======================
+# DEV ONLY: QUERY COUNTS PER ENDPOINT
+# =======================
+@debug_bp.route("/_debug/queries", methods=["GET", "POST"])
+def debug_queries():
+    if not querylog.debug_enabled(current_app):
+        abort(404)
+
+    if request.method == "POST":
+        querylog.reset_stats()
+        return redirect(url_for("debug.debug_queries"))
+
+    statements = sorted(query_stats().items(), key=lambda kv: -kv[1]["total_ms"])
+    return render_template(
+        "debug_queries.html",
+        endpoints=querylog.endpoint_stats(),
+        statements=statements,
+        threshold=querylog.N_PLUS_ONE_THRESHOLD,
+    )
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, url_for, jsonify
 from db import get_db_connection
+import timeouts
 import psycopg2.extras
 
 librarian_bp = Blueprint("librarian", __name__)
@@ -535,6 +536,9 @@ def releases():
         """, (branch_id,))
         releases_rows = cur.fetchall() or []
 
+    except timeouts.ERRORS:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         flash(f"Error: {e}", "error")
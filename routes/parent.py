@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, url_for
-from db import get_db_connection
+from db import get_db_connection, get_read_connection
+from queries import register, run
 from werkzeug.security import generate_password_hash
 import logging
 import psycopg2.extras
@@ -14,6 +15,22 @@ def _require_parent():
     return session.get("role") == "parent"
 
 
+# The page every parent lands on after login.
+register("parent.children", """
+    SELECT ps.id, ps.parent_id, ps.student_id, ps.relationship, ps.created_at,
+           e.student_name, e.grade_level, e.status,
+           br.branch_name, br.location,
+           b.bill_id, b.total_amount, b.amount_paid, b.balance, b.status as bill_status,
+           e.enrollment_id
+    FROM parent_student ps
+    JOIN enrollments e ON ps.student_id = e.enrollment_id
+    JOIN branches br ON e.branch_id = br.branch_id
+    LEFT JOIN billing b ON e.enrollment_id = b.enrollment_id
+    WHERE ps.parent_id = %s
+    ORDER BY e.created_at DESC
+""")
+
+
 @parent_bp.route("/parent/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -78,22 +95,11 @@ def dashboard():
     if not _require_parent():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        cursor.execute("""
-            SELECT ps.*, e.student_name, e.grade_level, e.status,
-                   br.branch_name, br.location,
-                   b.bill_id, b.total_amount, b.amount_paid, b.balance, b.status as bill_status,
-                   e.enrollment_id
-            FROM parent_student ps
-            JOIN enrollments e ON ps.student_id = e.enrollment_id
-            JOIN branches br ON e.branch_id = br.branch_id
-            LEFT JOIN billing b ON e.enrollment_id = b.enrollment_id
-            WHERE ps.parent_id = %s
-            ORDER BY e.created_at DESC
-        """, (session.get("user_id"),))
+        run(cursor, "parent.children", (session.get("user_id"),))
 
         children = cursor.fetchall()
         return render_template("parent_dashboard.html", children=children)
@@ -165,7 +171,7 @@ def child_detail(enrollment_id):
     if not _require_parent():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
@@ -209,7 +215,7 @@ def child_bills(enrollment_id):
     if not _require_parent():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
@@ -1,30 +1,42 @@
 from flask import Blueprint, render_template, jsonify, session
-from db import get_db_connection
-import psycopg2.extras
+from queries import register, query_all, query_one
+import timeouts
 
 public_bp = Blueprint("public", __name__)
 
-def query_all(sql, params=None):
-    """Helper: return list of rows (RealDictCursor)"""
-    db = get_db_connection()
-    cur = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    try:
-        cur.execute(sql, params or ())
-        return cur.fetchall()
-    finally:
-        cur.close()
-        db.close()
-
-def query_one(sql, params=None):
-    """Helper: return single row (RealDictCursor)"""
-    db = get_db_connection()
-    cur = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    try:
-        cur.execute(sql, params or ())
-        return cur.fetchone()
-    finally:
-        cur.close()
-        db.close()
+register("public.active_announcements", """
+    SELECT announcement_id AS id, title, message, created_at, image_url
+    FROM announcements
+    WHERE is_active = TRUE
+    ORDER BY created_at DESC
+""")
+
+register("public.active_branches", """
+    SELECT branch_id, branch_name, location
+    FROM branches
+    WHERE is_active = TRUE
+    ORDER BY branch_name ASC
+""")
+
+register("public.branch", """
+    SELECT branch_id, branch_name, location
+    FROM branches
+    WHERE branch_id = %s AND is_active = TRUE
+""")
+
+register("public.branch_faqs", """
+    SELECT question, answer
+    FROM chatbot_faqs
+    WHERE branch_id = %s
+    ORDER BY id ASC
+""")
+
+register("public.general_faqs", """
+    SELECT question, answer
+    FROM chatbot_faqs
+    WHERE branch_id IS NULL
+    ORDER BY id ASC
+""")
 
 
 # =========================
@@ -32,19 +44,8 @@ def query_one(sql, params=None):
 # =========================
 @public_bp.route("/")
 def homepage():
-    announcements = query_all("""
-        SELECT announcement_id AS id, title, message, created_at, image_url
-        FROM announcements
-        WHERE is_active = TRUE
-        ORDER BY created_at DESC
-    """)
-
-    branches = query_all("""
-        SELECT branch_id, branch_name, location
-        FROM branches
-        WHERE is_active = TRUE
-        ORDER BY branch_name ASC
-    """)
+    announcements = query_all("public.active_announcements", read=True)
+    branches = query_all("public.active_branches", read=True)
 
     return render_template(
         "homepage.html",
@@ -55,11 +56,7 @@ def homepage():
 
 @public_bp.route("/branch/<int:branch_id>")
 def branch_page(branch_id):
-    branch = query_one("""
-        SELECT branch_id, branch_name, location
-        FROM branches
-        WHERE branch_id = %s AND is_active = TRUE
-    """, (branch_id,))
+    branch = query_one("public.branch", (branch_id,), read=True)
 
     if not branch:
         return "Branch not found", 404
@@ -75,32 +72,18 @@ def api_faqs():
     role = session.get("role")
     branch_id = session.get("branch_id")
 
-    db = get_db_connection()
-    cur = db.cursor()
     try:
         # Logged in users: branch FAQs ONLY
         if role and branch_id:
-            cur.execute("""
-                SELECT question, answer
-                FROM chatbot_faqs
-                WHERE branch_id = %s
-                ORDER BY id ASC
-            """, (branch_id,))
+            rows = query_all("public.branch_faqs", (branch_id,), cursor_factory=None, read=True)
         else:
             # Public (not logged in): general FAQs ONLY
-            cur.execute("""
-                SELECT question, answer
-                FROM chatbot_faqs
-                WHERE branch_id IS NULL
-                ORDER BY id ASC
-            """)
+            rows = query_all("public.general_faqs", cursor_factory=None, read=True)
 
-        rows = cur.fetchall() or []
-        return jsonify([{"question": r[0], "answer": r[1]} for r in rows])
+        return jsonify([{"question": r[0], "answer": r[1]} for r in rows or []])
 
+    except timeouts.ERRORS:
+        raise
     except Exception:
         # wag app.logger dito kasi blueprint file; safe return empty
         return jsonify([]), 200
-    finally:
-        cur.close()
-        db.close()
@@ -1,11 +1,14 @@
 from flask import Blueprint, render_template, session, redirect, request, flash
-from db import get_db_connection
+from db import get_db_connection, get_read_connection
+from queries import register, run
 from werkzeug.security import generate_password_hash
 import secrets
 import string
 import logging
 import psycopg2.extras
 import re
+import previews
+import timeouts
 
 # Setup logging
 logging.basicConfig(level=logging.ERROR)
@@ -13,6 +16,39 @@ logger = logging.getLogger(__name__)
 
 registrar_bp = Blueprint("registrar", __name__)
 
+# Dashboard statements. The per-enrollment lookups run once per row of the
+# list, so they are prepared once per connection instead of parsed each time.
+register("registrar.enrollments", """
+    SELECT enrollment_id, student_name, grade_level, branch_id, status, created_at, user_id,
+           gender, dob, address, contact_number, guardian_name, guardian_contact,
+           previous_school, branch_enrollment_no,
+           COALESCE(branch_enrollment_no, enrollment_id) AS display_no
+    FROM enrollments
+    WHERE branch_id=%s
+    ORDER BY branch_enrollment_no ASC NULLS LAST, created_at DESC
+""")
+
+register("registrar.documents", """
+    SELECT d.doc_id, d.enrollment_id, d.file_name, d.file_path, d.uploaded_at, d.doc_type,
+           d.blob_id, b.preview_state
+    FROM enrollment_documents d
+    LEFT JOIN document_blobs b ON b.blob_id = d.blob_id
+    WHERE d.enrollment_id=%s
+""")
+
+register("registrar.has_student_account", """
+    SELECT 1
+    FROM student_accounts
+    WHERE enrollment_id=%s
+""")
+
+register("registrar.parent_link", """
+    SELECT ps.id, ps.parent_id, ps.student_id, ps.relationship, ps.created_at, u.username
+    FROM parent_student ps
+    JOIN users u ON ps.parent_id = u.user_id
+    WHERE ps.student_id = %s
+""")
+
 def generate_password(length=8):
     """Generate a cryptographically secure random password"""
     characters = string.ascii_letters + string.digits
@@ -41,7 +77,8 @@ def registrar_dashboard():
         flash("Missing branch in session. Please login again.", "error")
         return redirect("/logout")
 
-    db = get_db_connection()
+    # the POST branch writes; plain page views can read from the replica
+    db = get_db_connection() if request.method == "POST" else get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
@@ -60,9 +97,9 @@ def registrar_dashboard():
 
             cursor.execute("""
                 UPDATE enrollments
-                SET status=%s
+                SET status=%s, rejected_at = CASE WHEN %s = 'rejected' THEN NOW() END
                 WHERE enrollment_id=%s AND branch_id=%s
-            """, (action, enrollment_id, branch_id))
+            """, (action, action, enrollment_id, branch_id))
 
             if cursor.rowcount == 0:
                 db.rollback()
@@ -85,13 +122,7 @@ def registrar_dashboard():
                 flash(f"Enrollment #{display_no} rejected", "warning")
 
         # Fetch enrollments for this branch ordered by per-branch number
-        cursor.execute("""
-            SELECT *,
-                   COALESCE(branch_enrollment_no, enrollment_id) AS display_no
-            FROM enrollments
-            WHERE branch_id=%s
-            ORDER BY branch_enrollment_no ASC NULLS LAST, created_at DESC
-        """, (branch_id,))
+        run(cursor, "registrar.enrollments", (branch_id,))
         enrollments = cursor.fetchall()
 
         # Attach documents + flags
@@ -99,28 +130,17 @@ def registrar_dashboard():
             eid = enrollment["enrollment_id"]
 
             # Documents (NO ORDER BY - safe)
-            cursor.execute("""
-                SELECT *
-                FROM enrollment_documents
-                WHERE enrollment_id=%s
-            """, (eid,))
+            run(cursor, "registrar.documents", (eid,))
             enrollment["documents"] = cursor.fetchall()
+            for doc in enrollment["documents"]:
+                doc["preview_url"] = previews.url(doc["file_path"]) if doc["preview_state"] == "ready" else None
 
             # Student account exists?
-            cursor.execute("""
-                SELECT 1
-                FROM student_accounts
-                WHERE enrollment_id=%s
-            """, (eid,))
+            run(cursor, "registrar.has_student_account", (eid,))
             enrollment["has_student_account"] = cursor.fetchone() is not None
 
             # Parent link exists? (student_id refers to enrollment_id in your current schema)
-            cursor.execute("""
-                SELECT ps.*, u.username
-                FROM parent_student ps
-                JOIN users u ON ps.parent_id = u.user_id
-                WHERE ps.student_id = %s
-            """, (eid,))
+            run(cursor, "registrar.parent_link", (eid,))
             parent_link = cursor.fetchone()
             enrollment["has_parent_account"] = parent_link is not None
             enrollment["parent_username"] = parent_link["username"] if parent_link else None
@@ -129,6 +149,9 @@ def registrar_dashboard():
         return render_template("registrar_dashboard.html", enrollments=enrollments,
                               new_account_info=new_account_info)
 
+    except timeouts.ERRORS:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Registrar dashboard error: {str(e)}")
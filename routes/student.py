@@ -1,9 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-import uuid
 import psycopg2.extras
 from db import get_db_connection, is_branch_active
+from queries import register, run
+import reservations
+import enrollments
+import uploads
+import blobs
+import previews
+import timeouts
 
 student_bp = Blueprint("student", __name__)
 
@@ -11,18 +17,22 @@ UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 ALLOWED_EXTENSIONS = {"pdf", "jpg", "jpeg", "png"}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def save_doc_file(cursor, enrollment_id, fileobj, doc_type):
-    if fileobj and fileobj.filename and allowed_file(fileobj.filename):
-        original = secure_filename(fileobj.filename)
-        ext = original.rsplit(".", 1)[1].lower()
-        unique_name = f"{uuid.uuid4().hex}.{ext}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_name)
-        fileobj.save(file_path)
-        url_path = f"/uploads/{unique_name}"
+# (form field, doc_type) of the requirement uploads on the enrollment form
+DOC_FIELDS = [
+    ("psa_birth_cert", "PSA Birth Certificate"),
+    ("baptismal_cert", "Baptismal Certificate"),
+    ("form_138",       "Form 138"),
+    ("good_moral",     "Good Moral Certificate"),
+    ("form_137",       "Form 137"),
+]
+
+def save_doc_file(cursor, enrollment_id, doc, blob_id, doc_type):
+    """Record a staged upload (blobs.Batch.add); the file is published at commit."""
+    if doc is not None:
         cursor.execute("""
-            INSERT INTO enrollment_documents (enrollment_id, file_name, file_path, doc_type)
-            VALUES (%s, %s, %s, %s)
-        """, (enrollment_id, original, url_path, doc_type))
+            INSERT INTO enrollment_documents (enrollment_id, file_name, file_path, doc_type, blob_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (enrollment_id, doc.original, doc.url, doc_type, blob_id))
 
 # =======================
 # GRADE RANGE MAPPINGS
@@ -126,23 +136,31 @@ def enroll(branch_id):
             if not is_branch_active(branch_id):
                 flash("This branch is currently deactivated. New enrollments are not allowed.", "error")
                 return redirect(url_for("public.homepage"))
-            student_name = request.form.get("student_name", "").strip()
-            grade_level = request.form.get("grade_level", "").strip()
-            gender = request.form.get("gender", "").strip()
-            dob = request.form.get("dob", "").strip()
-            address = request.form.get("address", "").strip()
-            contact_number = request.form.get("contact_number", "").strip()
-            guardian_name = request.form.get("guardian_name", "").strip()
-            guardian_contact = request.form.get("guardian_contact", "").strip()
-            previous_school = request.form.get("previous_school", "").strip()
-
-            # Calculate per-branch enrollment number
-            cursor.execute("""
-                SELECT COALESCE(MAX(branch_enrollment_no), 0) + 1 AS next_no
-                FROM enrollments
-                WHERE branch_id = %s
-            """, (branch_id,))
-            next_no = cursor.fetchone()["next_no"]
+            try:
+                form, files = request.form, request.files
+            except RequestEntityTooLarge:
+                return render_template(
+                    "student_enroll.html", branch=branch,
+                    message=f"Uploads are too large: each file may be at most {uploads.MAX_FILE_SIZE // uploads.MB} MB "
+                            f"and all files together at most {uploads.MAX_REQUEST_SIZE // uploads.MB} MB.",
+                ), 413
+            student_name = form.get("student_name", "").strip()
+            grade_level = form.get("grade_level", "").strip()
+            gender = form.get("gender", "").strip()
+            dob = form.get("dob", "").strip()
+            address = form.get("address", "").strip()
+            contact_number = form.get("contact_number", "").strip()
+            guardian_name = form.get("guardian_name", "").strip()
+            guardian_contact = form.get("guardian_contact", "").strip()
+            previous_school = form.get("previous_school", "").strip()
+
+            # --- Requirements: already streamed to disk; fsync them before the transaction ---
+            batch = blobs.Batch(UPLOAD_FOLDER)
+            docs = [(batch.add(files.get(field), ALLOWED_EXTENSIONS), doc_type) for field, doc_type in DOC_FIELDS]
+            batch.flush()
+
+            # Per-branch enrollment number; the counter row stays locked until the commit
+            next_no = enrollments.next_number(cursor, branch_id)
 
             cursor.execute("""
                 INSERT INTO enrollments
@@ -158,21 +176,19 @@ def enroll(branch_id):
             ))
 
             enrollment_id = cursor.fetchone()["enrollment_id"]
-            db.commit()
+            blob_ids = batch.attach(cursor)
+            for doc, doc_type in docs:
+                save_doc_file(cursor, enrollment_id, doc, blob_ids.get(id(doc)), doc_type)
 
-            # --- Handle Requirements File Uploads ---
-            psa_file        = request.files.get("psa_birth_cert")
-            baptismal_file  = request.files.get("baptismal_cert")
-            form138_file    = request.files.get("form_138")
-            good_moral_file = request.files.get("good_moral")
-            form137_file    = request.files.get("form_137")
-
-            save_doc_file(cursor, enrollment_id, psa_file,        'PSA Birth Certificate')
-            save_doc_file(cursor, enrollment_id, baptismal_file,  'Baptismal Certificate')
-            save_doc_file(cursor, enrollment_id, form138_file,    'Form 138')
-            save_doc_file(cursor, enrollment_id, good_moral_file, 'Good Moral Certificate')
-            save_doc_file(cursor, enrollment_id, form137_file,    'Form 137')
-            db.commit()
+            # enrollment, documents and files land together or not at all
+            batch.publish()
+            try:
+                db.commit()
+            except Exception:
+                batch.discard()
+                raise
+            if batch.items:
+                previews.notify(UPLOAD_FOLDER)
 
             # Submit agad: redirect to success page so process can be tracked (no books/uniform steps)
             return redirect(url_for("student.enrollment_success", branch_id=branch_id, enrollment_id=enrollment_id))
@@ -291,7 +307,8 @@ def enroll_summary(branch_id, enrollment_id):
         uniforms = cursor.fetchall()
 
         if request.method == "POST":
-            cursor.execute("UPDATE enrollments SET status='pending' WHERE enrollment_id=%s", (enrollment_id,))
+            cursor.execute("UPDATE enrollments SET status='pending', rejected_at=NULL WHERE enrollment_id=%s",
+                           (enrollment_id,))
             db.commit()
 
             # Use branch_enrollment_no (per-branch #1, #2...) for display
@@ -316,6 +333,28 @@ def enroll_summary(branch_id, enrollment_id):
         db.close()
 
 
+register("student.track_enrollment", """
+    SELECT e.enrollment_id, e.student_name, e.grade_level, e.branch_id, e.status, e.created_at,
+           e.user_id, e.gender, e.dob, e.address, e.contact_number, e.guardian_name,
+           e.guardian_contact, e.previous_school, e.branch_enrollment_no, b.branch_name
+    FROM enrollments e
+    JOIN branches b ON e.branch_id = b.branch_id
+    WHERE e.enrollment_id = %s
+""")
+register("student.track_documents", """
+    SELECT doc_id, enrollment_id, file_name, file_path, uploaded_at, doc_type, blob_id
+    FROM enrollment_documents WHERE enrollment_id=%s
+""")
+register("student.track_books", """
+    SELECT book_id, enrollment_id, book_name, quantity, created_at
+    FROM enrollment_books WHERE enrollment_id=%s
+""")
+register("student.track_uniforms", """
+    SELECT uniform_id, enrollment_id, uniform_type, size, quantity, created_at
+    FROM enrollment_uniforms WHERE enrollment_id=%s
+""")
+
+
 @student_bp.route("/track", methods=["GET", "POST"])
 def track_enrollment():
     enrollment = None
@@ -333,22 +372,17 @@ def track_enrollment():
             cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
             try:
-                cursor.execute("""
-                    SELECT e.*, b.branch_name
-                    FROM enrollments e
-                    JOIN branches b ON e.branch_id = b.branch_id
-                    WHERE e.enrollment_id = %s
-                """, (enrollment_id_int,))
+                run(cursor, "student.track_enrollment", (enrollment_id_int,))
                 enrollment = cursor.fetchone()
 
                 if enrollment:
-                    cursor.execute("SELECT * FROM enrollment_documents WHERE enrollment_id=%s", (enrollment_id_int,))
+                    run(cursor, "student.track_documents", (enrollment_id_int,))
                     documents = cursor.fetchall()
 
-                    cursor.execute("SELECT * FROM enrollment_books WHERE enrollment_id=%s", (enrollment_id_int,))
+                    run(cursor, "student.track_books", (enrollment_id_int,))
                     books = cursor.fetchall()
 
-                    cursor.execute("SELECT * FROM enrollment_uniforms WHERE enrollment_id=%s", (enrollment_id_int,))
+                    run(cursor, "student.track_uniforms", (enrollment_id_int,))
                     uniforms = cursor.fetchall()
 
             finally:
@@ -529,13 +563,15 @@ def student_reservation():
             try:
                 # parent submit -> student_user_id stays NULL
                 cursor_tx.execute("""
-                    INSERT INTO reservations (student_user_id, branch_id, student_grade_level, status, reserved_by_user_id)
-                    VALUES (%s, %s, %s, 'RESERVED', %s)
+                    INSERT INTO reservations (student_user_id, branch_id, student_grade_level, status,
+                                              reserved_by_user_id, enrollment_id)
+                    VALUES (%s, %s, %s, 'RESERVED', %s, %s)
                     RETURNING reservation_id
-                """, (student_user_id, branch_id, student_grade, reserved_by_user_id))
+                """, (student_user_id, branch_id, student_grade, reserved_by_user_id, enrollment_id))
                 reservation_id = cursor_tx.fetchone()['reservation_id']
 
-                for sel in selected:
+                # lock inventory rows in item id order, as the cashier's claim/cancel do
+                for sel in sorted(selected, key=lambda sel: sel["item_id"]):
                     item_id = sel["item_id"]
                     qty = sel["qty"]
                     size = sel["size"]
@@ -569,9 +605,14 @@ def student_reservation():
                         VALUES (%s, %s, %s, %s, %s, %s)
                     """, (reservation_id, item_id, qty, stored_size, unit_price, line_total))
 
+                # names and totals the cashier list reads (reservations.py)
+                reservations.refresh(cursor_tx, reservation_id)
                 db_tx.commit()
                 return redirect(url_for("student.student_reservation_success", reservation_id=reservation_id))
 
+            except timeouts.ERRORS:
+                db_tx.rollback()
+                raise
             except Exception as e:
                 db_tx.rollback()
                 error = str(e)
@@ -579,6 +620,8 @@ def student_reservation():
                 cursor_tx.close()
                 db_tx.close()
 
+    except timeouts.ERRORS:
+        raise
     except Exception as e:
         error = str(e)
     finally:
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, url_for
-from db import get_db_connection
+from db import get_db_connection, get_read_connection
+from queries import register, run
 from werkzeug.security import generate_password_hash
 import logging
 import psycopg2.extras
@@ -14,6 +15,57 @@ def _require_student():
     return session.get("role") == "student"
 
 
+# Dashboard statements: the page every student lands on after login.
+register("student_portal.account", """
+    SELECT sa.account_id, sa.enrollment_id, sa.username, sa.email,
+           e.student_name, e.grade_level, e.status, e.branch_id,
+           e.branch_enrollment_no,
+           br.branch_name, br.location
+    FROM student_accounts sa
+    JOIN enrollments e ON sa.enrollment_id = e.enrollment_id
+    JOIN branches br ON e.branch_id = br.branch_id
+    WHERE sa.account_id = %s
+""")
+
+register("student_portal.enrollment", """
+    SELECT NULL AS account_id, e.enrollment_id,
+           e.branch_enrollment_no,
+           u.username, NULL AS email,
+           e.student_name, e.grade_level, e.status, e.branch_id,
+           br.branch_name, br.location
+    FROM enrollments e
+    JOIN branches br ON e.branch_id = br.branch_id
+    JOIN users u ON u.enrollment_id = e.enrollment_id
+    WHERE e.enrollment_id = %s
+""")
+
+register("student_portal.bill", """
+    SELECT bill_id, enrollment_id, branch_id, tuition_fee, books_fee, uniform_fee, other_fees,
+           total_amount, amount_paid, balance, status, created_by, created_at, updated_at
+    FROM billing WHERE enrollment_id=%s
+""")
+
+register("student_portal.counts", """
+    SELECT (SELECT COUNT(*) FROM enrollment_documents WHERE enrollment_id = %(eid)s) AS doc_count,
+           (SELECT COUNT(*) FROM enrollment_books WHERE enrollment_id = %(eid)s) AS book_count,
+           (SELECT COUNT(*) FROM enrollment_uniforms WHERE enrollment_id = %(eid)s) AS uniform_count
+""")
+
+register("student_portal.announcements", """
+    SELECT a.title, a.body, a.created_at,
+           u.username AS posted_by, u.full_name, u.gender
+    FROM teacher_announcements a
+    JOIN users u ON u.user_id = a.teacher_user_id
+    WHERE a.branch_id = %(branch_id)s
+      AND (
+          a.grade_level ILIKE %(grade_full)s
+          OR a.grade_level ILIKE %(grade_short)s
+      )
+    ORDER BY a.created_at DESC
+    LIMIT 20
+""")
+
+
 @student_portal_bp.route("/student/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -104,7 +156,7 @@ def dashboard():
     if not _require_student():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
@@ -113,29 +165,10 @@ def dashboard():
 
         if account_id:
             # Path A: logged in via student_accounts table
-            cursor.execute("""
-                SELECT sa.account_id, sa.enrollment_id, sa.username, sa.email,
-                       e.student_name, e.grade_level, e.status, e.branch_id,
-                       e.branch_enrollment_no,
-                       br.branch_name, br.location
-                FROM student_accounts sa
-                JOIN enrollments e ON sa.enrollment_id = e.enrollment_id
-                JOIN branches br ON e.branch_id = br.branch_id
-                WHERE sa.account_id = %s
-            """, (account_id,))
+            run(cursor, "student_portal.account", (account_id,))
         elif enrollment_id:
             # Path B: logged in via users table with enrollment_id
-            cursor.execute("""
-                SELECT NULL AS account_id, e.enrollment_id,
-                       e.branch_enrollment_no,
-                       u.username, NULL AS email,
-                       e.student_name, e.grade_level, e.status, e.branch_id,
-                       br.branch_name, br.location
-                FROM enrollments e
-                JOIN branches br ON e.branch_id = br.branch_id
-                JOIN users u ON u.enrollment_id = e.enrollment_id
-                WHERE e.enrollment_id = %s
-            """, (enrollment_id,))
+            run(cursor, "student_portal.enrollment", (enrollment_id,))
         else:
             flash("Session expired or student account not found. Please log in again.", "error")
             return redirect("/")
@@ -147,30 +180,15 @@ def dashboard():
             return redirect("/")
 
         # Billing info
-        cursor.execute("SELECT * FROM billing WHERE enrollment_id=%s", (student["enrollment_id"],))
+        run(cursor, "student_portal.bill", (student["enrollment_id"],))
         bill = cursor.fetchone()
 
-        # Counts (use COALESCE for safety)
-        cursor.execute("""
-            SELECT COUNT(*) AS doc_count
-            FROM enrollment_documents
-            WHERE enrollment_id=%s
-        """, (student["enrollment_id"],))
-        doc_count = (cursor.fetchone() or {}).get("doc_count", 0)
-
-        cursor.execute("""
-            SELECT COUNT(*) AS book_count
-            FROM enrollment_books
-            WHERE enrollment_id=%s
-        """, (student["enrollment_id"],))
-        book_count = (cursor.fetchone() or {}).get("book_count", 0)
-
-        cursor.execute("""
-            SELECT COUNT(*) AS uniform_count
-            FROM enrollment_uniforms
-            WHERE enrollment_id=%s
-        """, (student["enrollment_id"],))
-        uniform_count = (cursor.fetchone() or {}).get("uniform_count", 0)
+        # Counts
+        run(cursor, "student_portal.counts", {"eid": student["enrollment_id"]})
+        counts = cursor.fetchone()
+        doc_count = counts["doc_count"]
+        book_count = counts["book_count"]
+        uniform_count = counts["uniform_count"]
 
         # Teacher announcements — match both "7" and "Grade 7" formats
         raw_grade = student.get("grade_level") or ""
@@ -185,19 +203,7 @@ def dashboard():
             _m2 = _re.match(r'^Grade\s+(\d+)$', grade_full, _re.IGNORECASE)
             grade_short = _m2.group(1) if _m2 else grade_full
 
-        cursor.execute("""
-            SELECT a.title, a.body, a.created_at,
-                   u.username AS posted_by, u.full_name, u.gender
-            FROM teacher_announcements a
-            JOIN users u ON u.user_id = a.teacher_user_id
-            WHERE a.branch_id = %(branch_id)s
-              AND (
-                  a.grade_level ILIKE %(grade_full)s
-                  OR a.grade_level ILIKE %(grade_short)s
-              )
-            ORDER BY a.created_at DESC
-            LIMIT 20
-        """, {
+        run(cursor, "student_portal.announcements", {
             "branch_id":   student.get("branch_id"),
             "grade_full":  grade_full,
             "grade_short": grade_short,
@@ -232,7 +238,7 @@ def enrollment_status():
     if not _require_student():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
@@ -276,7 +282,7 @@ def billing():
     if not _require_student():
         return redirect("/")
 
-    db = get_db_connection()
+    db = get_read_connection()
     cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
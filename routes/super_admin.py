@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, request, session, redirect, flash, url_for
-from db import get_db_connection
+from db import get_db_connection, notify_branch_changed
 from werkzeug.security import generate_password_hash
 import psycopg2.extras
 import secrets
@@ -120,6 +120,45 @@ def super_admin_dashboard():
         db.close()
 
 
+@super_admin_bp.route("/super-admin/branches/<int:branch_id>/toggle", methods=["POST"])
+def branch_toggle(branch_id):
+    if session.get("role") != "super_admin":
+        return redirect(url_for("auth.login"))
+
+    db = get_db_connection()
+    cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        cursor.execute("""
+            UPDATE branches
+            SET is_active = NOT is_active,
+                status = CASE WHEN is_active THEN 'inactive' ELSE 'active' END
+            WHERE branch_id = %s
+            RETURNING branch_name, is_active
+        """, (branch_id,))
+        row = cursor.fetchone()
+        if not row:
+            db.rollback()
+            flash("Branch not found.", "error")
+            return redirect(url_for("super_admin.super_admin_dashboard"))
+
+        # every worker drops its cached status once this commits
+        notify_branch_changed(cursor, branch_id)
+        db.commit()
+
+        state = "activated" if row["is_active"] else "deactivated"
+        flash(f"{row['branch_name']} {state}.", "success")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Branch toggle failed: {str(e)}")
+        flash("Failed to update branch status.", "error")
+    finally:
+        cursor.close()
+        db.close()
+
+    return redirect(url_for("super_admin.super_admin_dashboard"))
+
+
 # =======================
 # SUPER ADMIN: FAQ MANAGEMENT (GENERAL FAQs = branch_id IS NULL)
 # =======================
@@ -1,6 +1,7 @@
 import re as _re
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
 from db import get_db_connection
+from queries import register, run
 import psycopg2.extras
 
 teacher_bp = Blueprint("teacher", __name__)
@@ -18,6 +19,59 @@ def _require_teacher():
     return session.get("role") == "teacher"
 
 
+# Dashboard statements: the page every teacher lands on after login.
+register("teacher.grade", "SELECT grade_level FROM users WHERE user_id = %s")
+
+register("teacher.students", """
+    SELECT
+        e.enrollment_id,
+        e.student_name,
+        e.grade_level,
+        e.status            AS enrollment_status,
+
+        COALESCE((
+            SELECT CASE
+                WHEN SUM(b.total_amount - COALESCE(b.amount_paid,0)) <= 0
+                THEN 'CLEARED' ELSE 'PENDING'
+            END
+            FROM billing b
+            WHERE b.enrollment_id = e.enrollment_id
+        ), 'NO_BILL') AS billing_status,
+
+        COALESCE((
+            SELECT UPPER(r.status)
+            FROM reservations r
+            WHERE r.enrollment_id = e.enrollment_id
+              AND r.branch_id = %(branch_id)s
+            ORDER BY r.created_at DESC
+            LIMIT 1
+        ), 'NONE') AS reservation_status
+
+    FROM enrollments e
+    WHERE e.branch_id = %(branch_id)s
+      AND (
+          e.grade_level ILIKE %(grade_full)s
+          OR e.grade_level ILIKE %(grade_short)s
+      )
+      AND e.status = 'approved'
+    ORDER BY e.student_name ASC
+""")
+
+register("teacher.announcements", """
+    SELECT a.announcement_id, a.title, a.body,
+           a.created_at, u.username AS posted_by,
+           u.full_name, u.gender
+    FROM teacher_announcements a
+    JOIN users u ON u.user_id = a.teacher_user_id
+    WHERE a.branch_id   = %(branch_id)s
+      AND (
+          a.grade_level ILIKE %(grade_full)s
+          OR a.grade_level ILIKE %(grade_short)s
+      )
+    ORDER BY a.created_at DESC
+""")
+
+
 def _normalize_grade(grade_str):
     """Accept both '7' and 'Grade 7' — returns (grade_full, grade_short)."""
     m = _re.match(r'^Grade\s+(\d+)$', grade_str, _re.IGNORECASE)
@@ -63,7 +117,7 @@ def teacher_dashboard():
     db = get_db_connection()
     cur = db.cursor()
     try:
-        cur.execute("SELECT grade_level FROM users WHERE user_id = %s", (user_id,))
+        run(cur, "teacher.grade", (user_id,))
         row = cur.fetchone()
         teacher_grade = (row[0] or "").strip() if row else ""
     finally:
@@ -84,40 +138,7 @@ def teacher_dashboard():
         cur = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         try:
             # ── Students ──
-            cur.execute("""
-                SELECT
-                    e.enrollment_id,
-                    e.student_name,
-                    e.grade_level,
-                    e.status            AS enrollment_status,
-
-                    COALESCE((
-                        SELECT CASE
-                            WHEN SUM(b.total_amount - COALESCE(b.amount_paid,0)) <= 0
-                            THEN 'CLEARED' ELSE 'PENDING'
-                        END
-                        FROM billing b
-                        WHERE b.enrollment_id = e.enrollment_id
-                    ), 'NO_BILL') AS billing_status,
-
-                    COALESCE((
-                        SELECT UPPER(r.status)
-                        FROM reservations r
-                        WHERE r.enrollment_id = e.enrollment_id
-                          AND r.branch_id = %(branch_id)s
-                        ORDER BY r.created_at DESC
-                        LIMIT 1
-                    ), 'NONE') AS reservation_status
-
-                FROM enrollments e
-                WHERE e.branch_id = %(branch_id)s
-                  AND (
-                      e.grade_level ILIKE %(grade_full)s
-                      OR e.grade_level ILIKE %(grade_short)s
-                  )
-                  AND e.status = 'approved'
-                ORDER BY e.student_name ASC
-            """, {
+            run(cur, "teacher.students", {
                 "branch_id":   branch_id,
                 "grade_full":  grade_full,
                 "grade_short": grade_short,
@@ -141,19 +162,7 @@ def teacher_dashboard():
                     stats["no_reservation"] += 1
 
             # ── Announcements for this grade ──
-            cur.execute("""
-                SELECT a.announcement_id, a.title, a.body,
-                       a.created_at, u.username AS posted_by,
-                       u.full_name, u.gender
-                FROM teacher_announcements a
-                JOIN users u ON u.user_id = a.teacher_user_id
-                WHERE a.branch_id   = %(branch_id)s
-                  AND (
-                      a.grade_level ILIKE %(grade_full)s
-                      OR a.grade_level ILIKE %(grade_short)s
-                  )
-                ORDER BY a.created_at DESC
-            """, {
+            run(cur, "teacher.announcements", {
                 "branch_id":   branch_id,
                 "grade_full":  grade_full,
                 "grade_short": grade_short,
@@ -205,7 +214,7 @@ def teacher_set_grade():
     cur = db.cursor()
     try:
         # Check if branch admin already assigned a grade — if so, block the change
-        cur.execute("SELECT grade_level FROM users WHERE user_id = %s", (user_id,))
+        run(cur, "teacher.grade", (user_id,))
         row = cur.fetchone()
         existing_grade = (row[0] or "").strip() if row else ""
 
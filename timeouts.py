@@ -0,0 +1,137 @@
+"""
+Per-endpoint statement_timeout / lock_timeout.
+
+Every connection a request checks out of the pool (see db.set_checkout_hook)
+gets the limits of the request's endpoint class, plus application_name set
+to the endpoint so pg_stat_activity and the server log show who ran what:
+
+    public         3s statement, 1s lock     homepage, branch page, FAQs, track
+    transactional  5s statement, 2s lock     cashier, reservations, enrollment
+    default       15s statement, 5s lock     everything else
+    report       120s statement, 10s lock    cashier reports and exports
+
+Override per class with DB_STATEMENT_TIMEOUT_<CLASS> / DB_LOCK_TIMEOUT_<CLASS>
+(milliseconds, 0 = no limit), e.g. DB_STATEMENT_TIMEOUT_REPORT=300000.
+
+A statement that hits its limit raises QueryCanceled (LockNotAvailable for
+lock waits); if the handler lets it propagate it is logged with the endpoint
+and answered with a 503 page (JSON under /api/) instead of a hung worker.
+Handlers that catch Exception to flash an error let these through first:
+
+    except timeouts.ERRORS:
+        db.rollback()
+        raise
+    except Exception as e:
+        ...
+Connections outside a request (scripts, bench tools) keep server defaults.
+"""
+import logging
+import psycopg2.errors
+from flask import has_request_context, jsonify, render_template, request
+import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLASS = "default"
+LOCK_NOT_AVAILABLE = "55P03"
+ERRORS = (psycopg2.errors.QueryCanceled, psycopg2.errors.LockNotAvailable)
+
+# class -> (statement_timeout ms, lock_timeout ms)
+LIMITS = {
+    name: (
+        db._env_int(f"DB_STATEMENT_TIMEOUT_{name.upper()}", statement_ms),
+        db._env_int(f"DB_LOCK_TIMEOUT_{name.upper()}", lock_ms),
+    )
+    for name, (statement_ms, lock_ms) in {
+        "public": (3000, 1000),
+        "transactional": (5000, 2000),
+        "default": (15000, 5000),
+        "report": (120000, 10000),
+    }.items()
+}
+
+# Whole blueprints; ENDPOINT_CLASSES wins over these.
+BLUEPRINT_CLASSES = {
+    "public": "public",
+    "cashier": "transactional",
+}
+
+ENDPOINT_CLASSES = {
+    "auth.login": "public",
+    "student.track_enrollment": "public",
+
+    "student.enroll": "transactional",
+    "student.enroll_books": "transactional",
+    "student.enroll_uniform": "transactional",
+    "student.enroll_summary": "transactional",
+    "student.student_reservation": "transactional",
+    "student.student_reservation_success": "transactional",
+    "student.student_reservations_list": "transactional",
+    "parent.parent_reserve": "transactional",
+    "parent.child_reserve": "transactional",
+    "librarian.releases": "transactional",
+
+    "cashier.reports": "report",
+    "cashier.reports_export": "report",
+}
+
+
+def endpoint_class(endpoint):
+    """Timeout class for a Flask endpoint name (None -> default)."""
+    if not endpoint:
+        return DEFAULT_CLASS
+    name = ENDPOINT_CLASSES.get(endpoint)
+    if name is None:
+        name = BLUEPRINT_CLASSES.get(endpoint.partition(".")[0], DEFAULT_CLASS)
+    return name
+
+
+def _on_checkout(conn):
+    if not has_request_context():
+        return
+    endpoint = request.endpoint or "?"
+    statement_ms, lock_ms = LIMITS[endpoint_class(request.endpoint)]
+
+    # SET outside a transaction so a later rollback in the handler keeps it
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    cur = conn._raw_cursor()
+    try:
+        cur.execute(
+            "SELECT set_config('statement_timeout', %s, false),"
+            " set_config('lock_timeout', %s, false),"
+            " set_config('application_name', %s, false)",
+            (str(statement_ms), str(lock_ms), f"liceo:{endpoint}"),
+        )
+    finally:
+        cur.close()
+        conn.autocommit = autocommit
+
+
+def _timeout_response(error, endpoint=None):
+    """503 for a timed-out statement; asgi.py passes the endpoint it served."""
+    endpoint = endpoint or request.endpoint
+    name = endpoint_class(endpoint)
+    statement_ms, lock_ms = LIMITS[name]
+    # psycopg2 errors carry .pgcode, asyncpg ones (asgi.py) .sqlstate
+    code = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+    what = "lock wait" if code == LOCK_NOT_AVAILABLE else "statement"
+    detail = str(error).strip().splitlines()
+    logger.warning(
+        "DB %s timeout on %s %s (endpoint %s, class %s: statement_timeout=%sms lock_timeout=%sms): %s",
+        what, request.method, request.path, endpoint, name,
+        statement_ms, lock_ms, detail[0] if detail else "",
+    )
+
+    message = "The server is busy and this took too long. Please try again in a moment."
+    if request.path.startswith("/api/"):
+        response = jsonify({"error": "timeout", "message": message})
+    else:
+        response = render_template("db_timeout.html", message=message)
+    return response, 503, {"Retry-After": "5"}
+
+
+def init_app(app):
+    db.set_checkout_hook(_on_checkout)
+    for error in ERRORS:
+        app.register_error_handler(error, _timeout_response)
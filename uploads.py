@@ -0,0 +1,255 @@
+"""
+Uploaded files: size limits, streaming to disk, and publishing on commit.
+
+Every file part of a multipart request is streamed straight into a temporary
+file under uploads/.incoming/ while Werkzeug parses the body, instead of
+being buffered in memory (or in /tmp) and copied again by FileStorage.save().
+Two hard limits apply while the body is read, so an oversized upload is
+refused with 413 RequestEntityTooLarge before the rest of it is taken in:
+
+    UPLOAD_MAX_FILE_MB      8    any single file
+    UPLOAD_MAX_REQUEST_MB  25    the whole request (MAX_CONTENT_LENGTH; a
+                                 Content-Length above it is refused unread)
+
+A view that stores uploads next to database rows uses a Batch:
+
+    batch = uploads.Batch()
+    doc = batch.add(request.files.get("form_138"), ALLOWED_EXTENSIONS)
+    batch.flush()                 # fsync every file, in parallel, before the transaction
+    ... INSERT rows pointing at doc.url ...
+    batch.publish()               # atomic renames into uploads/
+    try:
+        db.commit()
+    except Exception:
+        batch.discard()
+        raise
+
+Files only appear under their final names right before the commit and are
+removed again if it fails, so a failed submission leaves nothing behind. A
+crash between publish() and the commit can leave an unreferenced file, never
+a row pointing at a missing one. Temporary files not published are deleted
+when the request ends. Enrollment documents use blobs.Batch, which names the
+files by content instead of a random UUID (blobs.py).
+
+send() serves /uploads/<path>. Every stored name is unique (content hash or
+UUID) and never rewritten, so responses are cacheable for a year as
+immutable (previews, which can be re-rendered, for a day), private except
+for homepage announcement photos. blobs get their SHA-256 as a strong ETag;
+conditional and Range requests are answered by Werkzeug. With
+UPLOADS_SENDFILE the front-end server sends the bytes instead:
+
+    UPLOADS_SENDFILE=accel       X-Accel-Redirect: UPLOADS_ACCEL_PREFIX<path>
+                                 (nginx; default prefix /_uploads/, an
+                                 internal location aliased to uploads/)
+    UPLOADS_SENDFILE=xsendfile   X-Sendfile: <absolute path> (Apache, lighttpd)
+"""
+import os
+import uuid
+import hashlib
+import tempfile
+import mimetypes
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from flask import Request, current_app, has_app_context, request
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename, send_from_directory
+
+from db import _env_int
+
+MB = 1024 * 1024
+MAX_FILE_SIZE = _env_int("UPLOAD_MAX_FILE_MB", 8) * MB
+MAX_REQUEST_SIZE = _env_int("UPLOAD_MAX_REQUEST_MB", 25) * MB
+FLUSH_WORKERS = _env_int("UPLOAD_FLUSH_WORKERS", 4)
+
+INCOMING = ".incoming"
+
+SENDFILE = os.getenv("UPLOADS_SENDFILE", "").strip().lower()       # "", "accel" or "xsendfile"
+ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/_uploads/")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PREVIEW_MAX_AGE = 24 * 3600
+PUBLIC_PREFIXES = ("announcements/",)
+PREVIEW_SUFFIX = ".preview.jpg"         # previews.py
+
+
+def upload_folder():
+    if has_app_context() and current_app.config.get("UPLOAD_FOLDER"):
+        return current_app.config["UPLOAD_FOLDER"]
+    return os.path.join(os.getcwd(), "uploads")
+
+
+class _IncomingFile:
+    """Writable, readable temp file under uploads/.incoming/ with a size cap."""
+
+    def __init__(self, folder, limit):
+        incoming = os.path.join(folder, INCOMING)
+        os.makedirs(incoming, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=incoming, suffix=".part")
+        self._f = os.fdopen(fd, "w+b")
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.published = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise RequestEntityTooLarge(f"Each file may be at most {self.limit // MB} MB.")
+        self.sha256.update(data)
+        return self._f.write(data)
+
+    def flush_to_disk(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.close()
+        if not self.published:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read/readline/seek/tell/... for FileStorage
+        if name == "_f":
+            raise AttributeError(name)
+        return getattr(self._f, name)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __del__(self):
+        if "_f" in self.__dict__:
+            self.close()
+
+
+class UploadRequest(Request):
+    """Flask request that streams file parts into uploads/.incoming/."""
+
+    max_file_size = MAX_FILE_SIZE
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if content_length is not None and self.max_file_size is not None and content_length > self.max_file_size:
+            raise RequestEntityTooLarge(f"Each file may be at most {self.max_file_size // MB} MB.")
+        return _IncomingFile(upload_folder(), self.max_file_size)
+
+
+def _extension(filename):
+    return filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+
+
+class Upload:
+    """One file of a Batch: its original (sanitized) name and final location."""
+
+    def __init__(self, stream, original, name, folder):
+        self.stream = stream
+        self.original = original
+        self.name = name
+        self.path = os.path.join(folder, *name.split("/"))
+        self.url = f"/uploads/{name}"
+
+
+class Batch:
+    """Uploads of one request that are published together with its transaction."""
+
+    def __init__(self, folder=None):
+        self.folder = folder or upload_folder()
+        self.items = []
+        self._published = []
+
+    def add(self, fileobj, allowed):
+        """Stage a FileStorage; None when empty or the extension is not allowed."""
+        if not fileobj or not fileobj.filename:
+            return None
+        original = secure_filename(fileobj.filename)
+        ext = _extension(original)
+        if ext not in allowed:
+            return None
+        stream = fileobj.stream
+        if not isinstance(stream, _IncomingFile):
+            # parsed without UploadRequest: copy it in once
+            stream = _IncomingFile(self.folder, MAX_FILE_SIZE)
+            fileobj.save(stream)
+            fileobj.stream = stream
+        item = Upload(stream, original, self._name(stream, ext), self.folder)
+        self.items.append(item)
+        return item
+
+    def _name(self, stream, ext):
+        """Final path of a staged file, relative to the upload folder."""
+        return f"{uuid.uuid4().hex}.{ext}"
+
+    def flush(self):
+        """fsync every staged file, in parallel; call before opening the transaction."""
+        if len(self.items) <= 1 or FLUSH_WORKERS <= 1:
+            for item in self.items:
+                item.stream.flush_to_disk()
+            return
+        with ThreadPoolExecutor(max_workers=min(FLUSH_WORKERS, len(self.items))) as pool:
+            list(pool.map(lambda item: item.stream.flush_to_disk(), self.items))
+
+    def publish(self):
+        """Rename the staged files to their final names (same filesystem: atomic)."""
+        for item in self.items:
+            os.makedirs(os.path.dirname(item.path), exist_ok=True)
+            os.replace(item.stream.path, item.path)
+            item.stream.published = True
+            self._published.append(item)
+
+    def discard(self):
+        """Undo publish() after a failed commit."""
+        for item in self._published:
+            try:
+                os.unlink(item.path)
+            except FileNotFoundError:
+                pass
+        self._published = []
+
+
+def _blob_etag(filename):
+    """SHA-256 of a blobs/aa/bb/<sha256>.<ext> path, else None."""
+    parts = filename.split("/")
+    if len(parts) == 4 and parts[0] == "blobs" and not filename.endswith(PREVIEW_SUFFIX):
+        sha256 = parts[3].partition(".")[0]
+        if len(sha256) == 64:
+            return sha256
+    return None
+
+
+def send(folder, filename):
+    """Response for /uploads/<filename> (see module docstring)."""
+    path = safe_join(folder, filename)
+    if path is None or os.path.basename(os.path.dirname(path)) == INCOMING or not os.path.isfile(path):
+        raise NotFound()
+    preview = filename.endswith(PREVIEW_SUFFIX)
+    max_age = PREVIEW_MAX_AGE if preview else IMMUTABLE_MAX_AGE
+
+    if SENDFILE == "accel":
+        rv = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        rv.headers["X-Accel-Redirect"] = ACCEL_PREFIX.rstrip("/") + "/" + quote(filename)
+        rv.cache_control.max_age = max_age
+    else:
+        etag = _blob_etag(filename)
+        rv = send_from_directory(
+            folder, filename, request.environ,
+            etag=etag if etag else True,
+            max_age=max_age,
+            use_x_sendfile=SENDFILE == "xsendfile",
+            response_class=current_app.response_class,
+        )
+    if not filename.startswith(PUBLIC_PREFIXES):
+        rv.cache_control.public = False
+        rv.cache_control.private = True
+    if not preview:
+        rv.cache_control.immutable = True
+    return rv
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+    if app.config.get("MAX_CONTENT_LENGTH") is None:
+        app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_SIZE